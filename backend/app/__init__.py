@@ -0,0 +1,8 @@
+import os
+import sys
+
+# El paquete ``shared`` vive en la raíz del repositorio (fuera de ``backend``);
+# lo hacemos importable sin importar desde dónde se lance uvicorn.
+_REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if _REPO_ROOT not in sys.path:
+    sys.path.append(_REPO_ROOT)
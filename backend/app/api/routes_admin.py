@@ -0,0 +1,97 @@
+import hmac
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+
+from app.config import settings
+from app.services.loop_monitor import loop_monitor
+from app.services.profiler import (
+    ProfilerBusyError,
+    profile_filename,
+    sample_stacks,
+    tracemalloc_diff,
+)
+from app.services.realtime_manager import realtime_manager
+from app.utils.logger import get_logger
+
+logger = get_logger("admin")
+
+
+def require_admin(x_admin_token: Optional[str] = Header(default=None)) -> None:
+    """Solo con ``ADMIN_TOKEN`` configurado y enviado en ``X-Admin-Token``."""
+
+    expected = settings.ADMIN_TOKEN
+    if not expected:
+        # Sin token configurado las rutas de administración no existen.
+        raise HTTPException(status_code=404, detail="Not Found")
+    # En bytes: con ``str`` ``compare_digest`` rechaza texto no ASCII con TypeError.
+    if not x_admin_token or not hmac.compare_digest(x_admin_token.encode(), expected.encode()):
+        raise HTTPException(status_code=403, detail="Token de administración inválido")
+
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+
+# Las rutas son síncronas a propósito: corren en el threadpool, así el
+# muestreo no bloquea el event loop y su pila aparece en el perfil.
+@router.get("/profile", include_in_schema=False)
+def get_profile(
+    seconds: float = Query(default=10.0, gt=0),
+    interval_ms: float = Query(default=10.0, ge=1, le=1000),
+    idle: bool = False,
+):
+    """Perfil por muestreo de todos los hilos en formato *collapsed*."""
+
+    seconds = min(seconds, settings.PROFILE_MAX_SECONDS)
+    logger.info("🔬 Perfil solicitado (%.1f s cada %.0f ms)", seconds, interval_ms)
+    try:
+        collapsed, summary = sample_stacks(seconds, interval_ms / 1000.0, include_idle=idle)
+    except ProfilerBusyError as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+
+    return Response(
+        content=collapsed,
+        media_type="text/plain; charset=utf-8",
+        headers={
+            "Content-Disposition": f'attachment; filename="{profile_filename()}"',
+            "X-Profile-Samples": str(summary["samples"]),
+            "X-Profile-Rounds": str(summary["rounds"]),
+            "X-Profile-Seconds": str(summary["seconds"]),
+        },
+    )
+
+
+@router.get("/tracemalloc", include_in_schema=False)
+def get_tracemalloc(
+    seconds: float = Query(default=30.0, gt=0),
+    top: int = Query(default=25, ge=1, le=500),
+    group_by: str = Query(default="lineno", pattern="^(lineno|filename|traceback)$"),
+):
+    """Diferencia entre dos instantáneas de ``tracemalloc`` separadas ``seconds``."""
+
+    seconds = min(seconds, settings.PROFILE_MAX_SECONDS)
+    logger.info("🧠 Comparación de memoria solicitada (%.1f s)", seconds)
+    try:
+        report = tracemalloc_diff(seconds, top=top, group_by=group_by)
+    except ProfilerBusyError as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+
+    # Tamaños actuales para leer la diferencia contra lo que se acumula.
+    history = list(realtime_manager.daily_messages.items())
+    connections = list(realtime_manager.connections.items())
+    report["realtime"] = {
+        "history": {branch: len(events) for branch, events in history},
+        "connections": {branch: len(sockets) for branch, sockets in connections},
+    }
+    return report
+
+
+@router.get("/loop-stalls", include_in_schema=False)
+def get_loop_stalls():
+    """Últimos bloqueos del event loop con la pila capturada por el watchdog."""
+
+    return {
+        "running": loop_monitor.running,
+        "threshold_ms": loop_monitor.threshold * 1000,
+        "stalls": loop_monitor.recent_stalls(),
+    }
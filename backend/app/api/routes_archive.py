@@ -0,0 +1,62 @@
+from datetime import date
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+
+from app.services.archive import archived_days, read_archived_invoices, read_archived_items
+
+router = APIRouter()
+
+# Evita respuestas gigantes por accidente; para análisis masivos se leen los
+# archivos directamente (Parquet/NDJSON).
+MAX_ARCHIVE_DAYS = 93
+
+
+def _validate_range(start: date, end: Optional[date]) -> date:
+    end = end or start
+    if end < start:
+        raise HTTPException(status_code=400, detail="'end' debe ser posterior a 'start'")
+    if (end - start).days >= MAX_ARCHIVE_DAYS:
+        raise HTTPException(
+            status_code=400, detail=f"El rango máximo es de {MAX_ARCHIVE_DAYS} días"
+        )
+    return end
+
+
+@router.get("/days")
+def get_archived_days():
+    """Días y sedes disponibles en el archivo histórico."""
+
+    return {"days": archived_days()}
+
+
+@router.get("/invoices")
+def get_archived_invoices(
+    start: date,
+    end: Optional[date] = None,
+    branch: Optional[str] = Query(default=None),
+    include_items: bool = False,
+):
+    """Facturas archivadas (sin consultar Postgres)."""
+
+    end = _validate_range(start, end)
+    invoices = read_archived_invoices(start, end, branch)
+    response = {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "branch": branch,
+        "count": len(invoices),
+        "invoices": invoices,
+    }
+
+    if include_items:
+        items_by_invoice = {}
+        for item in read_archived_items(start, end, branch):
+            items_by_invoice.setdefault(item.get("invoice_id"), []).append(item)
+        for invoice in invoices:
+            invoice["items"] = sorted(
+                items_by_invoice.get(invoice.get("id"), []),
+                key=lambda item: item.get("line_number") or 0,
+            )
+
+    return response
@@ -1,12 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from app.database import get_db
+from app.database import get_async_db, get_db
 from app.models.branch import Branch
+from app.services.branch_registry import branch_registry
 
 router = APIRouter()
 
 @router.get("/")
-def get_branches(db: Session = Depends(get_db)):
+async def get_branches(db=Depends(get_async_db)):
+    return await db.run_sync(_branches_payload)
+
+
+def _branches_payload(db: Session):
     branches = db.query(Branch).all()
     return {
         "branches": [
@@ -22,4 +27,5 @@ def create_branch(name: str, code: str = None, db: Session = Depends(get_db)):
     db.add(new_branch)
     db.commit()
     db.refresh(new_branch)
+    branch_registry.invalidate()
     return {"message": "Branch created successfully", "branch": {"id": str(new_branch.id), "name": new_branch.name}}
@@ -1,20 +1,23 @@
 import asyncio
 import uuid
 from datetime import date, datetime, timedelta
-from math import fsum
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy import case, func, literal, select
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import case, func, literal, or_, select
 from sqlalchemy.orm import Session, selectinload
-from app.database import get_db
-from app.models.branch import Branch
+from app.config import settings
+from app.database import get_async_db, get_db
 from app.models.daily_summary import DailySalesSummary
 from app.models.invoice import Invoice
 from app.models.invoice_item import InvoiceItem
 from app.schemas.invoice_schema import InvoiceCreate
-from app.services.daily_reset import ensure_daily_reset
+from app.services.branch_registry import branch_registry
 from app.services.file_reader import trigger_manual_rescan
+from app.services.realtime_events import InvoiceEvent
 from app.services.realtime_manager import realtime_manager
-from app.utils.timezone import current_local_day_bounds
+from app.services.response_cache import bump_data_version, cached_json_response
+from app.utils.timezone import current_local_day_bounds, day_clock
+from shared.forecasting import fit_linear_model, fit_linear_models, predict
 
 
 router = APIRouter()
@@ -27,8 +30,11 @@ def _invoice_datetime_source():
 
 
 @router.get("/")
-def get_invoices(db: Session = Depends(get_db)):
-    ensure_daily_reset(db)
+async def get_invoices(db=Depends(get_async_db)):
+    return await db.run_sync(_recent_invoices_payload)
+
+
+def _recent_invoices_payload(db: Session) -> dict[str, object]:
     invoices = db.query(Invoice).order_by(Invoice.created_at.desc()).limit(10).all()
     return {
         "invoices": [
@@ -48,7 +54,6 @@ def get_invoices(db: Session = Depends(get_db)):
 
 @router.post("/")
 def create_invoice(data: InvoiceCreate, db: Session = Depends(get_db)):
-    ensure_daily_reset(db)
     invoice = Invoice(
         number=data.number,
         branch_id=data.branch_id,
@@ -77,40 +82,34 @@ def create_invoice(data: InvoiceCreate, db: Session = Depends(get_db)):
         db.add(db_item)
 
     db.commit()
+    bump_data_version()
 
     branch_code = "FLO"
     if invoice.branch_id:
-        branch = db.query(Branch).filter(Branch.id == invoice.branch_id).first()
+        branch = branch_registry.by_id(invoice.branch_id, db)
         if branch and branch.code:
             branch_code = branch.code
         else:
             branch_code = str(invoice.branch_id)
             
-    created_timestamp = (
-        invoice.created_at.isoformat() if invoice.created_at else datetime.now().isoformat()
+    event = InvoiceEvent.create(
+        branch_code,
+        invoice_number=invoice.number,
+        items=len(data.items),
+        total=invoice.total,
+        file=invoice.source_file,
+        invoice_date=invoice.invoice_date,
+        created_at=invoice.created_at,
+        extra={"branch": branch_code},
     )
 
-    payload = {
-        "event": "new_invoice",
-        "invoice_number": invoice.number,
-        "items": len(data.items),
-        "total": float(invoice.total or 0),
-        "file": invoice.source_file,
-        "invoice_date": invoice.invoice_date.isoformat()
-        if invoice.invoice_date
-        else None,
-        "branch": branch_code,
-        "timestamp": created_timestamp,
-        "created_at": created_timestamp,
-    }
-
     loop = realtime_manager.loop
     if loop and loop.is_running():
         asyncio.run_coroutine_threadsafe(
-            realtime_manager.broadcast(branch_code, payload), loop
+            realtime_manager.broadcast(branch_code, event), loop
         )
     else:
-        asyncio.run(realtime_manager.broadcast(branch_code, payload))
+        asyncio.run(realtime_manager.broadcast(branch_code, event))
 
     return {"message": "Invoice created successfully", "invoice_id": str(invoice.id)}
 
@@ -138,14 +137,24 @@ def rescan_invoices_folder():
 
 
 @router.get("/daily-sales")
-def get_daily_sales(
+async def get_daily_sales(
+    request: Request,
     days: int = Query(7, ge=1, le=90),
     branch: str = Query("all"),
-    db: Session = Depends(get_db),
+    db=Depends(get_async_db),
 ):
     """Return aggregated totals per day for the requested range."""
-    ensure_daily_reset(db)
 
+    return await cached_json_response(
+        request,
+        "daily-sales",
+        {"days": days, "branch": branch},
+        settings.RESPONSE_CACHE_TTL_DAILY_SALES,
+        lambda: db.run_sync(_daily_sales_payload, days, branch),
+    )
+
+
+def _daily_sales_payload(db: Session, days: int, branch: str) -> dict[str, object]:
     normalized_branch = (branch or "all").strip()
     _, start_date_today, _ = current_local_day_bounds()
     start_date = start_date_today - timedelta(days=max(days - 1, 0))
@@ -155,36 +164,15 @@ def get_daily_sales(
 
     day_expression = func.date_trunc("day", date_source)
 
-    branch_filters = []
-    summary_branch_filters = []
-
-    if normalized_branch.lower() != "all":
-        if normalized_branch.upper() == "FLO":
-            branch_filters.append(Invoice.branch_id.is_(None))
-            summary_branch_filters.append(DailySalesSummary.branch_id.is_(None))
-        else:
-            try:
-                branch_uuid = uuid.UUID(normalized_branch)
-                branch_filters.append(Invoice.branch_id == branch_uuid)
-                summary_branch_filters.append(
-                    DailySalesSummary.branch_id == branch_uuid
-                )
-            except (ValueError, AttributeError):
-                branch_match = (
-                    db.query(Branch)
-                    .filter(func.lower(Branch.code) == normalized_branch.lower())
-                    .first()
-                )
-                if not branch_match:
-                    return {
-                        "history": [],
-                        "branch": normalized_branch,
-                        "days": days,
-                    }
-                branch_filters.append(Invoice.branch_id == branch_match.id)
-                summary_branch_filters.append(
-                    DailySalesSummary.branch_id == branch_match.id
-                )
+    resolution = _resolve_branch_filters(db, normalized_branch)
+    branch_filters = resolution["filters"]
+    summary_branch_filters = resolution["summary_filters"]
+    if branch_filters is None:
+        return {
+            "history": [],
+            "branch": normalized_branch,
+            "days": days,
+        }
 
     summary_query = db.query(DailySalesSummary).filter(
         DailySalesSummary.summary_date >= start_date_only
@@ -255,15 +243,24 @@ def get_daily_sales(
 
 
 @router.get("/today")
-def get_today_invoices(
+async def get_today_invoices(
+    request: Request,
     limit: int = Query(700, ge=1, le=2000),
     offset: int = Query(0, ge=0),
-    db: Session = Depends(get_db),
+    db=Depends(get_async_db),
 ):
     """Devuelve un resumen y la página solicitada de facturas del día."""
 
-    ensure_daily_reset(db)
+    return await cached_json_response(
+        request,
+        "today",
+        {"limit": limit, "offset": offset},
+        settings.RESPONSE_CACHE_TTL_TODAY,
+        lambda: db.run_sync(_today_invoices_payload, limit, offset),
+    )
 
+
+def _today_invoices_payload(db: Session, limit: int, offset: int) -> dict[str, object]:
     _, today_start, tomorrow_start = current_local_day_bounds()
     date_source = _invoice_datetime_source()
 
@@ -364,11 +361,7 @@ def _resolve_branch_filters(db: Session, branch: str) -> dict[str, object]:
             "label": str(branch_uuid),
         }
     except (ValueError, AttributeError):
-        branch_match = (
-            db.query(Branch)
-            .filter(func.lower(Branch.code) == normalized_branch.lower())
-            .first()
-        )
+        branch_match = branch_registry.by_code(normalized_branch, db)
         if branch_match:
             return {
                 "filters": [Invoice.branch_id == branch_match.id],
@@ -389,159 +382,45 @@ def _float_or_zero(value):
     except (TypeError, ValueError):
         return 0.0
 
-def _determinant_3x3(a11, a12, a13, a21, a22, a23, a31, a32, a33):
-    return (
-        a11 * (a22 * a33 - a23 * a32)
-        - a12 * (a21 * a33 - a23 * a31)
-        + a13 * (a21 * a32 - a22 * a31)
-    )
-
-
-def _linear_regression_coefficients(samples):
-    if len(samples) < 3:
-        return None
-
-    sum_x1 = fsum(sample[0] for sample in samples)
-    sum_x2 = fsum(sample[1] for sample in samples)
-    sum_y = fsum(sample[2] for sample in samples)
-
-    sum_x1x1 = fsum(sample[0] * sample[0] for sample in samples)
-    sum_x2x2 = fsum(sample[1] * sample[1] for sample in samples)
-    sum_x1x2 = fsum(sample[0] * sample[1] for sample in samples)
-
-    sum_x1y = fsum(sample[0] * sample[2] for sample in samples)
-    sum_x2y = fsum(sample[1] * sample[2] for sample in samples)
-
-    n = float(len(samples))
-
-    a11 = n
-    a12 = sum_x1
-    a13 = sum_x2
-    a21 = sum_x1
-    a22 = sum_x1x1
-    a23 = sum_x1x2
-    a31 = sum_x2
-    a32 = sum_x1x2
-    a33 = sum_x2x2
-
-    determinant = _determinant_3x3(
-        a11, a12, a13,
-        a21, a22, a23,
-        a31, a32, a33,
-    )
-
-    if abs(determinant) < 1e-9:
-        return None
-
-    det_b0 = _determinant_3x3(
-        sum_y, a12, a13,
-        sum_x1y, a22, a23,
-        sum_x2y, a32, a33,
-    )
-    det_b1 = _determinant_3x3(
-        a11, sum_y, a13,
-        a21, sum_x1y, a23,
-        a31, sum_x2y, a33,
-    )
-    det_b2 = _determinant_3x3(
-        a11, a12, sum_y,
-        a21, a22, sum_x1y,
-        a31, a32, sum_x2y,
-    )
-
-    intercept = det_b0 / determinant
-    coef_first_chunk = det_b1 / determinant
-    coef_previous_total = det_b2 / determinant
-
-    return intercept, coef_first_chunk, coef_previous_total
 
+def _empty_forecast_response(branch_label: str) -> dict[str, object]:
+    return {
+        "branch": branch_label,
+        "history": [],
+        "today": {
+            "current_total": 0.0,
+            "current_net_total": 0.0,
+            "invoice_count": 0,
+            "first_chunk_total": 0.0,
+            "first_chunk_invoices": 0,
+            "average_ticket": 0.0,
+        },
+        "forecast": {
+            "total": 0.0,
+            "remaining": 0.0,
+            "method": "no_branch_match",
+            "ratio": 0.0,
+            "history_days": 0,
+            "history_samples": 0,
+            "history_average_total": 0.0,
+            "history_average_first_chunk": 0.0,
+            "generated_at": day_clock.now().isoformat(),
+        },
+    }
 
 
-@router.get("/today/forecast")
-def get_today_forecast(
-    branch: str = Query("all"),
-    history_days: int = Query(DEFAULT_FORECAST_HISTORY_DAYS, ge=3, le=90),
-    db: Session = Depends(get_db),
+def _forecast_history_query(
+    db: Session,
+    history_filters,
+    current_day_elapsed_seconds: float,
+    split_by_branch: bool = False,
 ):
-    ensure_daily_reset(db)
-
-    resolution = _resolve_branch_filters(db, branch)
-    branch_filters = resolution["filters"]
-    summary_filters = resolution["summary_filters"]
-    branch_label = resolution["label"]
-
-    if branch_filters is None:
-        return {
-            "branch": branch_label,
-            "history": [],
-            "today": {
-                "current_total": 0.0,
-                "current_net_total": 0.0,
-                "invoice_count": 0,
-                "first_chunk_total": 0.0,
-                "first_chunk_invoices": 0,
-                "average_ticket": 0.0,
-            },
-            "forecast": {
-                "total": 0.0,
-                "remaining": 0.0,
-                "method": "no_branch_match",
-                "ratio": 0.0,
-                "history_days": 0,
-                "history_samples": 0,
-                "history_average_total": 0.0,
-                "history_average_first_chunk": 0.0,
-                "generated_at": datetime.utcnow().isoformat() + "Z",
-            },
-        }
+    """Totales diarios del historial (opcionalmente particionados por sede)."""
 
-    now, today_start, tomorrow_start = current_local_day_bounds()
     date_source = _invoice_datetime_source()
-    current_day_elapsed_seconds = max(
-        (now - today_start).total_seconds(),
-        0.0,
-    )
-    history_start = today_start - timedelta(days=history_days)
-    yesterday = today_start.date() - timedelta(days=1)
-
-    history_filters = [
-        Invoice.created_at >= history_start,
-        Invoice.created_at < today_start,
-    ]
-    today_filters = [
-        Invoice.created_at >= today_start,
-        Invoice.created_at < tomorrow_start,
-    ]
-
-    if branch_filters:
-        history_filters.extend(branch_filters)
-        today_filters.extend(branch_filters)
-
     day_expression = func.date_trunc("day", Invoice.created_at)
+    partition = [Invoice.branch_id, day_expression] if split_by_branch else [day_expression]
 
-    yesterday_summary_query = db.query(
-        func.coalesce(func.sum(DailySalesSummary.total_sales), 0).label("total_sales"),
-        func.coalesce(func.sum(DailySalesSummary.total_net_sales), 0).label("net_sales"),
-        func.coalesce(func.sum(DailySalesSummary.total_invoices), 0).label(
-            "invoice_count"
-        ),
-    ).filter(DailySalesSummary.summary_date == yesterday)
-
-    if summary_filters:
-        yesterday_summary_query = yesterday_summary_query.filter(*summary_filters)
-
-    yesterday_summary = yesterday_summary_query.one_or_none()
-
-    previous_total = _float_or_zero(
-        yesterday_summary.total_sales if yesterday_summary else 0
-    )
-    previous_net_total = _float_or_zero(
-        yesterday_summary.net_sales if yesterday_summary else 0
-    )
-    previous_invoice_count = (
-        int(yesterday_summary.invoice_count or 0) if yesterday_summary else 0
-    )
-    
     seconds_since_day_start = func.extract(
         "epoch",
         date_source - func.date_trunc("day", date_source),
@@ -550,12 +429,13 @@ def get_today_forecast(
 
     history_subquery = (
         db.query(
+            Invoice.branch_id.label("branch_id"),
             day_expression.label("day"),
             Invoice.total.label("invoice_total"),
             seconds_since_day_start.label("seconds_since_day_start"),
             func.row_number()
             .over(
-                partition_by=day_expression,
+                partition_by=partition,
                 order_by=[date_source.asc(), Invoice.id.asc()],
 
             )
@@ -569,7 +449,7 @@ def get_today_forecast(
         (history_subquery.c.row_number <= FIRST_CHUNK_INVOICES, history_subquery.c.invoice_total),
         else_=0,
     )
-    
+
     partial_total_case = case (
         (
             history_subquery.c.seconds_since_day_start
@@ -579,9 +459,15 @@ def get_today_forecast(
         else_=0,
     )
 
-    history_rows = (
+    group_columns = (
+        [history_subquery.c.branch_id, history_subquery.c.day]
+        if split_by_branch
+        else [history_subquery.c.day]
+    )
+
+    return (
         db.query(
-            history_subquery.c.day.label("day"),
+            *group_columns,
             func.count().label("invoice_count"),
             func.coalesce(func.sum(history_subquery.c.invoice_total), 0).label(
                 "total_sales"
@@ -589,29 +475,33 @@ def get_today_forecast(
             func.coalesce(func.sum(first_chunk_case), 0).label("first_chunk_total"),
             func.coalesce(func.sum(partial_total_case), 0).label("partial_total"),
         )
-        .group_by(history_subquery.c.day)
+        .group_by(*group_columns)
         .order_by(history_subquery.c.day.desc())
-        .limit(history_days)
-        .all()
     )
-    
-    def _parse_history_day(value):
-        if isinstance(value, datetime):
-            return value.date()
-        if isinstance(value, date):
-            return value
-        if value is None:
-            return None
-        try:
-            return datetime.fromisoformat(str(value)).date()
-        except (TypeError, ValueError):
-            return None
 
-    def _format_history_day(value):
-        parsed = _parse_history_day(value)
-        if parsed is not None:
-            return parsed, parsed.isoformat()
-        return None, str(value)
+
+def _parse_history_day(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if value is None:
+        return None
+    try:
+        return datetime.fromisoformat(str(value)).date()
+    except (TypeError, ValueError):
+        return None
+
+
+def _format_history_day(value):
+    parsed = _parse_history_day(value)
+    if parsed is not None:
+        return parsed, parsed.isoformat()
+    return None, str(value)
+
+
+def _summarise_forecast_history(history_rows, yesterday: date) -> dict[str, object]:
+    """Convierte las filas del historial (más reciente primero) en muestras."""
 
     history_data = []
     ratio_samples = []
@@ -704,7 +594,7 @@ def get_today_forecast(
         average_ratio = sum(ratio for ratio, _ in ratio_samples) / len(ratio_samples)
     else:
         average_ratio = 1.0
-        
+
     weighted_time_ratio_sum = sum(
         ratio * weight for ratio, weight in time_ratio_samples
     )
@@ -719,34 +609,46 @@ def get_today_forecast(
     else:
         average_time_ratio = None
 
-    today_first_chunk_rows = (
-        db.query(Invoice.total)
-        .filter(*today_filters)
-        .order_by(date_source.asc(), Invoice.id.asc())
-
-        .limit(FIRST_CHUNK_INVOICES)
-        .all()
-    )
+    return {
+        "entries": history_entries,
+        "regression_samples": regression_samples,
+        "ratio_samples": ratio_samples,
+        "average_ratio": average_ratio,
+        "average_time_ratio": average_time_ratio,
+        "total_accumulator": total_accumulator,
+        "first_chunk_accumulator": first_chunk_accumulator,
+        "yesterday_first_chunk_total": yesterday_first_chunk_total,
+    }
 
-    first_chunk_total_today = sum(
-        _float_or_zero(row.total) for row in today_first_chunk_rows
-    )
-    first_chunk_invoices_today = len(today_first_chunk_rows)
 
-    today_totals_row = (
-        db.query(
-            func.coalesce(func.sum(Invoice.total), 0).label("current_total"),
-            func.coalesce(func.sum(Invoice.subtotal), 0).label("current_net_total"),
-            func.count(Invoice.id).label("invoice_count"),
-        )
-        .filter(*today_filters)
-        .one()
-    )
+def _build_forecast_response(
+    branch_label: str,
+    history: dict[str, object],
+    today: dict[str, float],
+    previous: dict[str, float],
+    yesterday: date,
+    regression_coefficients,
+) -> dict[str, object]:
+    """Elige el método de pronóstico y arma la respuesta de una sede."""
+
+    history_entries = history["entries"]
+    ratio_samples = history["ratio_samples"]
+    average_ratio = history["average_ratio"]
+    average_time_ratio = history["average_time_ratio"]
+    total_accumulator = history["total_accumulator"]
+    first_chunk_accumulator = history["first_chunk_accumulator"]
+    yesterday_first_chunk_total = history["yesterday_first_chunk_total"]
+
+    first_chunk_total_today = today["first_chunk_total"]
+    first_chunk_invoices_today = today["first_chunk_invoices"]
+    current_total = today["current_total"]
+    current_net_total = today["current_net_total"]
+    current_invoice_count = today["invoice_count"]
+
+    previous_total = previous["total"]
+    previous_net_total = previous["net_total"]
+    previous_invoice_count = previous["invoice_count"]
 
-    current_total = _float_or_zero(today_totals_row.current_total)
-    current_net_total = _float_or_zero(today_totals_row.current_net_total)
-    current_invoice_count = int(today_totals_row.invoice_count or 0)
-    
     if history_entries:
         historical_average_total = total_accumulator / len(history_entries)
         historical_average_first_chunk = (
@@ -755,20 +657,17 @@ def get_today_forecast(
     else:
         historical_average_total = current_total
         historical_average_first_chunk = first_chunk_total_today
-    
-    regression_coefficients = _linear_regression_coefficients(regression_samples)
+
     regression_prediction = None
     if (
         regression_coefficients is not None
         and first_chunk_total_today > 0
     ):
-        intercept, coef_first_chunk, coef_previous_total = regression_coefficients
-        regression_prediction = (
-            intercept
-            + coef_first_chunk * first_chunk_total_today
-            + coef_previous_total * previous_total
+        regression_prediction = predict(
+            regression_coefficients,
+            (first_chunk_total_today, previous_total),
         )
-        
+
     history_totals = [
         entry["total"]
         for entry in history_entries
@@ -891,7 +790,7 @@ def get_today_forecast(
             "history_samples": len(ratio_samples),
             "history_average_total": historical_average_total,
             "history_average_first_chunk": historical_average_first_chunk,
-            "generated_at": datetime.utcnow().isoformat() + "Z",
+            "generated_at": day_clock.now().isoformat(),
             "previous_total": previous_total,
             "previous_net_total": previous_net_total,
             "previous_invoice_count": previous_invoice_count,
@@ -899,8 +798,410 @@ def get_today_forecast(
         },
     }
 
+
+@router.get("/today/forecast")
+async def get_today_forecast(
+    request: Request,
+    branch: str = Query("all"),
+    history_days: int = Query(DEFAULT_FORECAST_HISTORY_DAYS, ge=3, le=90),
+    db=Depends(get_async_db),
+):
+    return await cached_json_response(
+        request,
+        "today/forecast",
+        {"branch": branch, "history_days": history_days},
+        settings.RESPONSE_CACHE_TTL_FORECAST,
+        lambda: _today_forecast_async(db, branch, history_days),
+    )
+
+
+async def _today_forecast_async(db, branch: str, history_days: int) -> dict[str, object]:
+    # ``run_sync`` corre en el hilo del loop: ahí solo las consultas; el
+    # resumen del historial y la regresión van al threadpool.
+    inputs = await db.run_sync(_today_forecast_inputs, branch, history_days)
+    return await run_in_threadpool(_build_today_forecast, inputs)
+
+
+def _today_forecast_inputs(db: Session, branch: str, history_days: int) -> dict[str, object]:
+    """Consultas del pronóstico de una sede (sin cálculo)."""
+
+    resolution = _resolve_branch_filters(db, branch)
+    branch_filters = resolution["filters"]
+    summary_filters = resolution["summary_filters"]
+    branch_label = resolution["label"]
+
+    if branch_filters is None:
+        return {"branch": branch_label, "history_rows": None}
+
+    now, today_start, tomorrow_start = current_local_day_bounds()
+    date_source = _invoice_datetime_source()
+    current_day_elapsed_seconds = max(
+        (now - today_start).total_seconds(),
+        0.0,
+    )
+    history_start = today_start - timedelta(days=history_days)
+    yesterday = today_start.date() - timedelta(days=1)
+
+    history_filters = [
+        Invoice.created_at >= history_start,
+        Invoice.created_at < today_start,
+    ]
+    today_filters = [
+        Invoice.created_at >= today_start,
+        Invoice.created_at < tomorrow_start,
+    ]
+
+    if branch_filters:
+        history_filters.extend(branch_filters)
+        today_filters.extend(branch_filters)
+
+    yesterday_summary_query = db.query(
+        func.coalesce(func.sum(DailySalesSummary.total_sales), 0).label("total_sales"),
+        func.coalesce(func.sum(DailySalesSummary.total_net_sales), 0).label("net_sales"),
+        func.coalesce(func.sum(DailySalesSummary.total_invoices), 0).label(
+            "invoice_count"
+        ),
+    ).filter(DailySalesSummary.summary_date == yesterday)
+
+    if summary_filters:
+        yesterday_summary_query = yesterday_summary_query.filter(*summary_filters)
+
+    yesterday_summary = yesterday_summary_query.one_or_none()
+
+    previous = {
+        "total": _float_or_zero(
+            yesterday_summary.total_sales if yesterday_summary else 0
+        ),
+        "net_total": _float_or_zero(
+            yesterday_summary.net_sales if yesterday_summary else 0
+        ),
+        "invoice_count": (
+            int(yesterday_summary.invoice_count or 0) if yesterday_summary else 0
+        ),
+    }
+
+    history_rows = (
+        _forecast_history_query(db, history_filters, current_day_elapsed_seconds)
+        .limit(history_days)
+        .all()
+    )
+
+    today_first_chunk_rows = (
+        db.query(Invoice.total)
+        .filter(*today_filters)
+        .order_by(date_source.asc(), Invoice.id.asc())
+
+        .limit(FIRST_CHUNK_INVOICES)
+        .all()
+    )
+
+    today_totals_row = (
+        db.query(
+            func.coalesce(func.sum(Invoice.total), 0).label("current_total"),
+            func.coalesce(func.sum(Invoice.subtotal), 0).label("current_net_total"),
+            func.count(Invoice.id).label("invoice_count"),
+        )
+        .filter(*today_filters)
+        .one()
+    )
+
+    today = {
+        "first_chunk_total": sum(
+            _float_or_zero(row.total) for row in today_first_chunk_rows
+        ),
+        "first_chunk_invoices": len(today_first_chunk_rows),
+        "current_total": _float_or_zero(today_totals_row.current_total),
+        "current_net_total": _float_or_zero(today_totals_row.current_net_total),
+        "invoice_count": int(today_totals_row.invoice_count or 0),
+    }
+
+    return {
+        "branch": branch_label,
+        "history_rows": history_rows,
+        "today": today,
+        "previous": previous,
+        "yesterday": yesterday,
+    }
+
+
+def _build_today_forecast(inputs: dict[str, object]) -> dict[str, object]:
+    if inputs["history_rows"] is None:
+        return _empty_forecast_response(inputs["branch"])
+
+    history = _summarise_forecast_history(inputs["history_rows"], inputs["yesterday"])
+    return _build_forecast_response(
+        inputs["branch"],
+        history,
+        inputs["today"],
+        inputs["previous"],
+        inputs["yesterday"],
+        fit_linear_model(history["regression_samples"]),
+    )
+
+
+def _resolve_batch_branches(db: Session, branches: str) -> dict[str, object]:
+    """Traduce ``branches`` a ``{etiqueta: branch_id}`` con una sola consulta.
+
+    ``FLO`` corresponde a las facturas sin sede (``branch_id`` nulo) y
+    ``all_split`` expande a FLO más todas las sedes registradas. Las
+    etiquetas que no coinciden con ninguna sede se devuelven con valor
+    ``False``.
+    """
+
+    requested = [value.strip() for value in (branches or "").split(",") if value.strip()]
+    known_branches = [(record.id, record.code) for record in branch_registry.all(db)]
+    by_id = {branch_id: code for branch_id, code in known_branches}
+
+    resolved: dict[str, object] = {}
+    for value in requested:
+        if value.lower() == "all_split":
+            resolved["FLO"] = None
+            for branch_id, code in known_branches:
+                resolved[code or str(branch_id)] = branch_id
+            continue
+
+        if value.upper() == "FLO":
+            resolved["FLO"] = None
+            continue
+
+        try:
+            branch_uuid = uuid.UUID(value)
+        except (ValueError, AttributeError):
+            branch_uuid = None
+
+        if branch_uuid is not None:
+            resolved[str(branch_uuid)] = branch_uuid if branch_uuid in by_id else False
+            continue
+
+        record = branch_registry.by_code(value, db)
+        if record is None:
+            resolved[value] = False
+            continue
+        resolved[record.code or value] = record.id
+
+    return resolved
+
+
+@router.get("/today/forecast/batch")
+async def get_today_forecast_batch(
+    request: Request,
+    branches: str = Query("all_split"),
+    history_days: int = Query(DEFAULT_FORECAST_HISTORY_DAYS, ge=3, le=90),
+    db=Depends(get_async_db),
+):
+    """Pronóstico de varias sedes con una consulta agrupada por etapa.
+
+    ``branches`` es una lista separada por comas de códigos, UUIDs o ``FLO``;
+    ``all_split`` incluye todas las sedes. El historial, el resumen de ayer y
+    los totales de hoy se consultan una sola vez agrupados por
+    ``branch_id`` y todas las regresiones se ajustan en el mismo lote.
+    """
+
+    return await cached_json_response(
+        request,
+        "today/forecast/batch",
+        {"branches": branches, "history_days": history_days},
+        settings.RESPONSE_CACHE_TTL_FORECAST,
+        lambda: _today_forecast_batch_async(db, branches, history_days),
+    )
+
+
+async def _today_forecast_batch_async(db, branches: str, history_days: int) -> dict[str, object]:
+    inputs = await db.run_sync(_today_forecast_batch_inputs, branches, history_days)
+    return await run_in_threadpool(_build_today_forecast_batch, inputs)
+
+
+def _today_forecast_batch_inputs(
+    db: Session, branches: str, history_days: int
+) -> dict[str, object]:
+    """Consultas agrupadas del pronóstico por lote (sin cálculo)."""
+
+    resolved = _resolve_batch_branches(db, branches)
+    targets = {
+        label: branch_id
+        for label, branch_id in resolved.items()
+        if branch_id is not False
+    }
+    inputs: dict[str, object] = {
+        "resolved": resolved,
+        "targets": targets,
+        "history_days": history_days,
+    }
+
+    if not targets:
+        return inputs
+
+    now, today_start, tomorrow_start = current_local_day_bounds()
+    date_source = _invoice_datetime_source()
+    current_day_elapsed_seconds = max(
+        (now - today_start).total_seconds(),
+        0.0,
+    )
+    history_start = today_start - timedelta(days=history_days)
+    yesterday = today_start.date() - timedelta(days=1)
+
+    branch_ids = [branch_id for branch_id in targets.values() if branch_id is not None]
+    include_unassigned = any(branch_id is None for branch_id in targets.values())
+    branch_conditions = []
+    if branch_ids:
+        branch_conditions.append(Invoice.branch_id.in_(branch_ids))
+    if include_unassigned:
+        branch_conditions.append(Invoice.branch_id.is_(None))
+    branch_filter = or_(*branch_conditions)
+
+    summary_conditions = []
+    if branch_ids:
+        summary_conditions.append(DailySalesSummary.branch_id.in_(branch_ids))
+    if include_unassigned:
+        summary_conditions.append(DailySalesSummary.branch_id.is_(None))
+
+    previous_rows = (
+        db.query(
+            DailySalesSummary.branch_id,
+            func.coalesce(func.sum(DailySalesSummary.total_sales), 0).label("total_sales"),
+            func.coalesce(func.sum(DailySalesSummary.total_net_sales), 0).label("net_sales"),
+            func.coalesce(func.sum(DailySalesSummary.total_invoices), 0).label(
+                "invoice_count"
+            ),
+        )
+        .filter(DailySalesSummary.summary_date == yesterday, or_(*summary_conditions))
+        .group_by(DailySalesSummary.branch_id)
+        .all()
+    )
+    previous_by_branch = {
+        row.branch_id: {
+            "total": _float_or_zero(row.total_sales),
+            "net_total": _float_or_zero(row.net_sales),
+            "invoice_count": int(row.invoice_count or 0),
+        }
+        for row in previous_rows
+    }
+
+    history_rows_by_branch: dict[object, list] = {}
+    for row in _forecast_history_query(
+        db,
+        [
+            Invoice.created_at >= history_start,
+            Invoice.created_at < today_start,
+            branch_filter,
+        ],
+        current_day_elapsed_seconds,
+        split_by_branch=True,
+    ).all():
+        rows = history_rows_by_branch.setdefault(row.branch_id, [])
+        if len(rows) < history_days:
+            rows.append(row)
+
+    today_subquery = (
+        db.query(
+            Invoice.branch_id.label("branch_id"),
+            Invoice.total.label("total"),
+            Invoice.subtotal.label("subtotal"),
+            func.row_number()
+            .over(
+                partition_by=Invoice.branch_id,
+                order_by=[date_source.asc(), Invoice.id.asc()],
+            )
+            .label("row_number"),
+        )
+        .filter(
+            Invoice.created_at >= today_start,
+            Invoice.created_at < tomorrow_start,
+            branch_filter,
+        )
+        .subquery()
+    )
+    in_first_chunk = today_subquery.c.row_number <= FIRST_CHUNK_INVOICES
+    today_rows = (
+        db.query(
+            today_subquery.c.branch_id,
+            func.coalesce(func.sum(today_subquery.c.total), 0).label("current_total"),
+            func.coalesce(func.sum(today_subquery.c.subtotal), 0).label("current_net_total"),
+            func.count().label("invoice_count"),
+            func.coalesce(
+                func.sum(case((in_first_chunk, today_subquery.c.total), else_=0)), 0
+            ).label("first_chunk_total"),
+            func.coalesce(func.sum(case((in_first_chunk, 1), else_=0)), 0).label(
+                "first_chunk_invoices"
+            ),
+        )
+        .group_by(today_subquery.c.branch_id)
+        .all()
+    )
+    today_by_branch = {
+        row.branch_id: {
+            "first_chunk_total": _float_or_zero(row.first_chunk_total),
+            "first_chunk_invoices": int(row.first_chunk_invoices or 0),
+            "current_total": _float_or_zero(row.current_total),
+            "current_net_total": _float_or_zero(row.current_net_total),
+            "invoice_count": int(row.invoice_count or 0),
+        }
+        for row in today_rows
+    }
+
+    inputs.update(
+        yesterday=yesterday,
+        previous_by_branch=previous_by_branch,
+        history_rows_by_branch=history_rows_by_branch,
+        today_by_branch=today_by_branch,
+    )
+    return inputs
+
+
+def _build_today_forecast_batch(inputs: dict[str, object]) -> dict[str, object]:
+    targets = inputs["targets"]
+    history_days = inputs["history_days"]
+    forecasts: dict[str, object] = {
+        label: _empty_forecast_response(label)
+        for label, branch_id in inputs["resolved"].items()
+        if branch_id is False
+    }
+
+    if not targets:
+        return {"branches": forecasts, "history_days": history_days}
+
+    yesterday = inputs["yesterday"]
+    history_rows_by_branch = inputs["history_rows_by_branch"]
+    today_by_branch = inputs["today_by_branch"]
+    previous_by_branch = inputs["previous_by_branch"]
+
+    histories = {
+        label: _summarise_forecast_history(
+            history_rows_by_branch.get(branch_id, []), yesterday
+        )
+        for label, branch_id in targets.items()
+    }
+    coefficients = fit_linear_models(
+        {label: history["regression_samples"] for label, history in histories.items()}
+    )
+
+    empty_today = {
+        "first_chunk_total": 0.0,
+        "first_chunk_invoices": 0,
+        "current_total": 0.0,
+        "current_net_total": 0.0,
+        "invoice_count": 0,
+    }
+    empty_previous = {"total": 0.0, "net_total": 0.0, "invoice_count": 0}
+
+    for label, branch_id in targets.items():
+        forecasts[label] = _build_forecast_response(
+            label,
+            histories[label],
+            today_by_branch.get(branch_id, empty_today),
+            previous_by_branch.get(branch_id, empty_previous),
+            yesterday,
+            coefficients.get(label),
+        )
+
+    return {"branches": forecasts, "history_days": history_days}
+
 @router.get("/{invoice_number}/items")
-def get_invoice_items(invoice_number: str, db: Session = Depends(get_db)):
+async def get_invoice_items(invoice_number: str, db=Depends(get_async_db)):
+    return await db.run_sync(_invoice_items_payload, invoice_number)
+
+
+def _invoice_items_payload(db: Session, invoice_number: str) -> dict[str, object]:
     try:
         invoice = (
             db.query(Invoice)
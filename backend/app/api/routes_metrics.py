@@ -0,0 +1,24 @@
+from fastapi import APIRouter, Depends, Response
+
+from app.api.routes_admin import require_admin
+from app.services import diagnostics
+from app.services.metrics import CONTENT_TYPE, registry
+
+router = APIRouter()
+
+
+@router.get("/metrics", include_in_schema=False)
+def get_metrics():
+    """Métricas del proceso en formato de texto de Prometheus."""
+
+    return Response(content=registry.render(), media_type=CONTENT_TYPE)
+
+
+@router.get("/diagnostics", dependencies=[Depends(require_admin)])
+def get_diagnostics():
+    """Estado del proceso: ingesta, realtime, pools de base de datos e hilos.
+
+    Expone rutas de red, errores, PID e hilos: exige ``X-Admin-Token``.
+    """
+
+    return diagnostics.collect()
@@ -1,8 +1,20 @@
+from typing import Optional
+
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from app.services.freshness import freshness_tracker
 from app.services.realtime_manager import realtime_manager
 
 router = APIRouter()
 
+
+@router.get("/freshness")
+def get_freshness(branch: Optional[str] = None):
+    """Retraso archivo → base → clientes y antigüedad del último dato por sede."""
+
+    branches = [branch.upper()] if branch else freshness_tracker.branches()
+    return {"branches": [freshness_tracker.snapshot(code) for code in branches]}
+
+
 @router.websocket("/ws/{branch_code}")
 async def websocket_endpoint(websocket: WebSocket, branch_code: str):
     """Canal en tiempo real por sede (Floresta, Cedritos, etc.)"""
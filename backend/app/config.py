@@ -17,13 +17,92 @@ class Settings:
     DB_NAME: str = os.getenv("DB_NAME", "visor_realtime")
     DB_USER: str = os.getenv("DB_USER", "postgres")
     DB_PASS: str = os.getenv("DB_PASS", "1234")
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "5"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+    DB_STATEMENT_TIMEOUT_MS: int = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+    DB_ASYNC_ENABLED: bool = os.getenv("DB_ASYNC_ENABLED", "true").lower() == "true"
+    # El engine asíncrono tiene su propio pool: el máximo de conexiones del
+    # proceso es DB_POOL_SIZE + DB_MAX_OVERFLOW + DB_ASYNC_POOL_SIZE +
+    # DB_ASYNC_MAX_OVERFLOW (con asyncpg habilitado).
+    DB_ASYNC_POOL_SIZE: int = int(os.getenv("DB_ASYNC_POOL_SIZE", "5"))
+    DB_ASYNC_MAX_OVERFLOW: int = int(os.getenv("DB_ASYNC_MAX_OVERFLOW", "5"))
+    # Crea invoices/invoice_items particionadas por día si aún no existen.
+    DB_PARTITIONING: bool = os.getenv("DB_PARTITIONING", "false").lower() == "true"
+    PARTITION_DAYS_AHEAD: int = int(os.getenv("PARTITION_DAYS_AHEAD", "7"))
     INVOICE_PATH: str = os.getenv("INVOICE_PATH", r"\\192.168.32.100\unfe-pdv")
     INVOICE_FILE_PREFIX: str = os.getenv("INVOICE_FILE_PREFIX", "01001FL")
+    INVOICE_BRANCH_CODE: str = os.getenv("INVOICE_BRANCH_CODE", "FLO")
+    # Varias carpetas: "ruta|prefijo|código;ruta|prefijo|código" (ver invoice_sources).
+    INVOICE_SOURCES: str = os.getenv("INVOICE_SOURCES", "")
     INVOICE_POLL_INTERVAL: float = float(os.getenv("INVOICE_POLL_INTERVAL", "2"))
+    # El nombre sin la "I" inicial se sigue aceptando por compatibilidad.
     INVOICE_PERIODIC_RESCAN_SECONDS: float = float(
-        os.getenv("NVOICE_PERIODIC_RESCAN_SECONDS", "120")
+        os.getenv(
+            "INVOICE_PERIODIC_RESCAN_SECONDS",
+            os.getenv("NVOICE_PERIODIC_RESCAN_SECONDS", "120"),
+        )
     )
+    INVOICE_POLL_ADAPTIVE: bool = os.getenv("INVOICE_POLL_ADAPTIVE", "true").lower() == "true"
+    INVOICE_POLL_MIN_INTERVAL: float = float(os.getenv("INVOICE_POLL_MIN_INTERVAL", "0.5"))
+    INVOICE_POLL_MAX_INTERVAL: float = float(os.getenv("INVOICE_POLL_MAX_INTERVAL", "30"))
+    # En ráfagas el re-escaneo baja de INVOICE_PERIODIC_RESCAN_SECONDS hasta este piso.
+    INVOICE_RESCAN_MIN_SECONDS: float = float(os.getenv("INVOICE_RESCAN_MIN_SECONDS", "30"))
+    INVOICE_RESCAN_MAX_SECONDS: float = float(os.getenv("INVOICE_RESCAN_MAX_SECONDS", "900"))
+    INVOICE_ARRIVAL_HALF_LIFE: float = float(os.getenv("INVOICE_ARRIVAL_HALF_LIFE", "300"))
+    # Rangos "HH:MM-HH:MM" separados por coma (hora local). Dentro de ellos el
+    # intervalo de sondeo nunca supera INVOICE_POLL_INTERVAL.
+    INVOICE_BUSINESS_HOURS: str = os.getenv("INVOICE_BUSINESS_HOURS", "07:00-21:00")
+    INVOICE_WATCHER_BACKEND: str = os.getenv("INVOICE_WATCHER_BACKEND", "auto")
+    INVOICE_WATCHER_PROBE_TIMEOUT: float = float(
+        os.getenv("INVOICE_WATCHER_PROBE_TIMEOUT", "3")
+    )
+    INGEST_WORKERS: int = int(os.getenv("INGEST_WORKERS", "4"))
+    INGEST_STABILITY_INTERVAL: float = float(os.getenv("INGEST_STABILITY_INTERVAL", "1"))
+    INGEST_STABILITY_MAX_WAIT: float = float(os.getenv("INGEST_STABILITY_MAX_WAIT", "60"))
+    INGEST_READ_RETRY_ATTEMPTS: int = int(os.getenv("INGEST_READ_RETRY_ATTEMPTS", "5"))
+    INGEST_READ_RETRY_DELAY: float = float(os.getenv("INGEST_READ_RETRY_DELAY", "1"))
+    INGEST_RETRY_BASE_SECONDS: float = float(os.getenv("INGEST_RETRY_BASE_SECONDS", "60"))
+    INGEST_RETRY_MAX_SECONDS: float = float(os.getenv("INGEST_RETRY_MAX_SECONDS", "3600"))
+    INGEST_MAX_ATTEMPTS: int = int(os.getenv("INGEST_MAX_ATTEMPTS", "5"))
+    # Cierre diario (resumen, archivo y purga); se apaga en benchmarks sobre datos sembrados.
+    DAILY_RESET_ENABLED: bool = os.getenv("DAILY_RESET_ENABLED", "true").lower() == "true"
+    # Si el cierre falla se reintenta con espera exponencial hasta lograrlo.
+    DAILY_RESET_RETRY_BASE_SECONDS: float = float(os.getenv("DAILY_RESET_RETRY_BASE_SECONDS", "30"))
+    DAILY_RESET_RETRY_MAX_SECONDS: float = float(os.getenv("DAILY_RESET_RETRY_MAX_SECONDS", "900"))
+    ARCHIVE_ENABLED: bool = os.getenv("ARCHIVE_ENABLED", "true").lower() == "true"
+    ARCHIVE_DIR: str = os.getenv("ARCHIVE_DIR", "archive")
+    # "auto" usa Parquet si pyarrow está instalado; "ndjson" fuerza gzip NDJSON.
+    ARCHIVE_FORMAT: str = os.getenv("ARCHIVE_FORMAT", "auto")
     LOCAL_TIMEZONE: str = os.getenv("LOCAL_TIMEZONE", "America/Bogota")
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+    LOG_FORMAT: str = os.getenv("LOG_FORMAT", "text")
+    LOG_RATE_LIMIT: int = int(os.getenv("LOG_RATE_LIMIT", "20"))
+    LOG_RATE_LIMIT_WINDOW: float = float(os.getenv("LOG_RATE_LIMIT_WINDOW", "60"))
+    LOG_SUMMARY_INTERVAL: float = float(os.getenv("LOG_SUMMARY_INTERVAL", "60"))
+    SERVER_TIMING_ENABLED: bool = os.getenv("SERVER_TIMING_ENABLED", "true").lower() == "true"
+    SLOW_QUERY_MS: float = float(os.getenv("SLOW_QUERY_MS", "500"))
+    # Vacío deshabilita /admin (perfilador y tracemalloc).
+    ADMIN_TOKEN: str = os.getenv("ADMIN_TOKEN", "")
+    PROFILE_MAX_SECONDS: float = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+    LOOP_MONITOR_ENABLED: bool = os.getenv("LOOP_MONITOR_ENABLED", "true").lower() == "true"
+    LOOP_LAG_INTERVAL_MS: float = float(os.getenv("LOOP_LAG_INTERVAL_MS", "250"))
+    LOOP_LAG_THRESHOLD_MS: float = float(os.getenv("LOOP_LAG_THRESHOLD_MS", "200"))
+    BRANCH_REGISTRY_REFRESH_SECONDS: float = float(
+        os.getenv("BRANCH_REGISTRY_REFRESH_SECONDS", "300")
+    )
+    FRESHNESS_WINDOW_SECONDS: float = float(os.getenv("FRESHNESS_WINDOW_SECONDS", "900"))
+    # Cada cuánto se envía el evento realtime ``freshness`` (0 lo desactiva).
+    FRESHNESS_BROADCAST_SECONDS: float = float(os.getenv("FRESHNESS_BROADCAST_SECONDS", "30"))
+    RESPONSE_CACHE_MAX_ENTRIES: int = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "256"))
+    RESPONSE_CACHE_TTL_DAILY_SALES: float = float(
+        os.getenv("RESPONSE_CACHE_TTL_DAILY_SALES", "60")
+    )
+    RESPONSE_CACHE_TTL_TODAY: float = float(os.getenv("RESPONSE_CACHE_TTL_TODAY", "10"))
+    RESPONSE_CACHE_TTL_FORECAST: float = float(
+        os.getenv("RESPONSE_CACHE_TTL_FORECAST", "15")
+    )
 
     _cors_allowed_origins: str = os.getenv("CORS_ALLOWED_ORIGINS", "*")
     CORS_ALLOW_CREDENTIALS: bool = os.getenv("CORS_ALLOW_CREDENTIALS", "true").lower() == "true"
@@ -32,6 +111,10 @@ class Settings:
     def DATABASE_URL(self):
         return f"postgresql://{self.DB_USER}:{self.DB_PASS}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
 
+    @property
+    def ASYNC_DATABASE_URL(self):
+        return f"postgresql+asyncpg://{self.DB_USER}:{self.DB_PASS}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
+
     @property
     def CORS_ALLOW_ALL(self) -> bool:
         return self._cors_allowed_origins.strip() == "*"
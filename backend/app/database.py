@@ -1,11 +1,45 @@
+from typing import Any, Callable
+
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy import create_engine, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.config import settings
+from app.utils.logger import get_logger
+from app.utils.request_timing import instrument_engine
+
+logger = get_logger("database")
+
+
+def _pool_options(pool_size: int, max_overflow: int) -> dict[str, Any]:
+    return {
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+
+def _sync_connect_args() -> dict[str, Any]:
+    if settings.DB_STATEMENT_TIMEOUT_MS <= 0:
+        return {}
+    return {"options": f"-c statement_timeout={settings.DB_STATEMENT_TIMEOUT_MS}"}
+
 
-# Crear engine y sesión
-engine = create_engine(str(settings.DATABASE_URL))
+def _async_connect_args() -> dict[str, Any]:
+    if settings.DB_STATEMENT_TIMEOUT_MS <= 0:
+        return {}
+    return {"server_settings": {"statement_timeout": str(settings.DB_STATEMENT_TIMEOUT_MS)}}
+
+
+# Crear engine y sesión (ruta síncrona: hilos de ingesta de archivos y escrituras)
+engine = create_engine(
+    str(settings.DATABASE_URL),
+    connect_args=_sync_connect_args(),
+    **_pool_options(settings.DB_POOL_SIZE, settings.DB_MAX_OVERFLOW),
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+instrument_engine(engine)
 Base = declarative_base()
 
 def get_db():
@@ -15,6 +49,65 @@ def get_db():
     finally:
         db.close()
 
+
+# Ruta asíncrona (asyncpg) para las rutas de lectura del dashboard.
+# Si asyncpg no está instalado o se deshabilita con DB_ASYNC_ENABLED, las
+# mismas rutas siguen funcionando con la sesión síncrona en el threadpool.
+try:
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+    async_engine = (
+        create_async_engine(
+            settings.ASYNC_DATABASE_URL,
+            connect_args=_async_connect_args(),
+            **_pool_options(settings.DB_ASYNC_POOL_SIZE, settings.DB_ASYNC_MAX_OVERFLOW),
+        )
+        if settings.DB_ASYNC_ENABLED
+        else None
+    )
+except ImportError as exc:  # pragma: no cover - depende de las dependencias instaladas
+    logger.warning("⚠️ Acceso asíncrono a la base de datos deshabilitado: %s", exc)
+    async_engine = None
+
+if async_engine is not None:
+    instrument_engine(async_engine.sync_engine)
+
+AsyncSessionLocal = (
+    async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+    if async_engine is not None
+    else None
+)
+
+
+class ThreadpoolSession:
+    """Expone ``run_sync`` sobre una sesión síncrona cuando no hay asyncpg."""
+
+    def __init__(self, session):
+        self.session = session
+
+    async def run_sync(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        return await run_in_threadpool(fn, self.session, *args, **kwargs)
+
+    async def close(self) -> None:
+        await run_in_threadpool(self.session.close)
+
+
+async def get_async_db():
+    """Dependencia de sesión para las rutas ``async`` de solo lectura.
+
+    Las rutas ejecutan su lógica ORM con ``await db.run_sync(fn, ...)``, que
+    funciona igual con ``AsyncSession`` y con :class:`ThreadpoolSession`.
+    """
+
+    if AsyncSessionLocal is None:
+        db = ThreadpoolSession(SessionLocal())
+    else:
+        db = AsyncSessionLocal()
+    try:
+        yield db
+    finally:
+        await db.close()
+
 # Optional: quick connection test
 def test_connection():
     try:
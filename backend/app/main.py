@@ -1,13 +1,23 @@
 from fastapi import FastAPI
 import asyncio
 import threading
-from app.api import routes_invoices, routes_branches, routes_realtime
+from app.api import routes_invoices, routes_branches, routes_realtime, routes_metrics, routes_archive, routes_admin
 from app.services.file_reader import start_file_monitor
 from fastapi.middleware.cors import CORSMiddleware
+from app.services.branch_registry import branch_registry
+from app.services.freshness import run_freshness_publisher
+from app.services.partitions import prepare as prepare_partitions
+from app.services.daily_reset import run_daily_reset
+from app.services.loop_monitor import loop_monitor
 from app.services.realtime_manager import realtime_manager
 from app.config import settings
 from fastapi.middleware.cors import CORSMiddleware
 from app.config import settings
+from app.utils.logger import get_logger
+from app.utils.request_timing import ServerTimingMiddleware
+from app.utils.timezone import day_clock
+
+logger = get_logger("main")
 
 
 # 🚀 CONFIGURACIÓN PRINCIPAL DE LA API
@@ -41,12 +51,19 @@ app.add_middleware(
     **cors_options,
 )
 
+# ⏱️ Server-Timing: tiempo de SQL, cálculo y serialización por petición
+if settings.SERVER_TIMING_ENABLED:
+    app.add_middleware(ServerTimingMiddleware)
+
 
 # 📦 INCLUSIÓN DE RUTAS
 
 app.include_router(routes_branches.router, prefix="/branches", tags=["Branches"])
 app.include_router(routes_invoices.router, prefix="/invoices", tags=["Invoices"])
 app.include_router(routes_realtime.router, tags=["Realtime"])  # 👈 WebSocket aquí
+app.include_router(routes_metrics.router, tags=["Metrics"])
+app.include_router(routes_archive.router, prefix="/archive", tags=["Archive"])
+app.include_router(routes_admin.router, prefix="/admin", tags=["Admin"])
 
 
 # 🧠 EVENTO STARTUP - INICIAR MONITOR DE FACTURAS
@@ -56,10 +73,24 @@ async def startup_event():
     """Inicia el monitor de archivos cuando arranca FastAPI."""
     loop = asyncio.get_running_loop()
     realtime_manager.set_loop(loop)
+    day_clock.start()
+    # Carga inicial de sedes fuera del loop; si falla se reintenta en la primera consulta.
+    await asyncio.to_thread(branch_registry.refresh)
+    # Esquema particionado (si DB_PARTITIONING) y particiones de los próximos días.
+    await asyncio.to_thread(prepare_partitions)
+    # Cierre pendiente (el proceso pudo estar caído a medianoche); los
+    # siguientes los dispara el cambio de día.
+    await asyncio.to_thread(run_daily_reset)
+    if settings.LOOP_MONITOR_ENABLED:
+        loop_monitor.start()
+    if settings.FRESHNESS_BROADCAST_SECONDS > 0:
+        loop.create_task(run_freshness_publisher(settings.FRESHNESS_BROADCAST_SECONDS))
     """Inicia el monitor de archivos cuando arranca FastAPI."""
-    monitor_thread = threading.Thread(target=start_file_monitor, daemon=True)
+    monitor_thread = threading.Thread(
+        target=start_file_monitor, name="invoice-supervisor", daemon=True
+    )
     monitor_thread.start()
-    print("✅ Monitor de archivos iniciado correctamente.")
+    logger.info("✅ Monitor de archivos iniciado correctamente.")
 
 
 # 🏠 RUTA PRINCIPAL
@@ -0,0 +1,25 @@
+from sqlalchemy import BigInteger, Column, DateTime, Float, Integer, String
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.sql import func
+import uuid
+
+from app.database import Base
+
+
+class IngestionLedgerEntry(Base):
+    """Resultado de la última ingesta de cada archivo de la carpeta de facturas."""
+
+    __tablename__ = "ingestion_ledger"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    # Ruta normalizada del archivo (``invoice_sources.file_key``).
+    filename = Column(String, nullable=False, unique=True)
+    size = Column(BigInteger)
+    mtime = Column(Float)
+    content_hash = Column(String(64))
+    outcome = Column(String, nullable=False)
+    attempts = Column(Integer, default=0)
+    last_error = Column(String)
+    next_attempt_at = Column(DateTime(timezone=True))
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
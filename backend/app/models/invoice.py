@@ -16,6 +16,7 @@ class Invoice(Base):
     vat = Column(Numeric(12, 2), default=0)
     discount = Column(Numeric(12, 2), default=0)
     total = Column(Numeric(12, 2), default=0)
+    # Ruta normalizada del XML (``invoice_sources.file_key``).
     source_file = Column(String)
     created_at = Column(DateTime(timezone=True), server_default=func.now()) # fecha crecion BD
     items = relationship(
@@ -0,0 +1,314 @@
+"""Archivo columnar de las facturas que purga el cierre diario.
+
+El cierre lo lanza ``daily_reset.run_daily_reset`` al arrancar la app y en
+cada cambio de día (con reintentos si falla), nunca una petición. Antes de
+borrar las facturas de días anteriores, escribe sus facturas e ítems en
+``ARCHIVE_DIR`` particionados al estilo Hive::
+
+    archive/invoices/date=2024-05-10/branch=FLO/part-<marca>-<id>.parquet
+    archive/invoice_items/date=2024-05-10/branch=FLO/part-<marca>-<id>.parquet
+
+Con ``pyarrow`` instalado se usa Parquet (zstd); sin él, NDJSON comprimido
+con gzip (``.ndjson.gz``). Cada cierre agrega archivos nuevos en lugar de
+reescribir la partición, y el lector descarta filas repetidas por ``id``
+(por ejemplo, si el borrado falló después de archivar y el cierre se repitió).
+
+:func:`read_archived_invoices`, :func:`read_archived_items` y
+:func:`archived_days` permiten consultar días archivados sin Postgres.
+"""
+
+from __future__ import annotations
+
+import gzip
+import json
+import os
+import re
+import time
+import uuid
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+from app.config import settings
+from app.utils.logger import get_logger
+from app.utils.timezone import day_clock
+
+try:  # pragma: no cover - depende del entorno
+    import pyarrow as _pa
+    import pyarrow.parquet as _pq
+except ImportError:  # pragma: no cover - se usa NDJSON
+    _pa = None
+    _pq = None
+
+
+HAS_PARQUET = _pa is not None
+
+FORMAT_PARQUET = "parquet"
+FORMAT_NDJSON = "ndjson"
+
+INVOICES_TABLE = "invoices"
+ITEMS_TABLE = "invoice_items"
+
+_EXTENSIONS = {FORMAT_PARQUET: ".parquet", FORMAT_NDJSON: ".ndjson.gz"}
+_PARTITION_RE = re.compile(r"^(date|branch)=(.+)$")
+
+logger = get_logger("archive")
+
+INVOICE_COLUMNS: Tuple[Tuple[str, str], ...] = (
+    ("id", "string"),
+    ("number", "string"),
+    ("branch_id", "string"),
+    ("branch_code", "string"),
+    ("issued_at", "timestamp"),
+    ("invoice_date", "timestamp"),
+    ("created_at", "timestamp"),
+    ("subtotal", "float"),
+    ("vat", "float"),
+    ("discount", "float"),
+    ("total", "float"),
+    ("source_file", "string"),
+)
+
+ITEM_COLUMNS: Tuple[Tuple[str, str], ...] = (
+    ("id", "string"),
+    ("invoice_id", "string"),
+    ("line_number", "int"),
+    ("product_code", "string"),
+    ("description", "string"),
+    ("quantity", "float"),
+    ("unit_price", "float"),
+    ("subtotal", "float"),
+    ("created_at", "timestamp"),
+)
+
+
+def resolve_format(requested: Optional[str] = None) -> str:
+    requested = (requested or settings.ARCHIVE_FORMAT or "auto").strip().lower()
+    if requested == FORMAT_NDJSON:
+        return FORMAT_NDJSON
+    if requested == FORMAT_PARQUET and not HAS_PARQUET:
+        logger.warning("⚠️ ARCHIVE_FORMAT=parquet sin pyarrow instalado; se usa NDJSON.")
+        return FORMAT_NDJSON
+    return FORMAT_PARQUET if HAS_PARQUET else FORMAT_NDJSON
+
+
+# ===============================
+#   ESCRITURA
+# ===============================
+def _coerce(value, kind: str):
+    if value is None:
+        return None
+    if kind == "string":
+        return str(value)
+    if kind == "float":
+        return float(value)
+    if kind == "int":
+        return int(value)
+    if kind == "timestamp" and isinstance(value, datetime) and value.tzinfo is None:
+        # Las columnas sin zona guardan hora local.
+        return value.replace(tzinfo=day_clock.tz)
+    return value
+
+
+def _normalize_row(row: Mapping[str, object], columns: Sequence[Tuple[str, str]]) -> dict:
+    return {name: _coerce(row.get(name), kind) for name, kind in columns}
+
+
+def _arrow_schema(columns: Sequence[Tuple[str, str]]):
+    types = {
+        "string": _pa.string(),
+        "float": _pa.float64(),
+        "int": _pa.int64(),
+        "timestamp": _pa.timestamp("us", tz="UTC"),
+    }
+    return _pa.schema([(name, types[kind]) for name, kind in columns])
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
+
+
+def _partition_dir(base_dir: str, table: str, day: date, branch_code: str) -> str:
+    return os.path.join(base_dir, table, f"date={day.isoformat()}", f"branch={branch_code}")
+
+
+def _write_part(
+    directory: str,
+    rows: List[dict],
+    columns: Sequence[Tuple[str, str]],
+    fmt: str,
+) -> str:
+    os.makedirs(directory, exist_ok=True)
+    name = f"part-{int(time.time())}-{uuid.uuid4().hex[:8]}{_EXTENSIONS[fmt]}"
+    final_path = os.path.join(directory, name)
+    tmp_path = os.path.join(directory, f".{name}.tmp")
+
+    if fmt == FORMAT_PARQUET:
+        table = _pa.Table.from_pylist(rows, schema=_arrow_schema(columns))
+        _pq.write_table(table, tmp_path, compression="zstd")
+    else:
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as handle:
+            for row in rows:
+                handle.write(json.dumps(row, ensure_ascii=False, default=_json_default))
+                handle.write("\n")
+
+    # Solo se publica el archivo completo: el lector ignora los temporales.
+    os.replace(tmp_path, final_path)
+    return final_path
+
+
+def write_archive(
+    invoices: Iterable[Mapping[str, object]],
+    items: Iterable[Mapping[str, object]],
+    base_dir: Optional[str] = None,
+    fmt: Optional[str] = None,
+) -> Dict[Tuple[str, str], int]:
+    """Escribe facturas e ítems particionados por día local y sede.
+
+    Cada factura debe traer ``branch_code`` y al menos una de
+    ``invoice_date``/``created_at``; los ítems se ubican en la partición de
+    su factura. Devuelve ``{(día, sede): facturas}``.
+    """
+
+    base_dir = base_dir or settings.ARCHIVE_DIR
+    fmt = resolve_format(fmt)
+
+    partitions: Dict[Tuple[date, str], List[dict]] = {}
+    invoice_partition: Dict[str, Tuple[date, str]] = {}
+    for invoice in invoices:
+        moment = invoice.get("invoice_date") or invoice.get("created_at")
+        if not isinstance(moment, datetime):
+            continue
+        key = (day_clock.local_date(moment), str(invoice.get("branch_code") or "SIN_SEDE"))
+        row = _normalize_row(invoice, INVOICE_COLUMNS)
+        partitions.setdefault(key, []).append(row)
+        invoice_partition[row["id"]] = key
+
+    item_partitions: Dict[Tuple[date, str], List[dict]] = {}
+    for item in items:
+        key = invoice_partition.get(str(item.get("invoice_id")))
+        if key is None:
+            continue
+        item_partitions.setdefault(key, []).append(_normalize_row(item, ITEM_COLUMNS))
+
+    written: Dict[Tuple[str, str], int] = {}
+    for (day, branch_code), rows in partitions.items():
+        _write_part(_partition_dir(base_dir, INVOICES_TABLE, day, branch_code), rows, INVOICE_COLUMNS, fmt)
+        item_rows = item_partitions.get((day, branch_code))
+        if item_rows:
+            _write_part(_partition_dir(base_dir, ITEMS_TABLE, day, branch_code), item_rows, ITEM_COLUMNS, fmt)
+        written[(day.isoformat(), branch_code)] = len(rows)
+
+    return written
+
+
+# ===============================
+#   LECTURA
+# ===============================
+def _iter_partitions(
+    base_dir: str,
+    table: str,
+    start: Optional[date],
+    end: Optional[date],
+    branch: Optional[str],
+) -> Iterator[Tuple[date, str, str]]:
+    table_dir = os.path.join(base_dir, table)
+    if not os.path.isdir(table_dir):
+        return
+
+    branch = branch.upper() if branch else None
+    for date_entry in sorted(os.scandir(table_dir), key=lambda entry: entry.name):
+        match = _PARTITION_RE.match(date_entry.name)
+        if not date_entry.is_dir() or not match or match.group(1) != "date":
+            continue
+        try:
+            day = date.fromisoformat(match.group(2))
+        except ValueError:
+            continue
+        if (start and day < start) or (end and day > end):
+            continue
+
+        for branch_entry in sorted(os.scandir(date_entry.path), key=lambda entry: entry.name):
+            match = _PARTITION_RE.match(branch_entry.name)
+            if not branch_entry.is_dir() or not match or match.group(1) != "branch":
+                continue
+            if branch and match.group(2).upper() != branch:
+                continue
+            yield day, match.group(2), branch_entry.path
+
+
+def _read_part(path: str) -> List[dict]:
+    if path.endswith(_EXTENSIONS[FORMAT_PARQUET]):
+        if not HAS_PARQUET:
+            logger.warning("⚠️ Se omite %s: pyarrow no está instalado.", path)
+            return []
+        rows = _pq.read_table(path).to_pylist()
+        for row in rows:
+            for key, value in row.items():
+                if isinstance(value, datetime):
+                    row[key] = value.isoformat()
+        return rows
+
+    with gzip.open(path, "rt", encoding="utf-8") as handle:
+        return [json.loads(line) for line in handle if line.strip()]
+
+
+def _read_table(
+    table: str,
+    start: Optional[date],
+    end: Optional[date],
+    branch: Optional[str],
+    base_dir: Optional[str],
+) -> List[dict]:
+    base_dir = base_dir or settings.ARCHIVE_DIR
+    seen = set()
+    rows: List[dict] = []
+    for day, branch_code, directory in _iter_partitions(base_dir, table, start, end, branch):
+        for entry in sorted(os.scandir(directory), key=lambda entry: entry.name):
+            if entry.name.startswith(".") or not entry.name.startswith("part-"):
+                continue
+            for row in _read_part(entry.path):
+                row_id = row.get("id")
+                if row_id in seen:
+                    continue
+                seen.add(row_id)
+                row["archive_date"] = day.isoformat()
+                row["archive_branch"] = branch_code
+                rows.append(row)
+    return rows
+
+
+def read_archived_invoices(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    branch: Optional[str] = None,
+    base_dir: Optional[str] = None,
+) -> List[dict]:
+    """Facturas archivadas entre ``start`` y ``end`` (inclusive)."""
+
+    return _read_table(INVOICES_TABLE, start, end, branch, base_dir)
+
+
+def read_archived_items(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    branch: Optional[str] = None,
+    base_dir: Optional[str] = None,
+) -> List[dict]:
+    """Ítems archivados entre ``start`` y ``end`` (inclusive)."""
+
+    return _read_table(ITEMS_TABLE, start, end, branch, base_dir)
+
+
+def archived_days(base_dir: Optional[str] = None) -> List[dict]:
+    """Días y sedes disponibles en el archivo."""
+
+    base_dir = base_dir or settings.ARCHIVE_DIR
+    days: Dict[str, List[str]] = {}
+    for day, branch_code, _ in _iter_partitions(base_dir, INVOICES_TABLE, None, None, None):
+        days.setdefault(day.isoformat(), []).append(branch_code)
+    return [{"date": day, "branches": branches} for day, branches in days.items()]
@@ -0,0 +1,133 @@
+"""Registro en memoria de las sedes (``branches``).
+
+Las sedes casi nunca cambian, pero cada ruta analítica, el cierre diario y
+la ingesta las buscaban en Postgres (varias con ``lower(code)``, que no usa
+índice). :data:`branch_registry` guarda ``código ↔ id`` sin distinguir
+mayúsculas; se carga al arrancar, ``POST /branches/`` lo invalida y se
+recarga solo cuando pasan ``BRANCH_REGISTRY_REFRESH_SECONDS`` (sedes creadas
+desde otro proceso o directo en la base).
+
+Quien tenga una sesión abierta la pasa para que la recarga use esa conexión
+(``AsyncSession.run_sync`` incluido); sin sesión se abre una propia.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional
+from uuid import UUID
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.branch import Branch
+from app.utils.logger import get_logger
+
+logger = get_logger("branches")
+
+
+class BranchRecord(NamedTuple):
+    id: UUID
+    code: Optional[str]
+    name: str
+
+
+class BranchRegistry:
+    def __init__(self, refresh_seconds: float, session_factory=SessionLocal, retry_seconds: float = 30.0):
+        self.refresh_seconds = max(refresh_seconds, 0.0)
+        self.retry_seconds = max(retry_seconds, 0.0)
+        self._session_factory = session_factory
+        self._by_id: Dict[UUID, BranchRecord] = {}
+        self._by_code: Dict[str, BranchRecord] = {}
+        self._loaded_at: Optional[float] = None
+        self._failed_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _load_rows(self, db: Optional[Session]):
+        if db is None:
+            session = self._session_factory()
+            try:
+                return session.query(Branch.id, Branch.code, Branch.name).all()
+            finally:
+                session.close()
+        # En un SAVEPOINT: si la consulta falla, la transacción de quien
+        # llama (la petición) sigue usable.
+        with db.begin_nested():
+            return db.query(Branch.id, Branch.code, Branch.name).all()
+
+    def refresh(self, db: Optional[Session] = None) -> bool:
+        """Recarga desde la base; si falla se conserva lo que había."""
+
+        try:
+            rows = self._load_rows(db)
+        except Exception as exc:
+            with self._lock:
+                self._failed_at = time.monotonic()
+            logger.warning("⚠️ No se pudo cargar el registro de sedes: %s", exc)
+            return False
+
+        by_id = {}
+        by_code = {}
+        for branch_id, code, name in rows:
+            record = BranchRecord(branch_id, code, name)
+            by_id[branch_id] = record
+            if code:
+                by_code.setdefault(code.strip().lower(), record)
+
+        with self._lock:
+            self._by_id = by_id
+            self._by_code = by_code
+            self._loaded_at = time.monotonic()
+            self._failed_at = None
+        logger.debug("🏬 Registro de sedes cargado (%s sedes)", len(by_id))
+        return True
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._loaded_at = None
+            self._failed_at = None
+
+    def _ensure_fresh(self, db: Optional[Session]) -> None:
+        now = time.monotonic()
+        with self._lock:
+            loaded_at = self._loaded_at
+            failed_at = self._failed_at
+        if loaded_at is not None and now - loaded_at < self.refresh_seconds:
+            return
+        # Tras un fallo se espera ``retry_seconds`` en lugar de reintentar en
+        # cada búsqueda mientras la base no responde.
+        if failed_at is not None and now - failed_at < self.retry_seconds:
+            return
+        self.refresh(db)
+
+    def by_code(self, code: Optional[str], db: Optional[Session] = None) -> Optional[BranchRecord]:
+        normalized = (code or "").strip().lower()
+        if not normalized:
+            return None
+        self._ensure_fresh(db)
+        with self._lock:
+            return self._by_code.get(normalized)
+
+    def by_id(self, branch_id: Optional[UUID], db: Optional[Session] = None) -> Optional[BranchRecord]:
+        if branch_id is None:
+            return None
+        self._ensure_fresh(db)
+        with self._lock:
+            return self._by_id.get(branch_id)
+
+    def all(self, db: Optional[Session] = None) -> List[BranchRecord]:
+        self._ensure_fresh(db)
+        with self._lock:
+            return list(self._by_id.values())
+
+    def code_map(self, db: Optional[Session] = None) -> Dict[UUID, Optional[str]]:
+        """``{branch_id: CÓDIGO}`` (mayúsculas) para resúmenes y archivo."""
+
+        return {
+            record.id: record.code.upper() if record.code else None for record in self.all(db)
+        }
+
+
+branch_registry = BranchRegistry(settings.BRANCH_REGISTRY_REFRESH_SECONDS)
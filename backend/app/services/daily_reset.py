@@ -1,116 +1,236 @@
 from __future__ import annotations
-from sqlalchemy import func, select
+import threading
+from sqlalchemy import Date, cast, func, select
 from sqlalchemy.orm import Session
-from app.utils.timezone import midnight_today
-from app.models.branch import Branch
+from app.database import SessionLocal
+from app.utils.delayed_queue import DelayedTaskQueue
+from app.utils.logger import get_logger
+from app.utils.timezone import day_clock
+from app.services.branch_registry import branch_registry
 from app.models.daily_summary import DailySalesSummary
 from app.models.invoice import Invoice
 from app.models.invoice_item import InvoiceItem
+from app.services.archive import write_archive
+from app.services.db_writer import branch_code_for, rebuild_daily_summaries
+from app.services.partitions import (
+    delete_retained_items,
+    drop_partitions_before,
+    drop_planned_partitions,
+    ensure_upcoming_partitions,
+    plan_partition_drops,
+)
+from app.services.response_cache import bump_data_version
+from app.config import settings
+
+logger = get_logger("daily_reset")
+
+# Día (ordinal) para el que ya se verificó el cierre; evita repetir la
+# consulta si el cierre se dispara más de una vez el mismo día.
+_reset_checked_day = None
+
+# Reintentos del cierre fallido; como mucho una cadena de reintentos viva.
+_retry_tasks = DelayedTaskQueue("daily-reset-retry")
+_retry_lock = threading.Lock()
+_retry_pending = False
 
 
 def _ensure_summary_table(db: Session) -> None:
     """Crea la tabla de resúmenes si aún no existe."""
 
-    bind = db.get_bind()
-    DailySalesSummary.__table__.create(bind=bind, checkfirst=True)
+    # Se usa la conexión de la sesión para que funcione igual con la sesión
+    # síncrona y dentro de ``AsyncSession.run_sync``.
+    DailySalesSummary.__table__.create(bind=db.connection(), checkfirst=True)
 
 
-def _branch_code(branch_map, branch_id) -> str:
-    code = branch_map.get(branch_id)
-    if code:
-        return code.upper()
-    if branch_id is None:
-        return "FLO"
-    return str(branch_id)
+def _archive_stale_rows(db: Session, stale_invoice_ids, stale_filter, branch_map) -> None:
+    invoice_rows = db.execute(
+        select(
+            Invoice.id,
+            Invoice.number,
+            Invoice.branch_id,
+            Invoice.issued_at,
+            Invoice.invoice_date,
+            Invoice.created_at,
+            Invoice.subtotal,
+            Invoice.vat,
+            Invoice.discount,
+            Invoice.total,
+            Invoice.source_file,
+        ).filter(stale_filter)
+    ).mappings()
+    invoices = [
+        {**row, "branch_code": branch_code_for(branch_map, row["branch_id"])}
+        for row in invoice_rows
+    ]
+
+    item_rows = db.execute(
+        select(
+            InvoiceItem.id,
+            InvoiceItem.invoice_id,
+            InvoiceItem.line_number,
+            InvoiceItem.product_code,
+            InvoiceItem.description,
+            InvoiceItem.quantity,
+            InvoiceItem.unit_price,
+            InvoiceItem.subtotal,
+            InvoiceItem.created_at,
+        ).filter(InvoiceItem.invoice_id.in_(stale_invoice_ids))
+    ).mappings()
+
+    written = write_archive(invoices, item_rows)
+    for (day, branch_code), count in sorted(written.items()):
+        logger.info("🗄️ Archivadas %s facturas de %s (%s)", count, day, branch_code)
 
 
 def ensure_daily_reset(db: Session) -> bool:
-    """Guarda resúmenes diarios y elimina datos anteriores al día actual."""
+    """Guarda resúmenes diarios y elimina datos anteriores al día actual.
 
-    midnight_today_local = midnight_today()
-    date_source = func.coalesce(Invoice.invoice_date, Invoice.created_at)
+    Si las tablas están particionadas, las particiones de días anteriores se
+    sueltan con ``DETACH`` + ``DROP`` en lugar de borrar fila por fila.
+    """
+
+    global _reset_checked_day
 
+    if not settings.DAILY_RESET_ENABLED:
+        return False
+
+    today = day_clock.bounds()
+    if _reset_checked_day == today.ordinal:
+        return False
 
+    midnight_today_local = today.start
+    date_source = func.coalesce(Invoice.invoice_date, Invoice.created_at)
+
+    # Misma expresión que la clave de partición: con tablas particionadas
+    # solo se revisan las particiones anteriores a hoy.
     stale_exists = (
         db.query(Invoice.id)
-        .filter(Invoice.created_at < midnight_today_local)
+        .filter(date_source < midnight_today_local)
         .limit(1)
         .first()
     )
 
     if not stale_exists:
+        # Particiones vacías de días anteriores (creadas por adelantado).
+        if drop_partitions_before(db, today.day):
+            db.commit()
+        _reset_checked_day = today.ordinal
         return False
 
     _ensure_summary_table(db)
 
-    branch_map = {
-        branch.id: (branch.code or "").upper() if branch.code else None
-        for branch in db.query(Branch).all()
-    }
+    branch_map = branch_registry.code_map(db)
 
-    date_source = func.coalesce(Invoice.invoice_date, Invoice.created_at)
-
-    aggregation_rows = (
-        db.query(
-            func.date_trunc("day", date_source).label("day"),
-            Invoice.branch_id,
-            func.count(Invoice.id).label("invoice_count"),
-            func.coalesce(func.sum(Invoice.total), 0).label("total_sales"),
-            func.coalesce(func.sum(Invoice.subtotal), 0).label("total_net_sales"),
-        )
+    # Solo las fechas locales distintas, no una fila por factura.
+    local_day = cast(func.timezone(day_clock.tz.key, date_source), Date)
+    stale_days = {
+        day
+        for (day,) in db.query(local_day)
         .filter(date_source < midnight_today_local)
-
-
-        .group_by(func.date_trunc("day", date_source), Invoice.branch_id)
-        .all()
-    )
+        .distinct()
+    }
 
     try:
-        for row in aggregation_rows:
-            summary_date = row.day.date()
-            branch_id = row.branch_id
-            summary = (
-                db.query(DailySalesSummary)
-                .filter(
-                    DailySalesSummary.summary_date == summary_date,
-                    DailySalesSummary.branch_id == branch_id,
-                )
-                .one_or_none()
-            )
-
-            branch_code = _branch_code(branch_map, branch_id)
-
-            if summary:
-                summary.total_invoices = int(row.invoice_count or 0)
-                summary.total_sales = row.total_sales or 0
-                summary.total_net_sales = row.total_net_sales or 0
-                summary.branch_code = branch_code
-            else:
-                db.add(
-                    DailySalesSummary(
-                        summary_date=summary_date,
-                        branch_id=branch_id,
-                        branch_code=branch_code,
-                        total_invoices=int(row.invoice_count or 0),
-                        total_sales=row.total_sales or 0,
-                        total_net_sales=row.total_net_sales or 0,
-                    )
-                )
+        # Se recalcula con lo ya archivado del mismo día: las facturas tardías
+        # no pisan el resumen que dejó un cierre anterior.
+        rebuild_daily_summaries(db, stale_days, branch_map)
 
         stale_invoice_ids = select(Invoice.id).filter(
             date_source < midnight_today_local
         )
 
-        db.query(InvoiceItem).filter(
-            InvoiceItem.invoice_id.in_(stale_invoice_ids)
-        ).delete(synchronize_session=False)
-
+        if settings.ARCHIVE_ENABLED:
+            # Si el archivo falla no se borra nada: el cierre se reintenta.
+            _archive_stale_rows(db, stale_invoice_ids, date_source < midnight_today_local, branch_map)
+
+        # Con particiones los días completos se sueltan enteros. Los ítems
+        # se borran antes: los que viven en otra partición que su factura
+        # quedarían huérfanos si primero desaparece la factura.
+        plan = plan_partition_drops(db, today.day)
+        if not delete_retained_items(db, plan, midnight_today_local):
+            db.query(InvoiceItem).filter(
+                InvoiceItem.invoice_id.in_(stale_invoice_ids)
+            ).delete(synchronize_session=False)
+        drop_planned_partitions(db, plan)
+
+        # Lo que quedó en ``_default`` (o todo, sin particiones).
         db.query(Invoice).filter(date_source < midnight_today_local).delete(
-            synchronize_session=False        )
+            synchronize_session=False
+        )
 
         db.commit()
+        bump_data_version()
+        _reset_checked_day = today.ordinal
         return True
 
     except Exception:
         db.rollback()
-        raise
\ No newline at end of file
+        raise
+
+
+def run_daily_reset(label=None, attempt: int = 0) -> bool:
+    """Cierre con sesión propia; lo usan el arranque y el cambio de día.
+
+    Las rutas ya no lo llaman: con archivo y particiones el cierre escribe
+    archivos y hace DDL, y no debe correr dentro de una petición. Si falla,
+    se agenda un reintento con espera exponencial (ver
+    :func:`_schedule_retry`).
+    """
+
+    db = SessionLocal()
+    try:
+        if ensure_daily_reset(db):
+            logger.info("🧹 Cierre diario completado para %s", label or day_clock.bounds().day)
+            return True
+    except Exception as exc:
+        logger.warning("⚠️ No se pudo ejecutar el cierre diario: %s", exc)
+        _schedule_retry(label, attempt)
+    finally:
+        db.close()
+    return False
+
+
+def _retry_delay(attempt: int) -> float:
+    base = max(0.0, settings.DAILY_RESET_RETRY_BASE_SECONDS)
+    return min(settings.DAILY_RESET_RETRY_MAX_SECONDS, base * (2 ** min(attempt, 16)))
+
+
+def _schedule_retry(label, attempt: int) -> None:
+    global _retry_pending
+
+    with _retry_lock:
+        if _retry_pending:
+            return
+        _retry_pending = True
+    delay = _retry_delay(attempt)
+    logger.info("🔁 Reintento del cierre diario en %.0fs (intento %s)", delay, attempt + 1)
+    _retry_tasks.call_later(delay, _retry_daily_reset, label, attempt + 1)
+
+
+def _retry_daily_reset(label, attempt: int) -> None:
+    global _retry_pending
+
+    with _retry_lock:
+        _retry_pending = False
+    # Otro disparo (arranque o cambio de día) pudo completar el cierre.
+    if _reset_checked_day == day_clock.bounds().ordinal:
+        return
+    run_daily_reset(label, attempt)
+
+
+def _on_day_rollover(current, previous) -> None:
+    """Ejecuta el cierre apenas cambia el día, sin esperar a una petición."""
+
+    run_daily_reset(previous.day if previous else current.day)
+    db = SessionLocal()
+    try:
+        ensure_upcoming_partitions(db)
+        db.commit()
+    except Exception as exc:
+        db.rollback()
+        logger.warning("⚠️ No se pudieron crear las particiones próximas: %s", exc)
+    finally:
+        db.close()
+
+
+day_clock.subscribe(_on_day_rollover)
\ No newline at end of file
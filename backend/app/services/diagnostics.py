@@ -0,0 +1,97 @@
+"""Instantánea del estado del proceso para ``GET /diagnostics``.
+
+Reúne en un solo JSON lo que antes había que buscar en stdout: hilos de
+monitoreo, archivos en proceso, conexiones y tamaño del historial realtime,
+estado de los pools de SQLAlchemy y retraso del event loop. Todo sale de
+contadores en memoria (sin consultas ni E/S de disco salvo ``/proc``), así
+que se puede consultar cada pocos segundos.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Optional
+
+from app.database import async_engine, engine
+from app.services.file_reader import ingest_diagnostics
+from app.services.loop_monitor import LOOP_LAG_LAST_SECONDS, loop_monitor
+from app.services.realtime_manager import realtime_manager
+
+_STARTED_AT = time.time()
+_THREAD_SUFFIX = re.compile(r"[-_]\d+$")
+
+
+def _resident_memory() -> Optional[int]:
+    try:
+        with open("/proc/self/status", "r", encoding="ascii") as handle:
+            for line in handle:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def _pool_status(pool) -> dict:
+    status = {"class": type(pool).__name__}
+    # QueuePool y AsyncAdaptedQueuePool; otros pools no tienen contadores.
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        method = getattr(pool, name, None)
+        if callable(method):
+            status[name] = method()
+    timeout = getattr(pool, "timeout", None)
+    if callable(timeout):
+        status["timeout_s"] = timeout()
+    max_overflow = getattr(pool, "_max_overflow", None)
+    if "size" in status and isinstance(max_overflow, int):
+        capacity = status["size"] + max(max_overflow, 0)
+        status["capacity"] = capacity
+        status["exhausted"] = status.get("checkedout", 0) >= capacity
+    return status
+
+
+def _threads() -> dict:
+    threads = threading.enumerate()
+    groups = Counter(_THREAD_SUFFIX.sub("", thread.name) for thread in threads)
+    return {"total": len(threads), "by_name": dict(sorted(groups.items()))}
+
+
+def _realtime() -> dict:
+    connections = list(realtime_manager.connections.items())
+    history = list(realtime_manager.daily_messages.items())
+    return {
+        "connections": sum(len(sockets) for _, sockets in connections),
+        "connections_by_branch": {branch: len(sockets) for branch, sockets in connections},
+        "history": sum(len(events) for _, events in history),
+        "history_by_branch": {branch: len(events) for branch, events in history},
+        "loop_running": bool(realtime_manager.loop and realtime_manager.loop.is_running()),
+    }
+
+
+def collect() -> dict:
+    pools = {"sync": _pool_status(engine.pool)}
+    if async_engine is not None:
+        pools["async"] = _pool_status(async_engine.sync_engine.pool)
+
+    return {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "process": {
+            "pid": os.getpid(),
+            "uptime_s": round(time.time() - _STARTED_AT, 1),
+            "rss_bytes": _resident_memory(),
+        },
+        "threads": _threads(),
+        "ingest": ingest_diagnostics(),
+        "realtime": _realtime(),
+        "event_loop": {
+            "monitor_running": loop_monitor.running,
+            "lag_last_ms": round(LOOP_LAG_LAST_SECONDS.value() * 1000, 2),
+            "stalls_recorded": len(loop_monitor.stalls),
+        },
+        "db_pools": pools,
+    }
@@ -1,19 +1,56 @@
 import os
 import re
+import math
+import hashlib
 import time
-import traceback
 import asyncio
 import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
-from watchdog.observers.polling import PollingObserver
+from watchdog.observers.api import BaseObserver
 from watchdog.events import FileSystemEventHandler
-from app.services.parser import parse_invoice
+from app.services.parser import parse_invoice, parse_issue_date as _parse_invoice_issue_date
 from app.database import SessionLocal
 from app.models.invoice import Invoice
 from app.models.invoice_item import InvoiceItem
 from app.config import settings
 from app.services.realtime_manager import realtime_manager
-from datetime import datetime
+from app.services.realtime_events import InvoiceEvent
+from app.services.watcher import create_observer, select_backend, watcher_stats
+from app.services.invoice_sources import (
+    INVOICE_SOURCES,
+    InvoiceSource,
+    file_key,
+    register_source,
+    resolve_branch_id,
+    source_for_path,
+)
+from app.utils.delayed_queue import DelayedTaskQueue
+from app.utils.timezone import current_local_day_bounds
+from app.utils.logger import get_logger
+from app.services.response_cache import bump_data_version
+from app.services.freshness import freshness_tracker
+from app.services.metrics import (
+    INGEST_DETECTION_DELAY_SECONDS,
+    INGEST_END_TO_END_SECONDS,
+    INGEST_IN_FLIGHT,
+    INGEST_RESCAN_DURATION_SECONDS,
+    INGEST_RESCAN_PICKUPS_TOTAL,
+    INGEST_STAGE_SECONDS,
+)
+from app.services.ingestion_ledger import (
+    OUTCOME_DB_ERROR,
+    OUTCOME_DUPLICATE,
+    OUTCOME_PARSE_ERROR,
+    OUTCOME_READ_ERROR,
+    OUTCOME_STORED,
+    FileStat,
+    ingest_activity,
+    ingestion_ledger,
+)
+from datetime import datetime, time as dt_time, timezone
+
+logger = get_logger("ingest")
 
 def _coerce_positive(value: float, default: float) -> float:
     try:
@@ -25,60 +62,204 @@ def _coerce_positive(value: float, default: float) -> float:
     return default
 
 
-# Ruta de solo lectura y configuración de archivos
-NETWORK_PATH = settings.INVOICE_PATH
+# Prefijo por defecto (cada fuente de INVOICE_SOURCES define el suyo)
 FILE_PREFIX = settings.INVOICE_FILE_PREFIX.upper()
 POLL_INTERVAL = _coerce_positive(settings.INVOICE_POLL_INTERVAL, 2.0)
 PERIODIC_RESCAN_SECONDS = max(
     0.0, _coerce_positive(settings.INVOICE_PERIODIC_RESCAN_SECONDS, 120.0)
 )
 
+WATCHER_BACKEND = settings.INVOICE_WATCHER_BACKEND
+WATCHER_PROBE_TIMEOUT = _coerce_positive(settings.INVOICE_WATCHER_PROBE_TIMEOUT, 3.0)
+STABILITY_INTERVAL = _coerce_positive(settings.INGEST_STABILITY_INTERVAL, 1.0)
+STABILITY_MAX_WAIT = _coerce_positive(settings.INGEST_STABILITY_MAX_WAIT, 60.0)
+READ_RETRY_ATTEMPTS = max(1, int(settings.INGEST_READ_RETRY_ATTEMPTS))
+READ_RETRY_DELAY = _coerce_positive(settings.INGEST_READ_RETRY_DELAY, 1.0)
+
+
+# ===============================
+#   SONDEO ADAPTATIVO
+# ===============================
+def _parse_business_hours(value: str) -> list[tuple[dt_time, dt_time]]:
+    """Convierte ``"07:00-14:00,16:00-21:00"`` en rangos de hora local."""
+
+    ranges = []
+    for chunk in (value or "").split(","):
+        chunk = chunk.strip()
+        if not chunk or "-" not in chunk:
+            continue
+        start_text, end_text = (part.strip() for part in chunk.split("-", 1))
+        try:
+            ranges.append((dt_time.fromisoformat(start_text), dt_time.fromisoformat(end_text)))
+        except ValueError:
+            logger.warning("⚠️ Rango de horario comercial inválido: %r", chunk)
+    return ranges
+
+
+class AdaptivePollScheduler:
+    """Ajusta el intervalo de sondeo según la tasa de llegada de facturas.
+
+    La tasa se estima con un promedio móvil exponencial (EWMA) con vida media
+    ``half_life`` segundos. El intervalo se acerca a ``floor`` en ráfagas y a
+    ``ceiling`` cuando la sede está inactiva; dentro del horario comercial el
+    techo baja a ``business_ceiling``. El re-escaneo periódico escala en la
+    misma proporción a partir de ``rescan_period`` (el valor con el intervalo
+    comercial), limitado entre ``rescan_floor`` y ``rescan_ceiling``.
+    """
+
+    # Sondeos deseados entre dos llegadas consecutivas.
+    POLLS_PER_ARRIVAL = 10.0
+
+    def __init__(
+        self,
+        floor: float,
+        ceiling: float,
+        business_ceiling: float,
+        rescan_period: float,
+        rescan_floor: float,
+        rescan_ceiling: float,
+        half_life: float,
+        business_hours: Optional[list[tuple[dt_time, dt_time]]] = None,
+        enabled: bool = True,
+    ):
+        self.floor = floor
+        self.ceiling = max(ceiling, floor)
+        self.business_ceiling = min(max(business_ceiling, floor), self.ceiling)
+        self.rescan_floor = min(rescan_floor, rescan_period)
+        self.rescan_period = rescan_period
+        self.rescan_ceiling = max(rescan_ceiling, rescan_period)
+        self.tau = max(half_life, 1.0) / math.log(2)
+        self.business_hours = business_hours or []
+        self.enabled = enabled
+        self._rate = 0.0
+        self._updated_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _decayed_rate(self, now: float) -> float:
+        if self._updated_at is None:
+            return 0.0
+        elapsed = max(now - self._updated_at, 0.0)
+        return self._rate * math.exp(-elapsed / self.tau)
+
+    def record_arrivals(self, count: int = 1, now: Optional[float] = None):
+        now = time.time() if now is None else now
+        with self._lock:
+            self._rate = self._decayed_rate(now) + count / self.tau
+            self._updated_at = now
+
+    def arrival_rate(self, now: Optional[float] = None) -> float:
+        """Facturas por segundo estimadas al instante ``now``."""
+
+        now = time.time() if now is None else now
+        with self._lock:
+            return self._decayed_rate(now)
+
+    def in_business_hours(self, local_now: Optional[datetime] = None) -> bool:
+        if not self.business_hours:
+            return False
+        if local_now is None:
+            local_now, _, _ = current_local_day_bounds()
+        current = local_now.time().replace(tzinfo=None)
+        for start, end in self.business_hours:
+            if start <= end and start <= current < end:
+                return True
+            if start > end and (current >= start or current < end):
+                return True
+        return False
+
+    def poll_interval(self, now: Optional[float] = None, local_now: Optional[datetime] = None) -> float:
+        if not self.enabled:
+            return self.business_ceiling
+
+        ceiling = self.business_ceiling if self.in_business_hours(local_now) else self.ceiling
+        rate = self.arrival_rate(now)
+        if rate <= 0:
+            return ceiling
+        return min(max(1.0 / (rate * self.POLLS_PER_ARRIVAL), self.floor), ceiling)
+
+    def rescan_interval(self, now: Optional[float] = None, local_now: Optional[datetime] = None) -> float:
+        if not self.enabled:
+            return self.rescan_period
+
+        interval = self.poll_interval(now, local_now)
+        scale = interval / self.business_ceiling if self.business_ceiling > 0 else 1.0
+        return min(max(self.rescan_period * scale, self.rescan_floor), self.rescan_ceiling)
+
+
+def _build_poll_scheduler() -> AdaptivePollScheduler:
+    """Cada carpeta lleva su propia tasa de llegada."""
+
+    return AdaptivePollScheduler(
+        floor=min(_coerce_positive(settings.INVOICE_POLL_MIN_INTERVAL, 0.5), POLL_INTERVAL),
+        ceiling=_coerce_positive(settings.INVOICE_POLL_MAX_INTERVAL, 30.0),
+        business_ceiling=POLL_INTERVAL,
+        rescan_period=PERIODIC_RESCAN_SECONDS,
+        rescan_floor=_coerce_positive(settings.INVOICE_RESCAN_MIN_SECONDS, 30.0),
+        rescan_ceiling=_coerce_positive(settings.INVOICE_RESCAN_MAX_SECONDS, 900.0),
+        half_life=_coerce_positive(settings.INVOICE_ARRIVAL_HALF_LIFE, 300.0),
+        business_hours=_parse_business_hours(settings.INVOICE_BUSINESS_HOURS),
+        enabled=settings.INVOICE_POLL_ADAPTIVE,
+    )
+
+
+# Pool compartido de workers y cola de esperas (estabilidad y reintentos)
+_worker_pool = ThreadPoolExecutor(
+    max_workers=max(1, int(settings.INGEST_WORKERS)),
+    thread_name_prefix="invoice-worker",
+)
+_delayed_tasks = DelayedTaskQueue("invoice-delayed")
+
 # Control de archivos en proceso para evitar duplicados
 _processing_files = set()
 _processing_files_lock = threading.Lock()
+# Momento de detección de cada archivo en proceso (para la frescura)
+_detected_at: dict[str, float] = {}
 
 # Control de facturas en proceso (por número)
 _processing_invoices = set()
 _processing_invoices_lock = threading.Lock()
 
-# Control de rescaneos manuales para evitar solapamiento
-_rescan_lock = threading.Lock()
+# Monitores activos por carpeta (clave: ``InvoiceSource.key``)
+_monitors: dict[str, "SourceMonitor"] = {}
+_supervisor_thread: Optional[threading.Thread] = None
+
+def _stat_file(file_path: str) -> Optional[FileStat]:
+    """Devuelve ``(tamaño, mtime)`` del archivo o ``None`` si no existe."""
 
-def _load_processed_files_from_db() -> set[str]:
-    db = SessionLocal()
-    try:
-        return {row[0] for row in db.query(Invoice.source_file).all() if row[0]}
-    finally:
-        db.close()
-        
-def _get_processed_files(force_refresh: bool = False) -> set[str]:
     try:
-        return _load_processed_files_from_db()
-    except Exception as exc:
-        print("No se pudo obtener la lista de facturas procesadas", exc)
-        return set()
-    
-def _remember_processed_file(filename: Optional[str]):
-    # Ya no se mantiene un cache en memoria; la consulta a la base de datos
-    # evita reprocesar facturas existentes.
-    return
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime
+
 
+def _mark_file_processing(key: str) -> bool:
+    """Marca un archivo (por :func:`file_key`) como en proceso.
 
-def _mark_file_processing(filename: str) -> bool:
-    """Marca un archivo como en proceso. Devuelve False si ya estaba procesándose."""
+    Devuelve False si ya estaba procesándose.
+    """
 
     with _processing_files_lock:
-        if filename in _processing_files:
+        if key in _processing_files:
             return False
-        _processing_files.add(filename)
+        _processing_files.add(key)
+        _detected_at[key] = time.time()
+        INGEST_IN_FLIGHT.set(len(_processing_files))
         return True
 
 
-def _release_file(filename: str):
+def _release_file(key: str):
     """Libera un archivo previamente marcado como en proceso."""
 
     with _processing_files_lock:
-        _processing_files.discard(filename)
+        _processing_files.discard(key)
+        _detected_at.pop(key, None)
+        INGEST_IN_FLIGHT.set(len(_processing_files))
+
+
+def _detection_time(key: str) -> Optional[float]:
+    with _processing_files_lock:
+        return _detected_at.get(key)
 
 
 def _mark_invoice_processing(invoice_number: Optional[str]) -> bool:
@@ -102,85 +283,100 @@ def _release_invoice(invoice_number: Optional[str]):
         _processing_invoices.discard(invoice_number)
 
 
-def _read_file_with_retry(file_path: str, attempts: int = 5, delay: float = 1.0) -> Optional[bytes]:
-    """Intenta leer un archivo varias veces para evitar errores por bloqueos de red."""
-
-    last_error: Optional[Exception] = None
+class FileBusyError(Exception):
+    """El archivo sigue bloqueado por otro proceso; se reintentará más tarde."""
 
-    for attempt in range(1, attempts + 1):
-        try:
-            with open(file_path, "rb") as f:
-
-                return f.read()
-        except FileNotFoundError:
-            print(f"⚠️ El archivo desapareció antes de poder leerlo: {file_path}")
-            return None
-        except OSError as exc:
-            last_error = exc
-            wait_time = delay * attempt
-            print(
-                f"⏳ Archivo {file_path} en uso (intento {attempt}/{attempts}): {exc}. "
-                f"Reintentando en {wait_time:.1f}s"
-            )
-            time.sleep(wait_time)
-        except Exception as exc:
-            last_error = exc
-            print(f"❌ Error inesperado leyendo {file_path}: {exc}")
-            break
 
-    if last_error:
-        print(f"❌ No se pudo leer {file_path} después de varios intentos: {last_error}")
-    return None
+def _read_file_once(file_path: str) -> Optional[bytes]:
+    """Lee el archivo una sola vez sin dormir el hilo.
 
+    Devuelve ``None`` si el archivo desapareció o falló de forma inesperada y
+    lanza :class:`FileBusyError` si está bloqueado (por ejemplo, Siesa aún lo
+    está escribiendo por la red).
+    """
 
-# ===============================
-#   UTILIDADES DE PARSEO
-# ===============================
-def _parse_invoice_issue_date(raw_date: Optional[str]) -> Optional[datetime]:
-    if not raw_date:
+    try:
+        with open(file_path, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        logger.warning("⚠️ El archivo desapareció antes de poder leerlo: %s", file_path)
         return None
-
-    raw_date = raw_date.strip()
-    if not raw_date:
+    except OSError as exc:
+        raise FileBusyError(str(exc)) from exc
+    except Exception as exc:
+        logger.error("❌ Error inesperado leyendo %s: %s", file_path, exc)
         return None
 
-    candidates = (
-        "%Y-%m-%dT%H:%M:%S%z",
-        "%Y-%m-%dT%H:%M:%S.%f%z",
-        "%Y-%m-%dT%H:%M:%S",
-        "%Y-%m-%dT%H:%M:%S.%f",
-        "%Y-%m-%d",
-        "%Y-%b-%d %I:%M %p",
-        "%Y-%b-%d",
-    )
 
-    for fmt in candidates:
-        try:
-            return datetime.strptime(raw_date, fmt)
-        except ValueError:
-            continue
-
-    try:
-        return datetime.fromisoformat(raw_date)
-    except ValueError:
-        pass
-
-    return None
+def _observe_broadcast(
+    started: float,
+    file_stat: Optional[FileStat],
+    branch_code: str,
+    detected_at: Optional[float] = None,
+    committed_at: Optional[float] = None,
+):
+    INGEST_STAGE_SECONDS.observe(time.perf_counter() - started, stage="broadcast")
+    sent_at = time.time()
+    if file_stat is not None:
+        INGEST_END_TO_END_SECONDS.observe(
+            max(sent_at - file_stat[1], 0.0), branch=branch_code
+        )
+    freshness_tracker.record(
+        branch_code,
+        written_at=file_stat[1] if file_stat else None,
+        detected_at=detected_at,
+        committed_at=committed_at,
+        sent_at=sent_at,
+    )
 
 
 # ===============================
 #   PROCESAR ARCHIVO XML
 # ===============================
-def process_file(file_path: str):
-    """Lee, procesa y guarda una factura sin bloquear el hilo principal."""
+def process_file(file_path: str, attempt: int = 1):
+    """Lee, procesa y guarda una factura sin bloquear el hilo principal.
+
+    Si el archivo está bloqueado y quedan intentos, lanza
+    :class:`FileBusyError` para que el llamador lo reagende sin esperar.
+    """
 
     filename = os.path.basename(file_path)
-    print(f"📄 Procesando archivo: {file_path}")
+    source = source_for_path(file_path)
+    if source is None:
+        return
+    key = file_key(file_path)
+    file_stat = _stat_file(file_path)
+    detected_at = _detection_time(key)
+    if not ingestion_ledger.should_process(key, file_stat):
+        return
+
+    logger.debug("📄 Procesando archivo: %s", file_path)
+
+    stage_started = time.perf_counter()
+    try:
+        content = _read_file_once(file_path)
+    except FileBusyError as exc:
+        if attempt < READ_RETRY_ATTEMPTS:
+            raise
+        logger.error("❌ No se pudo leer %s después de %s intentos: %s", file_path, attempt, exc)
+        content = None
 
-    content = _read_file_with_retry(file_path)
     if content is None:
+        ingestion_ledger.record_failure(
+            key, file_stat, OUTCOME_READ_ERROR, "No se pudo leer el archivo"
+        )
+        return
+
+    INGEST_STAGE_SECONDS.observe(time.perf_counter() - stage_started, stage="read")
+
+    content_hash = hashlib.sha256(content).hexdigest()
+    if ingestion_ledger.is_known_content(key, content_hash):
+        # Mismo contenido con otra fecha de modificación: solo se actualiza el stat.
+        record = ingestion_ledger.get(key)
+        ingestion_ledger.record_success(key, file_stat, record.outcome, content_hash)
         return
 
+    stage_started = time.perf_counter()
     try:
         # === Parsear contenido ===
         parsed = parse_invoice(content)
@@ -191,30 +387,39 @@ def process_file(file_path: str):
         raw_date = header.get("issue_date") or header.get("date")
         invoice_date = _parse_invoice_issue_date(raw_date)
         if raw_date and invoice_date is None:
-            print(f"⚠️ No se pudo parsear la fecha '{raw_date}'")
+            logger.warning("⚠️ No se pudo parsear la fecha %r", raw_date)
 
     except Exception as e:
-        print(f"⚠️ Error al parsear {file_path}: {e}")
-        traceback.print_exc()
+        logger.warning("⚠️ Error al parsear %s: %s", file_path, e, exc_info=True)
+        ingestion_ledger.record_failure(
+            key, file_stat, OUTCOME_PARSE_ERROR, e, content_hash
+        )
         return
+    INGEST_STAGE_SECONDS.observe(time.perf_counter() - stage_started, stage="parse")
 
     invoice_number = header.get("number")
     invoice_lock_acquired = _mark_invoice_processing(invoice_number)
     if not invoice_lock_acquired:
-        print(
-            f"🔁 Factura {invoice_number} ya está en proceso desde otro archivo. Se omite {filename}."
+        logger.debug(
+            "🔁 Factura %s ya está en proceso desde otro archivo. Se omite %s.",
+            invoice_number,
+            filename,
         )
-        _remember_processed_file(filename)
+        ingest_activity.record("in_progress")
         return
 
     db = None
+    ledger_recorded = False
     try:
+        stage_started = time.perf_counter()
         db = SessionLocal()
-        # === Validar duplicado por archivo ===
-        exists = db.query(Invoice).filter(Invoice.source_file == filename).first()
+        # === Validar duplicado por archivo (ruta completa, no solo el nombre) ===
+        exists = db.query(Invoice).filter(Invoice.source_file == key).first()
         if exists:
-            print(f"⏩ Factura ya registrada ({filename}), se omite.")
-            _remember_processed_file(filename)
+            logger.debug("⏩ Factura ya registrada (%s), se omite.", filename)
+            ingestion_ledger.record_success(
+                key, file_stat, OUTCOME_STORED, content_hash
+            )
             return
         
         # === Validar duplicado por número de factura ===
@@ -226,22 +431,26 @@ def process_file(file_path: str):
                 .first()
             )
             if duplicate_number:
-                print(
-                    f"⏩ Factura {invoice_number} ya fue registrada desde {duplicate_number.source_file},"
-                    f" se omite {filename}."
+                logger.debug(
+                    "⏩ Factura %s ya fue registrada desde %s, se omite %s.",
+                    invoice_number,
+                    duplicate_number.source_file,
+                    filename,
+                )
+                ingestion_ledger.record_success(
+                    key, file_stat, OUTCOME_DUPLICATE, content_hash
                 )
-                _remember_processed_file(filename)
                 return
 
         # === Guardar cabecera ===
         invoice = Invoice(
             number=invoice_number,
-            branch_id=None,
+            branch_id=resolve_branch_id(source.branch_code),
             subtotal=float(totals.get("subtotal", 0) or 0),
             vat=float(totals.get("iva", 0) or 0),
             discount=float(totals.get("discount", 0) or 0),
             total=float(totals.get("total", 0) or 0),
-            source_file=filename,
+            source_file=key,
             invoice_date=invoice_date,
         )
         db.add(invoice)
@@ -249,9 +458,12 @@ def process_file(file_path: str):
         db.refresh(invoice)
 
         # === Guardar ítems ===
+        # Con la fecha de la factura: así caen en la misma partición diaria.
+        items_created_at = invoice.invoice_date or invoice.created_at
         for item in items:
             db_item = InvoiceItem(
                 invoice_id=invoice.id,
+                created_at=items_created_at,
                 line_number=int(item.get("line_number") or 0),
                 product_code=item.get("product_code"),
                 description=item.get("description"),
@@ -267,42 +479,61 @@ def process_file(file_path: str):
                 db_item.iva_amount = item.get("iva_amount")
             db.add(db_item)
         db.commit()
+        committed_at = time.time()
+        INGEST_STAGE_SECONDS.observe(time.perf_counter() - stage_started, stage="db")
+        bump_data_version()
 
-        print(f"💾 Factura {invoice.number} guardada con éxito ({len(items)} ítems)")
-        _remember_processed_file(filename)
+        logger.debug("💾 Factura %s guardada con éxito (%s ítems)", invoice.number, len(items))
+        ingestion_ledger.record_success(key, file_stat, OUTCOME_STORED, content_hash)
+        ledger_recorded = True
 
         # === Enviar evento realtime ===
-        created_timestamp = (
-            invoice.created_at.isoformat() if invoice.created_at else datetime.now().isoformat()
+        event = InvoiceEvent.create(
+            source.branch_code,
+            invoice_number=invoice.number,
+            items=len(items),
+            total=invoice.total,
+            subtotal=invoice.subtotal,
+            file=filename,
+            invoice_date=invoice.invoice_date,
+            created_at=invoice.created_at,
+            extra={
+                "freshness": {
+                    "written_at": file_stat[1] if file_stat else None,
+                    "detected_at": detected_at,
+                    "committed_at": committed_at,
+                }
+            },
         )
-        payload = {
-            "event": "new_invoice",
-            "invoice_number": invoice.number,
-            "items": len(items),
-            "total": float(invoice.total or 0),
-            "subtotal": float(invoice.subtotal or 0),
-            "file": filename,
-            "invoice_date": invoice.invoice_date.isoformat() if invoice.invoice_date else None,
-            "timestamp": created_timestamp,
-            "created_at": created_timestamp,
-        }
 
         loop = realtime_manager.loop
+        broadcast_started = time.perf_counter()
+        observe = (broadcast_started, file_stat, source.branch_code, detected_at, committed_at)
 
         if loop and loop.is_running():
-            asyncio.run_coroutine_threadsafe(
-                realtime_manager.broadcast("FLO", payload), loop
+            future = asyncio.run_coroutine_threadsafe(
+                realtime_manager.broadcast(source.branch_code, event), loop
             )
+            future.add_done_callback(lambda _: _observe_broadcast(*observe))
         else:
-            asyncio.run(realtime_manager.broadcast("FLO", payload))
-
-        print("📡 Notificación enviada al WebSocket (FLO).")
+            asyncio.run(realtime_manager.broadcast(source.branch_code, event))
+            _observe_broadcast(*observe)
+
+        logger.debug("📡 Notificación enviada al WebSocket (%s).", source.branch_code)
+        monitor = _monitors.get(source.key)
+        watcher_stats.record_latency(
+            file_stat[1] if file_stat else None,
+            backend=monitor.backend if monitor else None,
+        )
 
     except Exception as e:
         if db is not None:
             db.rollback()
-        print(f"❌ Error guardando {file_path}: {e}")
-        traceback.print_exc()
+        logger.error("❌ Error guardando %s: %s", file_path, e, exc_info=True)
+        if not ledger_recorded:
+            ingestion_ledger.record_failure(
+                key, file_stat, OUTCOME_DB_ERROR, e, content_hash
+            )
     finally:
         if db is not None:
             db.close()
@@ -313,45 +544,80 @@ def process_file(file_path: str):
 # ===============================
 #   ESCANEO INICIAL
 # ===============================
-def _is_valid_invoice_file(filename: str) -> bool:
+def _is_valid_invoice_file(filename: str, prefix: str = FILE_PREFIX) -> bool:
     """Valida el nombre del archivo por extensión y prefijo."""
 
     name_upper = filename.upper()
-    if not name_upper.startswith(FILE_PREFIX):
+    if not name_upper.startswith(prefix):
         return False
 
+    # Solo ``.xml`` simple: ``.pdf.xml`` o ``.xml.xml`` son copias del PDV.
+    return name_upper.endswith(".XML") and name_upper.count(".") == 1
 
-def initial_scan(force_refresh: bool = False):
-    """Procesa archivos existentes al iniciar (solo nuevos)."""
-    print("🔍 Escaneo de la carpeta de facturas...")
+
+def scan_source(source: InvoiceSource, force_refresh: bool = False):
+    """Procesa los archivos existentes de una carpeta (solo nuevos)."""
+    logger.debug("🔍 Escaneo de la carpeta de facturas %s (%s)...", source.path, source.branch_code)
 
     scheduled = 0
     skipped = 0
+    scan_started = time.perf_counter()
 
     try:
-        processed_files = _get_processed_files(force_refresh=force_refresh)
-        files = [f for f in os.listdir(NETWORK_PATH) if _is_valid_invoice_file(f)]
-        print(f"📂 Archivos encontrados: {len(files)}")
-
-        for filename in files:
-            if filename in processed_files:
+        if force_refresh:
+            ingestion_ledger.refresh_quarantined()
+        else:
+            ingestion_ledger.ensure_loaded()
+
+        with os.scandir(source.path) as entries:
+            files = [
+                entry for entry in entries
+                if entry.is_file() and _is_valid_invoice_file(entry.name, source.prefix)
+            ]
+
+        keys = {entry.path: file_key(entry.path) for entry in files}
+        ingestion_ledger.prune_missing(source.key, keys.values())
+
+        now = time.time()
+        for entry in files:
+            try:
+                stat = entry.stat()
+                file_stat = (stat.st_size, stat.st_mtime)
+            except OSError:
+                file_stat = None
+
+            if not ingestion_ledger.should_process(keys[entry.path], file_stat, now):
                 skipped += 1
-                print(f"⏩ Saltando {filename} (ya registrado)")
                 continue
 
-            file_path = os.path.join(NETWORK_PATH, filename)
-            schedule_file_processing(file_path)
+            schedule_file_processing(entry.path)
             scheduled += 1
 
-        print("✅ Escaneo completado.")
+        if scheduled:
+            INGEST_RESCAN_PICKUPS_TOTAL.inc(scheduled, branch=source.branch_code)
+
+        logger.info(
+            "✅ Escaneo de %s: %s archivos, %s encolados, %s ya registrados (%.1fs)",
+            source.branch_code,
+            len(files),
+            scheduled,
+            skipped,
+            time.perf_counter() - scan_started,
+        )
     except Exception as e:
-        print(f"⚠️ Error en el escaneo inicial: {e}")
+        logger.warning("⚠️ Error en el escaneo de %s: %s", source.path, e)
+        INGEST_RESCAN_DURATION_SECONDS.set(
+            time.perf_counter() - scan_started, branch=source.branch_code
+        )
         return {
             "scheduled": scheduled,
             "skipped": skipped,
             "error": str(e),
         }
 
+    INGEST_RESCAN_DURATION_SECONDS.set(
+        time.perf_counter() - scan_started, branch=source.branch_code
+    )
     return {
         "scheduled": scheduled,
         "skipped": skipped,
@@ -359,108 +625,340 @@ def initial_scan(force_refresh: bool = False):
     }
 
 
+def initial_scan(force_refresh: bool = False):
+    """Escanea todas las carpetas configuradas y suma los resultados."""
+
+    if force_refresh:
+        # Una sola relectura de la cuarentena para todas las carpetas.
+        ingestion_ledger.refresh_quarantined()
+
+    totals = {"scheduled": 0, "skipped": 0, "total": 0}
+    errors = {}
+    sources = {}
+    for source in INVOICE_SOURCES:
+        monitor = _monitors.get(source.key)
+        if monitor is not None:
+            result = monitor.scan()
+        else:
+            result = scan_source(source)
+
+        sources[source.branch_code] = result
+        totals["scheduled"] += result.get("scheduled", 0)
+        totals["skipped"] += result.get("skipped", 0)
+        if "error" in result:
+            errors[source.branch_code] = result["error"]
+
+    totals["total"] = totals["scheduled"] + totals["skipped"]
+    totals["sources"] = sources
+    if errors:
+        totals["error"] = "; ".join(f"{code}: {error}" for code, error in errors.items())
+    return totals
+
+
 # ===============================
 #   MONITOR DE NUEVOS ARCHIVOS
 # ===============================
 class InvoiceFileHandler(FileSystemEventHandler):
     """Detecta archivos nuevos y los procesa en un hilo separado."""
 
+    def __init__(self, source: InvoiceSource, scheduler: AdaptivePollScheduler):
+        self.source = source
+        self.scheduler = scheduler
+
+    def _detected(self, file_path: str):
+        self.scheduler.record_arrivals()
+        file_stat = _stat_file(file_path)
+        if file_stat is not None:
+            INGEST_DETECTION_DELAY_SECONDS.observe(
+                max(time.time() - file_stat[1], 0.0), branch=self.source.branch_code
+            )
+
     def on_created(self, event):
         if event.is_directory:
             return
 
         filename = os.path.basename(event.src_path)
-        if _is_valid_invoice_file(filename):
-            print(f"🆕 Nuevo archivo detectado: {event.src_path}")
+        if _is_valid_invoice_file(filename, self.source.prefix):
+            logger.debug("🆕 Nuevo archivo detectado: %s", event.src_path)
+            self._detected(event.src_path)
             schedule_file_processing(event.src_path)
 
+    def on_moved(self, event):
+        # Con observadores nativos, un archivo escrito con nombre temporal y
+        # luego renombrado llega como ``moved`` en lugar de ``created``.
+        if event.is_directory:
+            return
+
+        filename = os.path.basename(event.dest_path)
+        if _is_valid_invoice_file(filename, self.source.prefix):
+            logger.debug("🆕 Nuevo archivo detectado (renombrado): %s", event.dest_path)
+            self._detected(event.dest_path)
+            schedule_file_processing(event.dest_path)
+
 
 def schedule_file_processing(file_path: str):
-    """Encola el procesamiento de un archivo evitando duplicados simultáneos."""
+    """Encola el procesamiento de un archivo evitando duplicados simultáneos.
+
+    El archivo pasa primero por la compuerta de estabilidad y luego al pool
+    de workers; ninguna de las esperas ocupa un hilo del pool.
+    """
+
+    key = file_key(file_path)
+    if not _mark_file_processing(key):
+        logger.debug("🔁 Archivo %s ya está en proceso. Se omite encolado duplicado.", file_path)
+        return
+
+    try:
+        _await_stability(file_path, None, time.monotonic())
+    except Exception:
+        _release_file(key)
+        raise
+
+
+def _await_stability(file_path: str, previous_stat: Optional[FileStat], started_at: float):
+    """Entrega el archivo cuando su tamaño y mtime no cambian entre dos sondeos."""
 
     filename = os.path.basename(file_path)
-    if not _mark_file_processing(filename):
-        print(f"🔁 Archivo {filename} ya está en proceso. Se omite encolado duplicado.")
+    current_stat = _stat_file(file_path)
+    if current_stat is None:
+        logger.warning("⚠️ El archivo desapareció antes de estabilizarse: %s", file_path)
+        _release_file(file_key(file_path))
         return
 
-    def _runner():
-        try:
-            process_file(file_path)
-        finally:
-            _release_file(filename)
+    if previous_stat is not None and current_stat == previous_stat:
+        _submit_file(file_path, 1)
+        return
 
+    if time.monotonic() - started_at >= STABILITY_MAX_WAIT:
+        logger.warning(
+            "⚠️ %s sigue cambiando tras %.0fs; se procesa igual.", filename, STABILITY_MAX_WAIT
+        )
+        _submit_file(file_path, 1)
+        return
+
+    _delayed_tasks.call_later(
+        STABILITY_INTERVAL, _await_stability, file_path, current_stat, started_at
+    )
+
+
+def _submit_file(file_path: str, attempt: int):
     try:
-        threading.Thread(target=_runner, daemon=True).start()
+        _worker_pool.submit(_run_file, file_path, attempt)
     except Exception:
-        _release_file(filename)
+        _release_file(file_key(file_path))
         raise
 
 
-def start_file_monitor():
-    """Inicia el monitoreo continuo de la carpeta de red."""
-    print(f"👀 Monitoreando carpeta: {NETWORK_PATH}")
-
-    # Escaneo inicial protegido para evitar solaparse con rescaneos manuales
-    with _rescan_lock:
-        initial_scan(force_refresh=True)
-
-    # Monitor en tiempo real
-    event_handler = InvoiceFileHandler()
-    observer: Optional[PollingObserver] = None
-    next_periodic_rescan: Optional[float] = (
-        time.time() + PERIODIC_RESCAN_SECONDS
-        if PERIODIC_RESCAN_SECONDS > 0
-        else None
-    )
+def _run_file(file_path: str, attempt: int):
+    retry_scheduled = False
+    try:
+        process_file(file_path, attempt)
+    except FileBusyError as exc:
+        wait_time = READ_RETRY_DELAY * attempt
+        logger.info(
+            "⏳ Archivo %s en uso (intento %s/%s): %s. Reintentando en %.1fs",
+            file_path,
+            attempt,
+            READ_RETRY_ATTEMPTS,
+            exc,
+            wait_time,
+        )
+        _delayed_tasks.call_later(wait_time, _submit_file, file_path, attempt + 1)
+        retry_scheduled = True
+    except Exception:
+        logger.exception("❌ Error inesperado procesando %s", file_path)
+    finally:
+        if not retry_scheduled:
+            _release_file(file_key(file_path))
+
+
+class SourceMonitor:
+    """Observador, re-escaneo periódico y candado propios de una carpeta.
+
+    Cada carpeta corre en su propio hilo: un recurso compartido lento o caído
+    no retrasa los escaneos de las demás. Todas entregan al mismo pool.
+    """
+
+    def __init__(self, source: InvoiceSource):
+        self.source = register_source(source)
+        self.scan_lock = threading.Lock()
+        self.scheduler = _build_poll_scheduler()
+        self.backend: Optional[str] = None
+        self.observer: Optional[BaseObserver] = None
+        self.thread: Optional[threading.Thread] = None
+        # Estado para /diagnostics. Los campos ``last_scan_*`` los escribe
+        # cualquier hilo que escanee (el monitor o el re-escaneo manual) y se
+        # leen juntos bajo ``_state_lock``; el resto solo el hilo del monitor.
+        self._state_lock = threading.Lock()
+        self.observer_starts = 0
+        self.last_scan_at: Optional[float] = None
+        self.last_scan_seconds: Optional[float] = None
+        self.last_scan_result: Optional[dict] = None
+        self.next_rescan_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def scan(self, force_refresh: bool = False) -> dict:
+        with self.scan_lock:
+            started = time.perf_counter()
+            result = scan_source(self.source, force_refresh)
+            with self._state_lock:
+                self.last_scan_seconds = time.perf_counter() - started
+                self.last_scan_at = time.time()
+                self.last_scan_result = result
+        return result
+
+    def snapshot(self) -> dict:
+        observer = self.observer
+        now = time.time()
+        # No se usa ``scan_lock``: un escaneo lento no debe frenar /diagnostics.
+        with self._state_lock:
+            last_scan_at = self.last_scan_at
+            last_scan_seconds = self.last_scan_seconds
+            last_scan_result = self.last_scan_result
+        return {
+            "branch": self.source.branch_code,
+            "path": self.source.path,
+            "thread_alive": bool(self.thread and self.thread.is_alive()),
+            "backend": self.backend,
+            "observer_alive": bool(observer and observer.is_alive()),
+            "observer_starts": self.observer_starts,
+            "poll_interval_s": round(self.scheduler.poll_interval(), 3),
+            "arrival_rate_per_min": round(self.scheduler.arrival_rate() * 60, 3),
+            "last_scan_at": _iso_timestamp(last_scan_at),
+            "last_scan_seconds": (
+                round(last_scan_seconds, 3) if last_scan_seconds is not None else None
+            ),
+            "last_scan_error": (last_scan_result or {}).get("error"),
+            "next_rescan_at": _iso_timestamp(self.next_rescan_at),
+            "next_rescan_in_s": (
+                round(max(self.next_rescan_at - now, 0.0), 1)
+                if self.next_rescan_at is not None
+                else None
+            ),
+            "last_error": self.last_error,
+        }
 
-    while True:
+    def stop_observer(self):
+        if self.observer is None:
+            return
         try:
-            if observer is None or not observer.is_alive():
-                if observer is not None:
-                    try:
-                        observer.stop()
-                        observer.join()
-                    except Exception:
-                        pass
-
-                observer = PollingObserver(timeout=POLL_INTERVAL)
-                observer.schedule(event_handler, NETWORK_PATH, recursive=False)
-                observer.start()
-                print("✅ Monitor de archivos activo (modo solo lectura)")
-                
-            if (
-                next_periodic_rescan is not None
-                and time.time() >= next_periodic_rescan
-            ):
-                with _rescan_lock:
-                    print("🔁 Re-escaneo periódico de facturas en curso...")
-                    initial_scan()
-                next_periodic_rescan = time.time() + PERIODIC_RESCAN_SECONDS
-
-            time.sleep(5)
-        except KeyboardInterrupt:
-            if observer is not None:
-                observer.stop()
-                observer.join()
-            break
-        except Exception as exc:
-            print(f"⚠️ Monitor detenido por error inesperado: {exc}")
-            if observer is not None:
-                try:
-                    observer.stop()
-                    observer.join()
-                except Exception:
-                    pass
-                observer = None
-            if PERIODIC_RESCAN_SECONDS > 0:
-                next_periodic_rescan = time.time() + PERIODIC_RESCAN_SECONDS
-            time.sleep(5)
+            self.observer.stop()
+            self.observer.join()
+        except Exception:
+            pass
+        self.observer = None
+
+    def run(self):
+        source = self.source
+        logger.info("👀 Monitoreando carpeta: %s (sede %s)", source.path, source.branch_code)
+
+        self.scan()
+
+        event_handler = InvoiceFileHandler(source, self.scheduler)
+        self.next_rescan_at = (
+            time.time() + self.scheduler.rescan_interval()
+            if PERIODIC_RESCAN_SECONDS > 0
+            else None
+        )
+
+        while True:
+            try:
+                if self.observer is None or not self.observer.is_alive():
+                    self.stop_observer()
+
+                    backend = select_backend(
+                        source.path, WATCHER_BACKEND, WATCHER_PROBE_TIMEOUT
+                    )
+                    observer = create_observer(backend, self.scheduler.poll_interval)
+                    observer.schedule(event_handler, source.path, recursive=False)
+                    observer.start()
+                    self.observer = observer
+                    self.backend = backend
+                    self.observer_starts += 1
+                    watcher_stats.set_backend(backend)
+                    logger.info(
+                        "✅ Monitor de archivos activo en %s (modo solo lectura, backend: %s)",
+                        source.branch_code,
+                        backend,
+                    )
+
+                if (
+                    self.next_rescan_at is not None
+                    and time.time() >= self.next_rescan_at
+                ):
+                    self.scan()
+                    self.next_rescan_at = time.time() + self.scheduler.rescan_interval()
+
+                ingest_activity.flush_if_due()
+                time.sleep(5)
+            except Exception as exc:
+                logger.warning(
+                    "⚠️ Monitor de %s detenido por error inesperado: %s", source.branch_code, exc
+                )
+                self.last_error = f"{type(exc).__name__}: {exc}"
+                self.stop_observer()
+                if PERIODIC_RESCAN_SECONDS > 0:
+                    self.next_rescan_at = time.time() + self.scheduler.rescan_interval()
+                time.sleep(5)
+
+
+def start_file_monitor():
+    """Inicia un monitor por cada carpeta configurada y espera a que terminen."""
+
+    global _supervisor_thread
+    _supervisor_thread = threading.current_thread()
+    ingestion_ledger.ensure_loaded()
+
+    threads = []
+    for source in INVOICE_SOURCES:
+        monitor = SourceMonitor(source)
+        _monitors[source.key] = monitor
+        thread = threading.Thread(
+            target=monitor.run,
+            name=f"invoice-monitor-{source.branch_code}",
+            daemon=True,
+        )
+        monitor.thread = thread
+        thread.start()
+        threads.append(thread)
+
+    try:
+        while any(thread.is_alive() for thread in threads):
+            time.sleep(max(PERIODIC_RESCAN_SECONDS, 60.0))
+            watcher_stats.report()
+    except KeyboardInterrupt:
+        for monitor in _monitors.values():
+            monitor.stop_observer()
+
+
+def _iso_timestamp(value: Optional[float]) -> Optional[str]:
+    if value is None:
+        return None
+    return datetime.fromtimestamp(value, timezone.utc).isoformat()
+
+
+def ingest_diagnostics() -> dict:
+    """Estado de la ingesta para ``/diagnostics`` (sin E/S, solo contadores)."""
+
+    with _processing_files_lock:
+        processing_files = len(_processing_files)
+    with _processing_invoices_lock:
+        processing_invoices = len(_processing_invoices)
+    supervisor = _supervisor_thread
+    return {
+        "supervisor_alive": bool(supervisor and supervisor.is_alive()),
+        "processing_files": processing_files,
+        "processing_invoices": processing_invoices,
+        "worker_queue": _worker_pool._work_queue.qsize(),
+        "workers": _worker_pool._max_workers,
+        "delayed_tasks": len(_delayed_tasks),
+        "monitors": [monitor.snapshot() for monitor in list(_monitors.values())],
+    }
 
 
 def trigger_manual_rescan():
     """Permite lanzar un rescan desde la API sin bloquear el monitor."""
 
-    with _rescan_lock:
-        result = initial_scan(force_refresh=True)
+    result = initial_scan(force_refresh=True)
 
-    return result or {"scheduled": 0, "skipped": 0}
\ No newline at end of file
+    return result or {"scheduled": 0, "skipped": 0}
@@ -0,0 +1,196 @@
+"""Frescura de los datos por sede: qué tan atrasado está el tablero.
+
+Cada factura lleva por la ingesta sus marcas de tiempo (``time.time()``):
+
+* ``written_at``: mtime del archivo en la carpeta compartida;
+* ``detected_at``: cuando el observador o el escaneo lo encoló;
+* ``committed_at``: ``commit`` en Postgres;
+* ``sent_at``: fin del ``broadcast`` a los clientes.
+
+:class:`FreshnessTracker` guarda una ventana móvil por sede y resume los
+retrasos de cada tramo (archivo → detección → base → clientes) junto con la
+antigüedad del último dato entregado. Se consulta en ``GET /freshness`` y
+:func:`run_freshness_publisher` envía el resumen por el canal realtime como
+evento ``freshness`` (sin guardarlo en el historial del día). Los gauges de
+``/metrics`` se calculan al exportar, haya o no alguien mirando.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Deque, Dict, List, NamedTuple, Optional
+
+from app.config import settings
+from app.services.metrics import registry
+from app.services.realtime_manager import realtime_manager
+from app.utils.logger import get_logger
+
+logger = get_logger("freshness")
+
+FRESHNESS_STALENESS_SECONDS = registry.gauge(
+    "visor_freshness_staleness_seconds",
+    "Antigüedad (desde el mtime del archivo) de la última factura entregada por sede.",
+    ("branch",),
+)
+FRESHNESS_LAG_P95_SECONDS = registry.gauge(
+    "visor_freshness_lag_p95_seconds",
+    "p95 del retraso por tramo en la ventana de frescura.",
+    ("branch", "stage"),
+)
+
+# (nombre del tramo, marca inicial, marca final)
+STAGES = (
+    ("detect", "written_at", "detected_at"),
+    ("commit", "detected_at", "committed_at"),
+    ("deliver", "committed_at", "sent_at"),
+    ("end_to_end", "written_at", "sent_at"),
+)
+
+
+class FreshnessSample(NamedTuple):
+    written_at: Optional[float]
+    detected_at: Optional[float]
+    committed_at: Optional[float]
+    sent_at: float
+
+
+def _percentile(sorted_values: List[float], fraction: float) -> float:
+    index = max(math.ceil(fraction * len(sorted_values)) - 1, 0)
+    return sorted_values[index]
+
+
+def _iso(value: Optional[float]) -> Optional[str]:
+    if value is None:
+        return None
+    return datetime.fromtimestamp(value, timezone.utc).isoformat()
+
+
+class FreshnessTracker:
+    def __init__(self, window_seconds: float, max_samples: int = 2000):
+        self.window_seconds = max(window_seconds, 1.0)
+        self.max_samples = max(max_samples, 1)
+        self._samples: Dict[str, Deque[FreshnessSample]] = {}
+        self._last: Dict[str, FreshnessSample] = {}
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        branch: str,
+        *,
+        written_at: Optional[float],
+        detected_at: Optional[float],
+        committed_at: Optional[float],
+        sent_at: Optional[float] = None,
+    ) -> FreshnessSample:
+        sample = FreshnessSample(written_at, detected_at, committed_at, sent_at or time.time())
+        with self._lock:
+            samples = self._samples.get(branch)
+            if samples is None:
+                samples = self._samples[branch] = deque(maxlen=self.max_samples)
+            samples.append(sample)
+            last = self._last.get(branch)
+            # Un archivo viejo reprocesado no debe hacer ver más fresco el tablero.
+            if last is None or (sample.written_at or 0) >= (last.written_at or 0):
+                self._last[branch] = sample
+        return sample
+
+    def branches(self) -> List[str]:
+        with self._lock:
+            return sorted(self._samples)
+
+    def _window(self, branch: str, now: float) -> List[FreshnessSample]:
+        cutoff = now - self.window_seconds
+        with self._lock:
+            samples = self._samples.get(branch)
+            if not samples:
+                return []
+            while samples and samples[0].sent_at < cutoff:
+                samples.popleft()
+            return list(samples)
+
+    def snapshot(self, branch: str, now: Optional[float] = None) -> dict:
+        now = time.time() if now is None else now
+        samples = self._window(branch, now)
+        with self._lock:
+            last = self._last.get(branch)
+
+        stages = {}
+        for name, start, end in STAGES:
+            values = sorted(
+                max(getattr(sample, end) - getattr(sample, start), 0.0)
+                for sample in samples
+                if getattr(sample, start) is not None and getattr(sample, end) is not None
+            )
+            if not values:
+                stages[name] = None
+                continue
+            stages[name] = {
+                "p50_s": round(_percentile(values, 0.50), 3),
+                "p95_s": round(_percentile(values, 0.95), 3),
+                "max_s": round(values[-1], 3),
+            }
+
+        staleness = None
+        if last is not None and last.written_at is not None:
+            staleness = max(now - last.written_at, 0.0)
+
+        return {
+            "branch": branch,
+            "window_s": self.window_seconds,
+            "invoices": len(samples),
+            "last_written_at": _iso(last.written_at) if last else None,
+            "last_sent_at": _iso(last.sent_at) if last else None,
+            "staleness_s": round(staleness, 1) if staleness is not None else None,
+            "since_last_delivery_s": round(max(now - last.sent_at, 0.0), 1) if last else None,
+            "stages": stages,
+        }
+
+    def update_metrics(self, now: Optional[float] = None) -> None:
+        """Actualiza los gauges; se llama en cada consulta de ``/metrics``.
+
+        Así la antigüedad sigue creciendo aunque nadie mire el tablero, y el
+        p95 de un tramo sin muestras en la ventana deja de exportarse.
+        """
+
+        now = time.time() if now is None else now
+        for branch in self.branches():
+            snapshot = self.snapshot(branch, now)
+            if snapshot["staleness_s"] is None:
+                FRESHNESS_STALENESS_SECONDS.remove(branch=branch)
+            else:
+                FRESHNESS_STALENESS_SECONDS.set(snapshot["staleness_s"], branch=branch)
+            for name, _, _ in STAGES:
+                stage = snapshot["stages"][name]
+                if stage is None:
+                    FRESHNESS_LAG_P95_SECONDS.remove(branch=branch, stage=name)
+                else:
+                    FRESHNESS_LAG_P95_SECONDS.set(stage["p95_s"], branch=branch, stage=name)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._samples.clear()
+            self._last.clear()
+
+
+freshness_tracker = FreshnessTracker(settings.FRESHNESS_WINDOW_SECONDS)
+registry.add_collector(freshness_tracker.update_metrics)
+
+
+async def run_freshness_publisher(interval: float) -> None:
+    """Envía cada ``interval`` s un evento ``freshness`` a las sedes conectadas."""
+
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            now = time.time()
+            branches = [code for code, sockets in realtime_manager.connections.items() if sockets]
+            for branch in branches:
+                payload = {"event": "freshness", **freshness_tracker.snapshot(branch, now)}
+                await realtime_manager.notify(branch, payload)
+        except Exception as exc:
+            logger.warning("⚠️ No se pudo publicar la frescura: %s", exc)
@@ -0,0 +1,426 @@
+"""Registro persistente de cada archivo visto por la ingesta.
+
+Sin este registro, los archivos que ``process_file`` descarta (duplicados por
+número, errores de parseo o archivos ilegibles) se volvían a leer por SMB,
+parsear y consultar en la base de datos en cada re-escaneo periódico.
+
+El registro vive en la tabla ``ingestion_ledger`` y se replica en memoria
+para que los re-escaneos solo necesiten ``stat`` de cada archivo. Cada
+archivo se identifica por su ruta normalizada (``invoice_sources.file_key``),
+igual que ``invoices.source_file``: dos carpetas pueden repetir nombres.
+
+* ``stored`` y ``duplicate`` son definitivos mientras el tamaño y la fecha de
+  modificación del archivo no cambien.
+* ``read_error`` (archivo bloqueado o ilegible) y ``db_error`` son fallas
+  pasajeras: se reintentan siempre, con espera exponencial limitada por
+  ``INGEST_RETRY_MAX_SECONDS``. Una caída de la base de datos no debe dejar
+  en cuarentena las facturas válidas que lleguen mientras dura.
+* ``parse_error`` también se reintenta, pero al llegar a
+  ``INGEST_MAX_ATTEMPTS`` el archivo queda en ``quarantined`` hasta que
+  cambie en disco (o se borre su fila y se lance un re-escaneo manual).
+
+El registro completo se lee una sola vez al arrancar. Los re-escaneos
+manuales solo vuelven a leer las filas en cuarentena, y cada escaneo olvida
+los archivos que ya no están en la carpeta.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import delete
+from sqlalchemy.dialects.postgresql import insert
+
+from app.config import settings
+from app.database import SessionLocal
+from app.services.metrics import INGEST_FILES_TOTAL
+from app.utils.logger import ActivitySummary, get_logger
+from app.models.ingestion_ledger import IngestionLedgerEntry
+from app.models.invoice import Invoice
+
+
+OUTCOME_STORED = "stored"
+OUTCOME_DUPLICATE = "duplicate"
+OUTCOME_READ_ERROR = "read_error"
+OUTCOME_PARSE_ERROR = "parse_error"
+OUTCOME_DB_ERROR = "db_error"
+OUTCOME_QUARANTINED = "quarantined"
+
+TERMINAL_OUTCOMES = frozenset({OUTCOME_STORED, OUTCOME_DUPLICATE})
+# Solo un archivo que no se puede parsear agota sus intentos.
+QUARANTINE_OUTCOMES = frozenset({OUTCOME_PARSE_ERROR})
+
+FileStat = Tuple[int, float]
+
+logger = get_logger("ingest")
+
+# Resumen periódico de resultados por archivo (el detalle va en DEBUG).
+ingest_activity = ActivitySummary(logger, "📊 Ingesta", settings.LOG_SUMMARY_INTERVAL)
+
+
+@dataclass
+class LedgerRecord:
+    filename: str
+    size: Optional[int] = None
+    mtime: Optional[float] = None
+    content_hash: Optional[str] = None
+    outcome: str = OUTCOME_STORED
+    attempts: int = 0
+    last_error: Optional[str] = None
+    next_attempt_at: Optional[float] = None
+
+    def matches(self, stat: Optional[FileStat]) -> bool:
+        """True si el archivo en disco es el mismo que se registró."""
+
+        if stat is None or self.size is None or self.mtime is None:
+            # Registros sembrados desde ``invoices.source_file`` no tienen stat.
+            return True
+        return self.size == stat[0] and abs(self.mtime - stat[1]) < 1e-6
+
+
+def _is_path_key(filename: str) -> bool:
+    # Filas anteriores a las claves por ruta guardaban solo el nombre; no
+    # coinciden con ninguna clave actual y se ignoran. Esos archivos se
+    # vuelven a leer una vez y el control por número de factura los marca
+    # como duplicados.
+    return bool(os.path.dirname(filename))
+
+
+def _to_datetime(timestamp: Optional[float]) -> Optional[datetime]:
+    if timestamp is None:
+        return None
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc)
+
+
+class IngestionLedger:
+    def __init__(self):
+        self._records: Dict[str, LedgerRecord] = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+        self.retry_base_seconds = max(1.0, settings.INGEST_RETRY_BASE_SECONDS)
+        self.retry_max_seconds = max(self.retry_base_seconds, settings.INGEST_RETRY_MAX_SECONDS)
+        self.max_attempts = max(1, settings.INGEST_MAX_ATTEMPTS)
+
+    # ------------------------------------------------------------------
+    # Carga
+    # ------------------------------------------------------------------
+    def load(self) -> int:
+        """Carga el registro desde la base de datos (creando la tabla si falta).
+
+        Los archivos ya guardados antes de que existiera el registro se
+        siembran desde ``invoices.source_file`` como ``stored``.
+        """
+
+        db = SessionLocal()
+        try:
+            IngestionLedgerEntry.__table__.create(bind=db.connection(), checkfirst=True)
+            db.commit()
+
+            records: Dict[str, LedgerRecord] = {}
+            for (source_file,) in db.query(Invoice.source_file).filter(
+                Invoice.source_file.isnot(None)
+            ):
+                if _is_path_key(source_file):
+                    records[source_file] = LedgerRecord(filename=source_file)
+
+            for row in db.query(IngestionLedgerEntry).all():
+                if not _is_path_key(row.filename):
+                    continue
+                records[row.filename] = LedgerRecord(
+                    filename=row.filename,
+                    size=row.size,
+                    mtime=row.mtime,
+                    content_hash=row.content_hash,
+                    outcome=row.outcome,
+                    attempts=int(row.attempts or 0),
+                    last_error=row.last_error,
+                    next_attempt_at=row.next_attempt_at.timestamp()
+                    if row.next_attempt_at
+                    else None,
+                )
+        finally:
+            db.close()
+
+        with self._lock:
+            self._records = records
+            self._loaded = True
+        return len(records)
+
+    def ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        try:
+            self.load()
+        except Exception as exc:
+            logger.warning("⚠️ No se pudo cargar el registro de ingesta: %s", exc)
+
+    def refresh_quarantined(self) -> int:
+        """Relee solo las filas en cuarentena; devuelve cuántas se liberaron.
+
+        Permite sacar un archivo de cuarentena borrando o editando su fila sin
+        volver a leer todo el registro ni ``invoices.source_file``.
+        """
+
+        if not self._loaded:
+            self.ensure_loaded()
+            return 0
+
+        with self._lock:
+            quarantined = [
+                filename
+                for filename, record in self._records.items()
+                if record.outcome == OUTCOME_QUARANTINED
+            ]
+        if not quarantined:
+            return 0
+
+        db = SessionLocal()
+        try:
+            rows = {
+                row.filename: row
+                for row in db.query(IngestionLedgerEntry).filter(
+                    IngestionLedgerEntry.filename.in_(quarantined)
+                )
+            }
+        except Exception as exc:
+            logger.warning("⚠️ No se pudo releer la cuarentena de ingesta: %s", exc)
+            return 0
+        finally:
+            db.close()
+
+        released = 0
+        with self._lock:
+            for filename in quarantined:
+                row = rows.get(filename)
+                if row is not None and row.outcome == OUTCOME_QUARANTINED:
+                    continue
+                released += 1
+                if row is None:
+                    self._records.pop(filename, None)
+                else:
+                    self._records[filename] = LedgerRecord(
+                        filename=row.filename,
+                        size=row.size,
+                        mtime=row.mtime,
+                        content_hash=row.content_hash,
+                        outcome=row.outcome,
+                        attempts=int(row.attempts or 0),
+                        last_error=row.last_error,
+                        next_attempt_at=row.next_attempt_at.timestamp()
+                        if row.next_attempt_at
+                        else None,
+                    )
+        if released:
+            logger.info("🔓 %s archivos liberados de la cuarentena de ingesta.", released)
+        return released
+
+    def prune_missing(self, directory: str, present: Iterable[str]) -> int:
+        """Olvida los archivos de ``directory`` que ya no están en la carpeta.
+
+        ``directory`` es ``InvoiceSource.key`` y ``present`` las claves de los
+        archivos listados en el escaneo.
+        """
+
+        present = set(present)
+        if not present:
+            # Un listado vacío suele ser la carpeta compartida caída, no una
+            # carpeta vaciada: no se borra nada.
+            return 0
+
+        with self._lock:
+            missing = [
+                key
+                for key in self._records
+                if key not in present and os.path.dirname(key) == directory
+            ]
+            for filename in missing:
+                del self._records[filename]
+        if not missing:
+            return 0
+
+        try:
+            self._delete_rows(missing)
+        except Exception as exc:
+            # En memoria ya no están; tras el próximo arranque el primer
+            # escaneo las vuelve a encontrar ausentes y reintenta el borrado.
+            logger.warning("⚠️ No se pudieron borrar filas del registro de ingesta: %s", exc)
+        logger.debug("🧽 %s archivos ausentes eliminados del registro de ingesta.", len(missing))
+        return len(missing)
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+    def get(self, filename: str) -> Optional[LedgerRecord]:
+        with self._lock:
+            return self._records.get(filename)
+
+    def should_process(
+        self,
+        filename: str,
+        stat: Optional[FileStat],
+        now: Optional[float] = None,
+    ) -> bool:
+        """Indica si vale la pena leer el archivo en este escaneo."""
+
+        record = self.get(filename)
+        if record is None:
+            return True
+
+        if not record.matches(stat):
+            # El archivo cambió en disco: se vuelve a evaluar desde cero.
+            return True
+
+        if record.outcome in TERMINAL_OUTCOMES or record.outcome == OUTCOME_QUARANTINED:
+            return False
+
+        now = time.time() if now is None else now
+        return record.next_attempt_at is None or now >= record.next_attempt_at
+
+    def is_known_content(self, filename: str, content_hash: str) -> bool:
+        """True si ese mismo contenido ya terminó en un resultado definitivo."""
+
+        record = self.get(filename)
+        return (
+            record is not None
+            and record.outcome in TERMINAL_OUTCOMES
+            and record.content_hash == content_hash
+        )
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            totals: Dict[str, int] = {}
+            for record in self._records.values():
+                totals[record.outcome] = totals.get(record.outcome, 0) + 1
+            return totals
+
+    # ------------------------------------------------------------------
+    # Registro de resultados
+    # ------------------------------------------------------------------
+    def record_success(
+        self,
+        filename: str,
+        stat: Optional[FileStat],
+        outcome: str,
+        content_hash: Optional[str] = None,
+    ) -> LedgerRecord:
+        record = LedgerRecord(
+            filename=filename,
+            size=stat[0] if stat else None,
+            mtime=stat[1] if stat else None,
+            content_hash=content_hash,
+            outcome=outcome,
+            attempts=self._previous_attempts(filename, stat) + 1,
+        )
+        self._save(record)
+        return record
+
+    def record_failure(
+        self,
+        filename: str,
+        stat: Optional[FileStat],
+        outcome: str,
+        error: Optional[object] = None,
+        content_hash: Optional[str] = None,
+        now: Optional[float] = None,
+    ) -> LedgerRecord:
+        attempts = self._previous_attempts(filename, stat) + 1
+        now = time.time() if now is None else now
+
+        if outcome in QUARANTINE_OUTCOMES and attempts >= self.max_attempts:
+            final_outcome = OUTCOME_QUARANTINED
+            next_attempt_at = None
+            logger.warning(
+                "🚫 %s en cuarentena tras %s intentos fallidos (%s).", filename, attempts, outcome
+            )
+        else:
+            final_outcome = outcome
+            backoff = min(
+                self.retry_base_seconds * (2 ** min(attempts - 1, 32)),
+                self.retry_max_seconds,
+            )
+            next_attempt_at = now + backoff
+
+        record = LedgerRecord(
+            filename=filename,
+            size=stat[0] if stat else None,
+            mtime=stat[1] if stat else None,
+            content_hash=content_hash,
+            outcome=final_outcome,
+            attempts=attempts,
+            last_error=str(error)[:500] if error is not None else None,
+            next_attempt_at=next_attempt_at,
+        )
+        self._save(record)
+        return record
+
+    def _previous_attempts(self, filename: str, stat: Optional[FileStat]) -> int:
+        record = self.get(filename)
+        if record is None or not record.matches(stat):
+            return 0
+        return record.attempts
+
+    def _save(self, record: LedgerRecord) -> None:
+        INGEST_FILES_TOTAL.inc(outcome=record.outcome)
+        ingest_activity.record(record.outcome)
+        with self._lock:
+            self._records[record.filename] = record
+        try:
+            self._persist(record)
+        except Exception as exc:
+            # El registro en memoria sigue siendo válido; la fila se
+            # reescribirá en el próximo resultado del mismo archivo.
+            logger.warning(
+                "⚠️ No se pudo guardar %s en el registro de ingesta: %s", record.filename, exc
+            )
+
+    @staticmethod
+    def _delete_rows(filenames, batch_size: int = 1000) -> None:
+        db = SessionLocal()
+        try:
+            for start in range(0, len(filenames), batch_size):
+                batch = filenames[start:start + batch_size]
+                db.execute(
+                    delete(IngestionLedgerEntry).where(IngestionLedgerEntry.filename.in_(batch))
+                )
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    @staticmethod
+    def _persist(record: LedgerRecord) -> None:
+        values = {
+            "filename": record.filename,
+            "size": record.size,
+            "mtime": record.mtime,
+            "content_hash": record.content_hash,
+            "outcome": record.outcome,
+            "attempts": record.attempts,
+            "last_error": record.last_error,
+            "next_attempt_at": _to_datetime(record.next_attempt_at),
+        }
+        statement = insert(IngestionLedgerEntry).values(**values)
+        statement = statement.on_conflict_do_update(
+            index_elements=[IngestionLedgerEntry.filename],
+            set_={**values, "updated_at": datetime.now(tz=timezone.utc)},
+        )
+
+        db = SessionLocal()
+        try:
+            db.execute(statement)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+
+ingestion_ledger = IngestionLedger()
@@ -0,0 +1,152 @@
+"""Carpetas de facturas monitoreadas y la sede a la que pertenece cada una.
+
+``INVOICE_SOURCES`` define una fuente por sede con el formato
+``ruta|prefijo|código`` y las fuentes separadas por ``;``::
+
+    INVOICE_SOURCES=\\\\192.168.32.100\\unfe-pdv|01001FL|FLO;/mnt/centro|01002CE|CEN
+
+Si no se define, se usa una única fuente con ``INVOICE_PATH``,
+``INVOICE_FILE_PREFIX`` e ``INVOICE_BRANCH_CODE`` (comportamiento histórico).
+El código de sede es también el canal del WebSocket y se resuelve contra la
+columna ``branches.code`` para llenar ``invoices.branch_id``.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set
+from uuid import UUID
+
+from app.config import settings
+from app.services.branch_registry import branch_registry
+from app.utils.logger import get_logger
+
+logger = get_logger("sources")
+
+
+@dataclass(frozen=True)
+class InvoiceSource:
+    path: str
+    prefix: str
+    branch_code: str
+
+    @property
+    def key(self) -> str:
+        return _normalize_path(self.path)
+
+
+def _normalize_path(path: str) -> str:
+    return os.path.normcase(os.path.normpath(os.path.abspath(path)))
+
+
+def file_key(file_path: str) -> str:
+    """Clave de ingesta de un archivo: su ruta normalizada.
+
+    Dos carpetas pueden tener archivos con el mismo nombre, así que el
+    registro de ingesta, ``invoices.source_file`` y el control de archivos en
+    proceso usan la ruta completa y no solo el nombre.
+    """
+
+    return _normalize_path(file_path)
+
+
+def parse_sources(
+    raw: str,
+    default_path: str,
+    default_prefix: str,
+    default_branch: str,
+) -> List[InvoiceSource]:
+    sources: List[InvoiceSource] = []
+    seen = set()
+    for chunk in (raw or "").split(";"):
+        chunk = chunk.strip()
+        if not chunk:
+            continue
+        parts = [part.strip() for part in chunk.split("|")]
+        if len(parts) != 3 or not all(parts):
+            logger.warning("⚠️ Fuente de facturas inválida en INVOICE_SOURCES: %r", chunk)
+            continue
+        source = InvoiceSource(parts[0], parts[1].upper(), parts[2].upper())
+        if source.key in seen:
+            logger.warning("⚠️ Carpeta de facturas repetida en INVOICE_SOURCES: %s", source.path)
+            continue
+        seen.add(source.key)
+        sources.append(source)
+
+    if not sources:
+        sources.append(
+            InvoiceSource(default_path, default_prefix.upper(), default_branch.upper())
+        )
+    return sources
+
+
+INVOICE_SOURCES: List[InvoiceSource] = parse_sources(
+    settings.INVOICE_SOURCES,
+    settings.INVOICE_PATH,
+    settings.INVOICE_FILE_PREFIX,
+    settings.INVOICE_BRANCH_CODE,
+)
+
+_sources_by_dir: Dict[str, InvoiceSource] = {source.key: source for source in INVOICE_SOURCES}
+_sources_lock = threading.Lock()
+
+
+def register_source(source: InvoiceSource) -> InvoiceSource:
+    """Agrega una carpeta fuera de ``INVOICE_SOURCES`` (monitores ad hoc, benchmarks)."""
+
+    with _sources_lock:
+        _sources_by_dir.setdefault(source.key, source)
+    return source
+
+
+def source_for_path(file_path: str) -> Optional[InvoiceSource]:
+    """Fuente a la que pertenece ``file_path`` o ``None`` si no es de ninguna.
+
+    No se adivina la sede: una factura atribuida a la fuente equivocada
+    quedaría guardada y publicada en otra sede.
+    """
+
+    directory = _normalize_path(os.path.dirname(file_path))
+    with _sources_lock:
+        source = _sources_by_dir.get(directory)
+    if source is None:
+        logger.warning("⚠️ %s no pertenece a ninguna carpeta de INVOICE_SOURCES", file_path)
+    return source
+
+
+# ===============================
+#   RESOLUCIÓN DE SEDES
+# ===============================
+# Sede histórica: las rutas, los resúmenes y el archivo la representan con
+# ``branch_id`` nulo, aunque exista una fila ``FLO`` en ``branches``.
+UNASSIGNED_BRANCH_CODE = "FLO"
+
+_missing_warned: Set[str] = set()
+_missing_lock = threading.Lock()
+
+
+def resolve_branch_id(branch_code: str) -> Optional[UUID]:
+    """``branches.id`` para el código dado (desde el registro en memoria).
+
+    Una sede creada después del arranque se asocia sola en cuanto el registro
+    se recarga (``POST /branches/`` o el refresco periódico). ``FLO`` siempre
+    devuelve ``None`` para que sus facturas sigan en las vistas ``branch=FLO``.
+    """
+
+    code = (branch_code or "").upper()
+    if not code or code == UNASSIGNED_BRANCH_CODE:
+        return None
+
+    record = branch_registry.by_code(code)
+    with _missing_lock:
+        if record is not None:
+            _missing_warned.discard(code)
+            return record.id
+        if code in _missing_warned:
+            return None
+        _missing_warned.add(code)
+
+    logger.warning("⚠️ La sede %s no existe en la tabla branches; facturas sin branch_id.", code)
+    return None
@@ -0,0 +1,161 @@
+"""Vigilancia del retraso del event loop.
+
+Una tarea del loop duerme ``interval`` segundos y mide cuánto tarde
+despierta: ese retraso es el tiempo que el loop estuvo ocupado con trabajo
+síncrono (serializar historial, ``send_text`` lentos, consultas sin
+``run_sync``...). Se exporta como histograma en ``/metrics``.
+
+Como la tarea no puede observar el bloqueo mientras ocurre, un hilo
+*watchdog* revisa el último latido; si se atrasa más que el umbral toma la
+pila del hilo del loop con ``sys._current_frames`` y la registra (una vez por
+bloqueo). Las últimas capturas quedan en :attr:`LoopLagMonitor.stalls` para
+``/admin/loop-stalls``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime, timezone
+from typing import Deque, List, Optional
+
+from app.config import settings
+from app.services.metrics import registry
+from app.utils.logger import get_logger
+
+logger = get_logger("loop")
+
+LOOP_LAG_SECONDS = registry.histogram(
+    "visor_event_loop_lag_seconds",
+    "Retraso del event loop al despertar un latido programado.",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+LOOP_LAG_LAST_SECONDS = registry.gauge(
+    "visor_event_loop_lag_last_seconds",
+    "Retraso del último latido del event loop.",
+)
+LOOP_STALLS_TOTAL = registry.counter(
+    "visor_event_loop_stalls_total",
+    "Bloqueos del event loop que superaron el umbral (con pila capturada).",
+)
+
+
+class LoopLagMonitor:
+    def __init__(self, interval: float, threshold: float, keep: int = 20):
+        self.interval = max(interval, 0.01)
+        self.threshold = max(threshold, 0.0)
+        self.stalls: Deque[dict] = deque(maxlen=keep)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._last_beat = 0.0
+        self._open_stall: Optional[dict] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        """Arranca el latido y el watchdog; se llama desde el hilo del loop."""
+
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop.clear()
+        self._task = self._loop.create_task(self._heartbeat(), name="loop-lag-heartbeat")
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+        logger.info(
+            "⏱️ Vigilancia del event loop activa (latido %.0f ms, umbral %.0f ms)",
+            self.interval * 1000,
+            self.threshold * 1000,
+        )
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._watchdog is not None and self._watchdog is not threading.current_thread():
+            self._watchdog.join(timeout=1)
+        self._watchdog = None
+
+    async def _heartbeat(self) -> None:
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(now - expected, 0.0)
+            self._last_beat = now
+            LOOP_LAG_SECONDS.observe(lag)
+            LOOP_LAG_LAST_SECONDS.set(lag)
+            with self._lock:
+                stall, self._open_stall = self._open_stall, None
+            if stall is not None:
+                stall["blocked_ms"] = round(lag * 1000, 1)
+                logger.warning(
+                    "🐌 El event loop estuvo bloqueado %.0f ms (pila en la captura anterior)",
+                    lag * 1000,
+                    extra={"fields": {"blocked_ms": stall["blocked_ms"]}},
+                )
+
+    def _watch(self) -> None:
+        period = max(min(self.interval, self.threshold or self.interval) / 2, 0.005)
+        while not self._stop.wait(period):
+            overdue = time.monotonic() - self._last_beat - self.interval
+            if overdue < self.threshold:
+                continue
+            with self._lock:
+                if self._open_stall is not None:
+                    continue
+                stall = self._capture(overdue)
+                self._open_stall = stall
+                self.stalls.append(stall)
+            LOOP_STALLS_TOTAL.inc()
+            logger.warning(
+                "🐌 Event loop sin responder hace %.0f ms (tarea %s):\n%s",
+                overdue * 1000,
+                stall["task"],
+                "".join(stall["stack"]).rstrip(),
+            )
+
+    def _capture(self, overdue: float) -> dict:
+        frame = sys._current_frames().get(self._loop_thread)
+        stack: List[str] = traceback.format_stack(frame) if frame is not None else []
+        task = None
+        if self._loop is not None:
+            try:
+                current = asyncio.current_task(self._loop)
+            except RuntimeError:
+                current = None
+            if current is not None:
+                task = current.get_name()
+                coro = current.get_coro()
+                if coro is not None:
+                    task = f"{task} ({getattr(coro, '__qualname__', coro)})"
+        return {
+            "detected_at": datetime.now(timezone.utc).isoformat(),
+            "overdue_ms": round(overdue * 1000, 1),
+            "blocked_ms": None,
+            "task": task,
+            "stack": stack,
+        }
+
+    def recent_stalls(self) -> List[dict]:
+        with self._lock:
+            return [dict(stall) for stall in self.stalls]
+
+
+loop_monitor = LoopLagMonitor(
+    settings.LOOP_LAG_INTERVAL_MS / 1000.0,
+    settings.LOOP_LAG_THRESHOLD_MS / 1000.0,
+)
@@ -0,0 +1,266 @@
+"""Métricas del proceso en formato de texto de Prometheus.
+
+Registro mínimo (contadores, gauges e histogramas con etiquetas) sin
+dependencias externas. Cada observación es un ``bisect`` más una suma bajo un
+candado por métrica, así que medir el camino caliente de la ingesta no cuesta
+más que las llamadas a ``time.perf_counter`` que lo rodean.
+"""
+
+from __future__ import annotations
+
+import threading
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+LabelValues = Tuple[str, ...]
+
+# Segundos: de milisegundos (lectura/parseo) a minutos (archivos en SMB).
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0,
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(
+                f"{self.name} espera las etiquetas {self.labelnames}, recibió {tuple(labels)}"
+            )
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _header(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+
+    def render(self) -> List[str]:  # pragma: no cover - implementado en subclases
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = self._header()
+        for key, value in values:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def remove(self, **labels: str) -> None:
+        """Quita la serie: un valor viejo no debe seguir exportándose."""
+
+        key = self._key(labels)
+        with self._lock:
+            self._values.pop(key, None)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(float(bound) for bound in buckets))
+        # Por etiqueta: conteo por bucket (no acumulado), suma y total.
+        self._series: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = ([0] * (len(self.buckets) + 1), [0.0])
+                self._series[key] = series
+            series[0][index] += 1
+            series[1][0] += value
+
+    def snapshot(self, **labels: str) -> Optional[Tuple[int, float]]:
+        """``(observaciones, suma)`` de una serie, o ``None`` si no existe."""
+
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            if series is None:
+                return None
+            return sum(series[0]), series[1][0]
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = sorted(
+                (key, (list(counts), total[0])) for key, (counts, total) in self._series.items()
+            )
+
+        lines = self._header()
+        for key, (counts, total) in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def add_collector(self, collect: Callable[[], None]) -> None:
+        """Registra ``collect()``, que actualiza gauges justo antes de cada ``render``.
+
+        Sirve para valores que dependen de la hora de la consulta (antigüedad
+        de un dato): se calculan al exportar y no cuando alguien los pide.
+        """
+
+        with self._lock:
+            self._collectors.append(collect)
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"Métrica {metric.name} ya registrada con otra definición")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            collectors = list(self._collectors)
+        for collect in collectors:
+            try:
+                collect()
+            except Exception:
+                # Un colector roto no debe dejar sin /metrics al resto.
+                pass
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+# ===============================
+#   MÉTRICAS DE INGESTA
+# ===============================
+INGEST_STAGE_SECONDS = registry.histogram(
+    "visor_ingest_stage_seconds",
+    "Duración de cada etapa de la ingesta de un archivo.",
+    ("stage",),
+)
+INGEST_DETECTION_DELAY_SECONDS = registry.histogram(
+    "visor_ingest_detection_delay_seconds",
+    "Tiempo entre la escritura del archivo (mtime) y su detección por el observador.",
+    ("branch",),
+)
+INGEST_END_TO_END_SECONDS = registry.histogram(
+    "visor_ingest_end_to_end_seconds",
+    "Tiempo entre la escritura del archivo (mtime) y el envío del evento realtime.",
+    ("branch",),
+)
+INGEST_FILES_TOTAL = registry.counter(
+    "visor_ingest_files_total",
+    "Archivos procesados por resultado.",
+    ("outcome",),
+)
+INGEST_RESCAN_PICKUPS_TOTAL = registry.counter(
+    "visor_ingest_rescan_pickups_total",
+    "Archivos encolados por un escaneo de carpeta en lugar del observador.",
+    ("branch",),
+)
+INGEST_IN_FLIGHT = registry.gauge(
+    "visor_ingest_in_flight_files",
+    "Archivos esperando estabilidad, en cola o en proceso.",
+)
+INGEST_RESCAN_DURATION_SECONDS = registry.gauge(
+    "visor_ingest_rescan_duration_seconds",
+    "Duración del último escaneo de cada carpeta.",
+    ("branch",),
+)
@@ -1,3 +1,4 @@
+from datetime import datetime
 from decimal import Decimal, InvalidOperation
 from typing import Dict, List, Optional, Union
 import xml.etree.ElementTree as ET
@@ -31,6 +32,38 @@ def _find_text(element: Optional[ET.Element], path: str) -> Optional[str]:
     return result.strip() if result else None
 
 
+def parse_issue_date(raw_date: Optional[str]) -> Optional[datetime]:
+    if not raw_date:
+        return None
+
+    raw_date = raw_date.strip()
+    if not raw_date:
+        return None
+
+    candidates = (
+        "%Y-%m-%dT%H:%M:%S%z",
+        "%Y-%m-%dT%H:%M:%S.%f%z",
+        "%Y-%m-%dT%H:%M:%S",
+        "%Y-%m-%dT%H:%M:%S.%f",
+        "%Y-%m-%d",
+        "%Y-%b-%d %I:%M %p",
+        "%Y-%b-%d",
+    )
+
+    for fmt in candidates:
+        try:
+            return datetime.strptime(raw_date, fmt)
+        except ValueError:
+            continue
+
+    try:
+        return datetime.fromisoformat(raw_date)
+    except ValueError:
+        pass
+
+    return None
+
+
 def parse_invoice(content: Union[str, bytes]) -> dict:
     """Parsea una factura UBL 2.1 y retorna su información estructurada."""
 
@@ -0,0 +1,322 @@
+"""Particionado por día de ``invoices`` e ``invoice_items`` (PostgreSQL).
+
+Con tablas particionadas el cierre diario ya no borra fila por fila: cada
+día vive en su propia partición y, después de resumir y archivar, se hace
+``DETACH`` + ``DROP`` de las particiones anteriores a hoy. Sin filas
+muertas no queda trabajo para ``VACUUM``.
+
+* ``invoices`` se particiona por ``COALESCE(invoice_date, created_at)``, la
+  misma expresión que usan las rutas y el cierre, así las consultas de hoy
+  solo recorren la partición de hoy.
+* ``invoice_items`` se particiona por ``created_at``; la ingesta, el backfill
+  y la siembra le dan la fecha de su factura. Si aun así un ítem queda en
+  otra partición, el cierre lo borra fila por fila antes de soltar la de su
+  factura.
+
+Postgres exige que las claves únicas incluyan la clave de partición, que en
+``invoices`` es una expresión: las tablas particionadas no tienen PRIMARY KEY
+ni la FK ``invoice_items.invoice_id`` (los ids son ``uuid4`` generados por la
+aplicación y el cierre borra los ítems explícitamente). Cada tabla tiene una
+partición ``_default`` para filas sin partición de su día; el cierre las
+sigue borrando fila por fila.
+
+Las tablas se crean particionadas solo si no existen y ``DB_PARTITIONING``
+está activo; para convertir una base existente está
+``python -m tools.partition_tables --migrate``. Si las tablas no están
+particionadas todo lo de este módulo es un no-op.
+"""
+
+from __future__ import annotations
+
+import re
+import threading
+from datetime import date, datetime, timedelta
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateColumn
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.invoice import Invoice
+from app.models.invoice_item import InvoiceItem
+from app.utils.logger import get_logger
+from app.utils.timezone import day_clock
+
+logger = get_logger("partitions")
+
+PARTITION_KEYS: Dict[str, str] = {
+    "invoices": "COALESCE(invoice_date, created_at)",
+    "invoice_items": "created_at",
+}
+_MODELS = {"invoices": Invoice, "invoice_items": InvoiceItem}
+_INDEXES = {
+    "invoices": (
+        "CREATE INDEX IF NOT EXISTS ix_invoices_id ON invoices (id)",
+        "CREATE INDEX IF NOT EXISTS ix_invoices_number ON invoices (number)",
+        "CREATE INDEX IF NOT EXISTS ix_invoices_source_file ON invoices (source_file)",
+        "CREATE INDEX IF NOT EXISTS ix_invoices_branch_day "
+        "ON invoices (branch_id, (COALESCE(invoice_date, created_at)))",
+    ),
+    "invoice_items": (
+        "CREATE INDEX IF NOT EXISTS ix_invoice_items_invoice_id ON invoice_items (invoice_id)",
+    ),
+}
+# ``invoice_items`` primero: es la que depende de ``invoices``.
+_DROP_ORDER = ("invoice_items", "invoices")
+_PARTITION_SUFFIX = re.compile(r"_p(\d{8})$")
+
+# Tablas particionadas detectadas (``None`` = aún no se consultó).
+_partitioned: Optional[FrozenSet[str]] = None
+_partitioned_lock = threading.Lock()
+
+
+def partition_name(table: str, day: date) -> str:
+    return f"{table}_p{day:%Y%m%d}"
+
+
+def day_range(day: date) -> Tuple[datetime, datetime]:
+    """Medianoche local de ``day`` y del día siguiente (con zona)."""
+
+    start = datetime(day.year, day.month, day.day, tzinfo=day_clock.tz)
+    following = day + timedelta(days=1)
+    return start, datetime(following.year, following.month, following.day, tzinfo=day_clock.tz)
+
+
+def partitioned_table_ddl(table: str) -> str:
+    """``CREATE TABLE`` particionado con las columnas del modelo ORM."""
+
+    dialect = postgresql.dialect()
+    columns = []
+    for column in _MODELS[table].__table__.columns:
+        spec = str(CreateColumn(column).compile(dialect=dialect))
+        if table == "invoices" and column.name == "branch_id":
+            spec += " REFERENCES branches (id) ON DELETE CASCADE"
+        columns.append(spec)
+    body = ",\n    ".join(columns)
+    return f"CREATE TABLE {table} (\n    {body}\n) PARTITION BY RANGE (({PARTITION_KEYS[table]}))"
+
+
+def _is_postgres(db: Session) -> bool:
+    return db.get_bind().dialect.name == "postgresql"
+
+
+def partitioned_tables(db: Session, refresh: bool = False) -> FrozenSet[str]:
+    """Cuáles de ``invoices``/``invoice_items`` están particionadas."""
+
+    global _partitioned
+
+    with _partitioned_lock:
+        if _partitioned is not None and not refresh:
+            return _partitioned
+    if not _is_postgres(db):
+        found: FrozenSet[str] = frozenset()
+    else:
+        rows = db.execute(
+            text(
+                "SELECT c.relname FROM pg_partitioned_table p "
+                "JOIN pg_class c ON c.oid = p.partrelid "
+                "WHERE c.relname = ANY(:names) AND pg_table_is_visible(c.oid)"
+            ),
+            {"names": list(PARTITION_KEYS)},
+        )
+        found = frozenset(name for (name,) in rows)
+    with _partitioned_lock:
+        _partitioned = found
+    return found
+
+
+def _existing_partitions(db: Session, table: str) -> List[str]:
+    rows = db.execute(
+        text(
+            "SELECT child.relname FROM pg_inherits i "
+            "JOIN pg_class child ON child.oid = i.inhrelid "
+            "JOIN pg_class parent ON parent.oid = i.inhparent "
+            "WHERE parent.relname = :table AND pg_table_is_visible(parent.oid)"
+        ),
+        {"table": table},
+    )
+    return [name for (name,) in rows]
+
+
+def create_partition_indexes(db: Session) -> None:
+    for table in ("invoices", "invoice_items"):
+        for statement in _INDEXES[table]:
+            db.execute(text(statement))
+
+
+def create_partitioned_schema(db: Session, indexes: bool = True) -> bool:
+    """Crea ``invoices`` e ``invoice_items`` particionadas si no existen.
+
+    No hace ``commit``. Devuelve ``False`` si ya existían (particionadas o no).
+    """
+
+    exists = db.execute(text("SELECT to_regclass('invoices') IS NOT NULL")).scalar()
+    if exists:
+        return False
+
+    for table in ("invoices", "invoice_items"):
+        db.execute(text(partitioned_table_ddl(table)))
+        db.execute(text(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT"))
+    if indexes:
+        create_partition_indexes(db)
+    partitioned_tables(db, refresh=True)
+    logger.info("🧱 Tablas invoices e invoice_items creadas con particiones diarias")
+    return True
+
+
+def ensure_partitions(db: Session, days: Iterable[date]) -> int:
+    """Crea las particiones que falten para ``days``. No hace ``commit``."""
+
+    tables = partitioned_tables(db)
+    if not tables:
+        return 0
+
+    wanted = sorted(set(days))
+    created = 0
+    for table in sorted(tables):
+        existing = set(_existing_partitions(db, table))
+        for day in wanted:
+            name = partition_name(table, day)
+            if name in existing:
+                continue
+            start, end = day_range(day)
+            try:
+                # Con filas de ese día en ``_default`` Postgres rechaza la
+                # partición; se deja así y el cierre las borra fila por fila.
+                with db.begin_nested():
+                    db.execute(
+                        text(
+                            f"CREATE TABLE {name} PARTITION OF {table} "
+                            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+                        )
+                    )
+            except Exception as exc:
+                logger.warning("⚠️ No se pudo crear la partición %s: %s", name, exc)
+                continue
+            created += 1
+    if created:
+        logger.info("🧱 %s particiones diarias creadas", created)
+    return created
+
+
+def ensure_upcoming_partitions(db: Session, days_ahead: Optional[int] = None) -> int:
+    days_ahead = settings.PARTITION_DAYS_AHEAD if days_ahead is None else days_ahead
+    today = day_clock.bounds().day
+    return ensure_partitions(db, (today + timedelta(days=offset) for offset in range(days_ahead + 1)))
+
+
+def _items_still_referenced(db: Session, partition: str, cutoff: datetime) -> bool:
+    # Ítems guardados antes de medianoche cuya factura es de hoy (reloj del
+    # PDV adelantado, o el ``commit`` de ítems cruzó la medianoche).
+    return bool(
+        db.execute(
+            text(
+                f"SELECT EXISTS (SELECT 1 FROM {partition} item "
+                "JOIN invoices inv ON inv.id = item.invoice_id "
+                "WHERE COALESCE(inv.invoice_date, inv.created_at) >= :cutoff)"
+            ),
+            {"cutoff": cutoff},
+        ).scalar()
+    )
+
+
+def plan_partition_drops(db: Session, cutoff_day: date) -> Dict[str, List[str]]:
+    """Particiones de días anteriores a ``cutoff_day`` que se pueden soltar.
+
+    ``{tabla: [particiones]}``, sin entradas para tablas sin particionar.
+    """
+
+    tables = partitioned_tables(db)
+    cutoff, _ = day_range(cutoff_day)
+    plan: Dict[str, List[str]] = {}
+    for table in _DROP_ORDER:
+        if table not in tables:
+            continue
+        plan[table] = []
+        for name in sorted(_existing_partitions(db, table)):
+            match = _PARTITION_SUFFIX.search(name)
+            if not match:
+                continue
+            day = datetime.strptime(match.group(1), "%Y%m%d").date()
+            if day >= cutoff_day:
+                continue
+            if table == "invoice_items" and _items_still_referenced(db, name, cutoff):
+                logger.warning("⚠️ %s tiene ítems de facturas de hoy; se purga fila por fila", name)
+                continue
+            plan[table].append(name)
+    return plan
+
+
+def delete_retained_items(db: Session, plan: Dict[str, List[str]], cutoff: datetime) -> bool:
+    """Borra los ítems de facturas anteriores a ``cutoff`` que no caen con el plan.
+
+    Un ítem puede vivir en otra partición que su factura (archivo de ayer
+    ingerido hoy, ``_default``): se borra fila por fila en las particiones
+    que se conservan, *antes* de soltar las de sus facturas. Devuelve
+    ``False`` si ``invoice_items`` no está particionada (lo borra quien llama).
+    No hace ``commit``.
+    """
+
+    if "invoice_items" not in plan:
+        return False
+
+    dropped = set(plan["invoice_items"])
+    for name in sorted(_existing_partitions(db, "invoice_items")):
+        if name in dropped:
+            continue
+        db.execute(
+            text(
+                f"DELETE FROM {name} WHERE invoice_id IN ("
+                f"SELECT id FROM invoices WHERE {PARTITION_KEYS['invoices']} < :cutoff)"
+            ),
+            {"cutoff": cutoff},
+        )
+    return True
+
+
+def drop_planned_partitions(db: Session, plan: Dict[str, List[str]]) -> List[str]:
+    """``DETACH`` + ``DROP`` de las particiones del plan. No hace ``commit``."""
+
+    dropped = []
+    for table in _DROP_ORDER:
+        for name in plan.get(table, ()):
+            db.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+            db.execute(text(f"DROP TABLE {name}"))
+            dropped.append(name)
+    if dropped:
+        logger.info("🗑️ Particiones eliminadas: %s", ", ".join(dropped))
+    return dropped
+
+
+def drop_partitions_before(db: Session, cutoff_day: date) -> List[str]:
+    """``DETACH`` + ``DROP`` de las particiones de días anteriores a ``cutoff_day``.
+
+    Solo para cuando no quedan facturas anteriores (particiones vacías creadas
+    por adelantado); el cierre con datos usa el plan y
+    :func:`delete_retained_items`. No hace ``commit``.
+    """
+
+    if not partitioned_tables(db):
+        return []
+    return drop_planned_partitions(db, plan_partition_drops(db, cutoff_day))
+
+
+def prepare(session_factory=None) -> None:
+    """Arranque: crea el esquema particionado (si corresponde) y las particiones próximas."""
+
+    db = (session_factory or SessionLocal)()
+    try:
+        if not _is_postgres(db):
+            return
+        if settings.DB_PARTITIONING:
+            create_partitioned_schema(db)
+        ensure_upcoming_partitions(db)
+        db.commit()
+    except Exception as exc:
+        db.rollback()
+        logger.warning("⚠️ No se pudieron preparar las particiones: %s", exc)
+    finally:
+        db.close()
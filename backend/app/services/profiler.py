@@ -0,0 +1,183 @@
+"""Perfilado bajo demanda del proceso en producción.
+
+La ingesta (monitores, workers de ``process_file``) y el event loop comparten
+el proceso, así que un perfil por petición no alcanza. :func:`sample_stacks`
+toma muestras de la pila de todos los hilos con ``sys._current_frames`` y
+devuelve el formato *collapsed* de Brendan Gregg (``hilo;f1;f2 N``) que leen
+``flamegraph.pl``, speedscope o inferno. :func:`tracemalloc_diff` compara dos
+instantáneas de ``tracemalloc`` para ver qué crece (historial realtime,
+sesiones...).
+
+Solo corre un perfil a la vez; el muestreo vive en el hilo que lo pide y
+nunca en el event loop.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+_profile_lock = threading.Lock()
+
+# Hojas que solo indican espera (hilo dormido o loop sin trabajo).
+_IDLE_LEAVES = frozenset(
+    {
+        ("threading.py", "wait"),
+        ("threading.py", "_wait_for_tstate_lock"),
+        ("selectors.py", "select"),
+        ("queue.py", "get"),
+        ("thread.py", "_worker"),
+        ("delayed_queue.py", "_run"),
+    }
+)
+
+_THREAD_SUFFIX = re.compile(r"[-_]\d+$")
+
+
+class ProfilerBusyError(RuntimeError):
+    """Ya hay un perfil o una comparación de memoria en curso."""
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    filename = code.co_filename
+    # Rutas relativas al paquete para que el flamegraph sea legible.
+    for marker in (f"{os.sep}app{os.sep}", f"{os.sep}site-packages{os.sep}", f"{os.sep}lib{os.sep}python"):
+        index = filename.rfind(marker)
+        if index >= 0:
+            filename = filename[index + 1 :]
+            break
+    return f"{code.co_name} ({filename}:{frame.f_lineno})".replace(";", ",")
+
+
+def _thread_label(name: str) -> str:
+    # Los workers del pool se agrupan: "ingest-worker_3" -> "ingest-worker".
+    return _THREAD_SUFFIX.sub("", name).replace(";", ",").replace(" ", "_")
+
+
+def _is_idle(frame) -> bool:
+    code = frame.f_code
+    return (os.path.basename(code.co_filename), code.co_name) in _IDLE_LEAVES
+
+
+def _collect(counts: Counter, names: Dict[int, str], skip: int, include_idle: bool) -> None:
+    for ident, frame in sys._current_frames().items():
+        if ident == skip:
+            continue
+        if not include_idle and _is_idle(frame):
+            continue
+        stack: List[str] = []
+        while frame is not None:
+            stack.append(_frame_label(frame))
+            frame = frame.f_back
+        stack.append(_thread_label(names.get(ident, f"thread-{ident}")))
+        stack.reverse()
+        counts[";".join(stack)] += 1
+
+
+def sample_stacks(
+    duration: float,
+    interval: float = 0.01,
+    include_idle: bool = False,
+) -> Tuple[str, dict]:
+    """Muestrea todos los hilos durante ``duration`` segundos.
+
+    Devuelve el texto *collapsed* y un resumen (muestras, hilos, duración).
+    """
+
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilerBusyError("Ya hay un perfil en curso")
+    try:
+        interval = max(interval, 0.001)
+        counts: Counter = Counter()
+        own_ident = threading.get_ident()
+        started = time.perf_counter()
+        deadline = started + duration
+        rounds = 0
+        names: Dict[int, str] = {}
+        while time.perf_counter() < deadline:
+            if rounds % 50 == 0:
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+            _collect(counts, names, own_ident, include_idle)
+            rounds += 1
+            time.sleep(interval)
+        elapsed = time.perf_counter() - started
+    finally:
+        _profile_lock.release()
+
+    lines = [f"{stack} {count}" for stack, count in counts.most_common()]
+    summary = {
+        "rounds": rounds,
+        "samples": sum(counts.values()),
+        "stacks": len(counts),
+        "seconds": round(elapsed, 3),
+        "effective_interval_ms": round(elapsed / rounds * 1000, 3) if rounds else None,
+    }
+    return "\n".join(lines) + ("\n" if lines else ""), summary
+
+
+def tracemalloc_diff(
+    duration: float,
+    top: int = 25,
+    group_by: str = "lineno",
+    frames: int = 10,
+) -> dict:
+    """Qué asignaciones crecieron entre dos instantáneas separadas ``duration`` s.
+
+    Si ``tracemalloc`` no estaba activo se enciende solo durante la medición
+    (cuesta CPU y memoria mientras corre) y se apaga al terminar.
+    """
+
+    if group_by not in ("lineno", "filename", "traceback"):
+        raise ValueError("group_by debe ser 'lineno', 'filename' o 'traceback'")
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilerBusyError("Ya hay un perfil en curso")
+
+    started_here = not tracemalloc.is_tracing()
+    try:
+        if started_here:
+            tracemalloc.start(frames)
+        filters = [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        ]
+        before = tracemalloc.take_snapshot().filter_traces(filters)
+        time.sleep(duration)
+        after = tracemalloc.take_snapshot().filter_traces(filters)
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        if started_here:
+            tracemalloc.stop()
+        _profile_lock.release()
+
+    stats = after.compare_to(before, group_by)
+    entries = []
+    for stat in stats[: max(1, top)]:
+        entries.append(
+            {
+                "size_diff_bytes": stat.size_diff,
+                "size_bytes": stat.size,
+                "count_diff": stat.count_diff,
+                "count": stat.count,
+                "traceback": [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback],
+            }
+        )
+    return {
+        "seconds": duration,
+        "group_by": group_by,
+        "traced_current_bytes": current,
+        "traced_peak_bytes": peak,
+        "started_tracing": started_here,
+        "top": entries,
+    }
+
+
+def profile_filename(now: Optional[float] = None) -> str:
+    return time.strftime("profile-%Y%m%d-%H%M%S.folded", time.localtime(now))
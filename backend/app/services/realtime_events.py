@@ -0,0 +1,156 @@
+"""Eventos enviados por el canal realtime.
+
+Un :class:`InvoiceEvent` se construye una sola vez al guardar la factura:
+ya trae la fecha parseada, el día (ordinal), la clave de deduplicación y el
+JSON serializado que se envía a cada cliente. El historial del día guarda
+estos objetos en lugar de diccionarios, así ``RealtimeManager`` no vuelve a
+buscar claves ni a parsear fechas ISO por cada mensaje.
+"""
+
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Mapping, Optional
+
+from app.utils.timezone import day_clock
+
+# Orden de preferencia para la marca de tiempo de mensajes libres.
+_TIMESTAMP_KEYS = ("invoice_date", "timestamp", "created_at", "issued_at")
+
+
+def _local_now() -> datetime:
+    # Hora local sin zona, el mismo formato que guardan las facturas.
+    return day_clock.now().replace(tzinfo=None)
+
+
+def _coerce_datetime(value: Any) -> Optional[datetime]:
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, (int, float)):
+        try:
+            return datetime.fromtimestamp(value)
+        except (OverflowError, OSError, ValueError):
+            return None
+    if isinstance(value, str) and value:
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    return None
+
+
+def _iso(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (int, float)):
+        parsed = _coerce_datetime(value)
+        return parsed.isoformat() if parsed else str(value)
+    return str(value)
+
+
+@dataclass(frozen=True, slots=True)
+class InvoiceEvent:
+    branch: str
+    identity: str
+    occurred_at: Optional[datetime]
+    day_ordinal: Optional[int]
+    text: str
+
+    @classmethod
+    def create(
+        cls,
+        branch: str,
+        *,
+        invoice_number: Optional[str],
+        items: int,
+        total: float,
+        subtotal: Optional[float] = None,
+        file: Optional[str] = None,
+        invoice_date: Optional[datetime] = None,
+        created_at: Optional[datetime] = None,
+        extra: Optional[Mapping[str, Any]] = None,
+    ) -> "InvoiceEvent":
+        """Evento ``new_invoice`` con la misma forma que consume el frontend."""
+
+        created_at = created_at or _local_now()
+        occurred_at = invoice_date or created_at
+        created_iso = created_at.isoformat()
+
+        payload = {
+            "event": "new_invoice",
+            "invoice_number": invoice_number,
+            "items": items,
+            "total": float(total or 0),
+        }
+        if subtotal is not None:
+            payload["subtotal"] = float(subtotal or 0)
+        payload.update(
+            {
+                "file": file,
+                "invoice_date": invoice_date.isoformat() if invoice_date else None,
+                "timestamp": occurred_at.isoformat(),
+                "created_at": created_iso,
+            }
+        )
+        if extra:
+            payload.update(extra)
+
+        identity = (
+            f"{invoice_number}-{payload['timestamp']}" if invoice_number else payload["timestamp"]
+        )
+        return cls._build(branch, identity, occurred_at, payload)
+
+    @classmethod
+    def from_payload(cls, branch: str, message: Mapping[str, Any]) -> "InvoiceEvent":
+        """Convierte un mensaje libre (``dict``) resolviendo sus campos una vez."""
+
+        payload = dict(message)
+        timestamp = None
+        occurred_at = None
+        for key in _TIMESTAMP_KEYS:
+            timestamp = _iso(payload.get(key))
+            if timestamp:
+                occurred_at = _coerce_datetime(payload.get(key))
+                break
+        if not timestamp:
+            occurred_at = _local_now()
+            timestamp = occurred_at.isoformat()
+        payload["timestamp"] = timestamp
+
+        direct_id = payload.get("invoice_id") or payload.get("id") or payload.get("uuid")
+        invoice_number = payload.get("invoice_number") or payload.get("number")
+        if direct_id:
+            identity = str(direct_id)
+        elif invoice_number:
+            identity = f"{invoice_number}-{timestamp}"
+        else:
+            identity = timestamp
+
+        return cls._build(branch, identity, occurred_at, payload)
+
+    @classmethod
+    def _build(
+        cls,
+        branch: str,
+        identity: str,
+        occurred_at: Optional[datetime],
+        payload: Mapping[str, Any],
+    ) -> "InvoiceEvent":
+        return cls(
+            branch=branch,
+            identity=identity,
+            occurred_at=occurred_at,
+            day_ordinal=day_clock.local_date(occurred_at).toordinal() if occurred_at else None,
+            text=json.dumps(payload, ensure_ascii=False, default=str),
+        )
+
+    def payload(self) -> dict:
+        """Contenido del evento como ``dict`` (solo para depuración y pruebas)."""
+
+        return json.loads(self.text)
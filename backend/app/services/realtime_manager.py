@@ -1,134 +1,57 @@
-from typing import List, Dict, Optional, Iterable
+from typing import List, Dict, Optional, Union
 from fastapi import WebSocket
 import asyncio
 import json
-from datetime import datetime
 from starlette.websockets import WebSocketDisconnect
 
+from app.services.realtime_events import InvoiceEvent
+from app.utils.logger import get_logger
+from app.utils.timezone import DayBounds, day_clock
+
+logger = get_logger("realtime")
+
 
 class RealtimeManager:
     """Administra conexiones WebSocket activas y mantiene solo las facturas del día actual."""
 
     def __init__(self):
         self.connections: Dict[str, List[WebSocket]] = {}
-        self.daily_messages: Dict[str, List[dict]] = {}  # historial por sede (solo de hoy)
+        # Historial por sede (solo de hoy): identidad -> evento, en orden de llegada.
+        self.daily_messages: Dict[str, Dict[str, InvoiceEvent]] = {}
+        self._history_day: Optional[int] = None
         self.loop: Optional[asyncio.AbstractEventLoop] = None
-        
-    @staticmethod
-    def _to_iso(value) -> Optional[str]:
-        if value is None:
-            return None
-
-        if isinstance(value, datetime):
-            return value.isoformat()
-
-        if isinstance(value, (int, float)):
-            try:
-                return datetime.fromtimestamp(value).isoformat()
-            except (OverflowError, OSError, ValueError):
-                return str(value)
-
-        return str(value)
-
-    @classmethod
-    def _resolve_iso_timestamp(cls, message: dict) -> str:
-        """Obtiene la marca de tiempo preferida para un mensaje."""
-
-        for key in ("invoice_date", "timestamp", "created_at", "issued_at"):
-            resolved = cls._to_iso(message.get(key))
-            if resolved:
-                return resolved
-        return datetime.now().isoformat()
-
-    @classmethod
-    def _message_date(cls, message: dict):
-        """Convierte la marca de tiempo en fecha (ignorando hora)."""
-
-        iso_value = cls._resolve_iso_timestamp(message)
-        try:
-            return datetime.fromisoformat(iso_value).date()
-        except (TypeError, ValueError):
-            return None
-        
-    @classmethod
-    def _message_identifier(cls, message: dict) -> Optional[str]:
-        """Genera un identificador estable para deduplicar mensajes."""
-
-        if not isinstance(message, dict):
-            return None
-
-        direct_id = (
-            message.get("invoice_id")
-            or message.get("id")
-            or message.get("uuid")
-        )
-        if direct_id:
-            return str(direct_id)
-
-        invoice_number = message.get("invoice_number") or message.get("number")
-        timestamp = (
-            message.get("timestamp")
-            or message.get("invoice_date")
-            or message.get("created_at")
-        )
-
-        normalized_timestamp: Optional[str] = None
-        if isinstance(timestamp, datetime):
-            normalized_timestamp = timestamp.isoformat()
-        elif isinstance(timestamp, (int, float)):
-            try:
-                normalized_timestamp = datetime.fromtimestamp(timestamp).isoformat()
-            except (OverflowError, OSError, ValueError):
-                normalized_timestamp = str(timestamp)
-        elif isinstance(timestamp, str):
-            normalized_timestamp = timestamp
-
-        if invoice_number and normalized_timestamp:
-            return f"{invoice_number}-{normalized_timestamp}"
-
-        if invoice_number:
-            return str(invoice_number)
-
-        if normalized_timestamp:
-            return normalized_timestamp
 
-        # último recurso: usa timestamp resuelto actual
-        resolved = cls._resolve_iso_timestamp(message)
-        return resolved
-
-    @classmethod
-    def _clean_history(cls, messages: Iterable[dict]) -> List[dict]:
-        """Elimina duplicados manteniendo solo el registro más reciente de cada factura."""
-
-        today = datetime.now().date()
-        cleaned_reversed: List[dict] = []
-        seen: set[str] = set()
-
-        for entry in reversed(list(messages)):
-            if not isinstance(entry, dict):
-                continue
+    def _evict_history(self, today: int) -> None:
+        if self._history_day == today:
+            return
+        for history in self.daily_messages.values():
+            history.clear()
+        self._history_day = today
 
-            if cls._message_date(entry) != today:
-                continue
+    def on_day_rollover(self, current: DayBounds, previous=None) -> None:
+        """Suscriptor del reloj: vacía el historial en el hilo del event loop."""
 
-            identifier = cls._message_identifier(entry)
-            if identifier and identifier in seen:
-                continue
+        loop = self.loop
+        if loop and loop.is_running():
+            loop.call_soon_threadsafe(self._evict_history, current.ordinal)
+        else:
+            self._evict_history(current.ordinal)
 
-            if identifier:
-                seen.add(identifier)
+    def _current_history(self, branch: str) -> Dict[str, InvoiceEvent]:
+        """Historial de la sede (el reloj lo vacía al cambiar de día)."""
 
-            cleaned_reversed.append(entry)
+        self._evict_history(day_clock.today_ordinal())
+        return self.daily_messages.setdefault(branch, {})
 
-        cleaned_reversed.reverse()
-        return cleaned_reversed
+    def _store_daily_message(self, branch: str, event: InvoiceEvent) -> None:
+        """Guarda el evento; si ya existía la misma factura queda solo el más reciente."""
 
-    def _store_daily_message(self, branch: str, message: dict) -> None:
-        """Guarda un mensaje en memoria eliminando duplicados y valores antiguos."""
+        history = self._current_history(branch)
+        history.pop(event.identity, None)
+        history[event.identity] = event
 
-        history = self.daily_messages.get(branch, [])
-        history.append(message)
-        self.daily_messages[branch] = self._clean_history(history)
+    def history(self, branch: str) -> List[InvoiceEvent]:
+        return list(self._current_history(branch).values())
 
     def set_loop(self, loop: asyncio.AbstractEventLoop):
         """Guarda el event loop principal para reutilizarlo en hilos secundarios."""
@@ -139,58 +62,58 @@ class RealtimeManager:
             self.loop = asyncio.get_running_loop()
         if branch not in self.connections:
             self.connections[branch] = []
-            self.daily_messages[branch] = []
 
         self.connections[branch].append(websocket)
-        print(f"🔌 Nueva conexión a canal {branch}. Total: {len(self.connections[branch])}")
+        logger.info("🔌 Nueva conexión a canal %s. Total: %s", branch, len(self.connections[branch]))
 
         # Enviar facturas del día actual al conectar
-        today = datetime.now().date()
-        self.daily_messages[branch] = self._clean_history(
-            self.daily_messages.get(branch, [])
-        )
-        for msg in list(self.daily_messages[branch]):
-            if self._message_date(msg) != today:
-                continue
+        for event in self.history(branch):
             try:
-                await websocket.send_text(json.dumps(msg, ensure_ascii=False))
+                await websocket.send_text(event.text)
             except WebSocketDisconnect:
                 await self.disconnect(websocket, branch)
                 return
             except Exception as exc:
-                print(
-                    f"⚠️ Error al reenviar historial a {branch}: {exc}"
-                )
+                logger.warning("⚠️ Error al reenviar historial a %s: %s", branch, exc)
                 await self.disconnect(websocket, branch)
                 return
 
     async def disconnect(self, websocket: WebSocket, branch: str):
         if branch in self.connections and websocket in self.connections[branch]:
             self.connections[branch].remove(websocket)
-            print(f"❌ Conexión cerrada en canal {branch}.")
+            logger.info("❌ Conexión cerrada en canal %s.", branch)
+
+    async def broadcast(self, branch: str, message: Union[InvoiceEvent, dict]):
+        """Envía un evento a todos los clientes de una sede y guarda solo los del día actual.
 
-    async def broadcast(self, branch: str, message: dict):
-        """Envía un mensaje JSON a todos los clientes de una sede y guarda solo los del día actual."""
-        message["timestamp"] = self._resolve_iso_timestamp(message)
-        
-        message_day = self._message_date(message)
-        today = datetime.now().date()
+        Acepta un :class:`InvoiceEvent` ya construido o, por compatibilidad,
+        un ``dict`` que se convierte una única vez.
+        """
 
-        if message_day and message_day != today:
+        event = message if isinstance(message, InvoiceEvent) else InvoiceEvent.from_payload(branch, message)
+
+        if event.day_ordinal is not None and event.day_ordinal != day_clock.today_ordinal():
             return
 
-        if branch not in self.daily_messages:
-            self.daily_messages[branch] = []
-        self._store_daily_message(branch, message)
+        if event.day_ordinal is not None:
+            self._store_daily_message(branch, event)
+
+        await self._send_all(branch, event.text)
+
+    async def notify(self, branch: str, payload: dict):
+        """Mensaje de estado (p. ej. ``freshness``): se envía pero no entra al historial."""
+
+        if self.connections.get(branch):
+            await self._send_all(branch, json.dumps(payload, ensure_ascii=False, default=str))
 
+    async def _send_all(self, branch: str, text: str):
         if branch not in self.connections:
             return
 
-        data = json.dumps(message, ensure_ascii=False)
         dead = []
         for ws in self.connections[branch]:
             try:
-                await ws.send_text(data)
+                await ws.send_text(text)
             except Exception:
                 dead.append(ws)
         for ws in dead:
@@ -198,3 +121,4 @@ class RealtimeManager:
 
 # instancia global
 realtime_manager = RealtimeManager()
+day_clock.subscribe(realtime_manager.on_day_rollover)
@@ -0,0 +1,182 @@
+"""Caché en memoria para las respuestas analíticas del dashboard.
+
+Cada dashboard abierto consulta periódicamente los mismos endpoints y la
+respuesta solo cambia cuando se guarda una factura nueva o cuando corre el
+cierre diario. Las entradas se guardan ya serializadas junto con la versión
+de datos vigente: cualquier ingesta incrementa esa versión y deja obsoletas
+todas las entradas sin necesidad de recorrerlas. Además del TTL corto, cada
+respuesta lleva un ``ETag`` para que el navegador reciba ``304`` cuando el
+resultado no cambió.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Mapping, NamedTuple, Optional
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+from app.config import settings
+from app.utils.request_timing import timed_phase
+from app.utils.timezone import day_clock
+
+
+class _CacheEntry(NamedTuple):
+    version: int
+    expires_at: float
+    body: bytes
+    etag: str
+
+
+_data_version = 0
+_data_version_lock = threading.Lock()
+
+
+def bump_data_version() -> int:
+    """Invalida todas las respuestas en caché (nueva factura, reset diario...)."""
+
+    global _data_version
+    with _data_version_lock:
+        _data_version += 1
+        return _data_version
+
+
+def current_data_version() -> int:
+    return _data_version
+
+
+class ResponseCache:
+    """Caché LRU con TTL por entrada, protegida para el threadpool de FastAPI."""
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max(1, int(max_entries))
+        self._entries: "OrderedDict[tuple, _CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple) -> Optional[_CacheEntry]:
+        now = time.monotonic()
+        version = current_data_version()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.version != version or entry.expires_at <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def set(self, key: tuple, entry: _CacheEntry) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+response_cache = ResponseCache(settings.RESPONSE_CACHE_MAX_ENTRIES)
+
+
+def _on_day_rollover(current, previous) -> None:
+    # Las respuestas de "hoy" del día anterior no deben servirse ni por ETag.
+    bump_data_version()
+    response_cache.clear()
+
+
+day_clock.subscribe(_on_day_rollover)
+
+
+def _normalize_params(params: Mapping[str, object]) -> tuple:
+    normalized = []
+    for name in sorted(params):
+        value = params[name]
+        if isinstance(value, str):
+            value = value.strip()
+        normalized.append((name, value))
+    return tuple(normalized)
+
+
+def _encode(payload: object) -> bytes:
+    # Mismo formato que ``JSONResponse`` de Starlette.
+    return json.dumps(
+        jsonable_encoder(payload),
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = {value.strip() for value in header.split(",")}
+    if "*" in candidates:
+        return True
+    weak_etag = f"W/{etag}"
+    return etag in candidates or weak_etag in candidates
+
+
+def _cache_key(route: str, params: Mapping[str, object]) -> tuple:
+    # El día local forma parte de la clave para que el cambio de día nunca
+    # sirva datos del día anterior.
+    return (route, day_clock.today_ordinal(), _normalize_params(params))
+
+
+def _build_entry(key: tuple, ttl: float, version: int, payload: object) -> _CacheEntry:
+    with timed_phase("encode"):
+        body = _encode(payload)
+    etag = '"{}"'.format(hashlib.sha1(body).hexdigest())
+    entry = _CacheEntry(version, time.monotonic() + ttl, body, etag)
+    if ttl > 0:
+        response_cache.set(key, entry)
+    return entry
+
+
+def _render(request: Request, entry: _CacheEntry) -> Response:
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request, entry.etag):
+        return Response(status_code=304, headers=headers)
+
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
+async def cached_json_response(
+    request: Request,
+    route: str,
+    params: Mapping[str, object],
+    ttl: float,
+    compute: Callable[[], Awaitable[object]],
+) -> Response:
+    """Devuelve la respuesta cacheada de ``route`` o la calcula con ``compute``.
+
+    ``compute`` es una corrutina; las rutas la construyen con ``db.run_sync``
+    para que la consulta solo se ejecute cuando no hay entrada vigente.
+    """
+
+    key = _cache_key(route, params)
+    entry = response_cache.get(key) if ttl > 0 else None
+
+    if entry is None:
+        version = current_data_version()
+        with timed_phase("compute"):
+            payload = await compute()
+        entry = _build_entry(key, ttl, version, payload)
+
+    return _render(request, entry)
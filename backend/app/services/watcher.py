@@ -0,0 +1,228 @@
+"""Selección del backend de observación de la carpeta de facturas.
+
+``INVOICE_WATCHER_BACKEND`` acepta:
+
+* ``polling``: ``PollingObserver`` de watchdog (comportamiento histórico).
+* ``native``: observador por eventos del sistema operativo (inotify,
+  ReadDirectoryChangesW, FSEvents...) sin verificación previa.
+* ``auto`` (por defecto): intenta el observador nativo y lo verifica
+  creando un archivo canario en la carpeta; si el evento no llega a tiempo,
+  la carpeta no admite escritura o es un montaje de red en Linux (donde
+  inotify no ve los cambios hechos desde otro equipo) se usa polling.
+
+También se guarda la latencia archivo → dashboard por backend para poder
+comparar ambos modos.
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from functools import partial
+from typing import Callable, Deque, Dict, Optional, Tuple, Union
+
+from watchdog.events import FileSystemEventHandler
+from watchdog.observers import Observer
+from watchdog.observers.api import BaseObserver
+from watchdog.observers.polling import PollingEmitter, PollingObserver
+
+from app.utils.logger import get_logger
+
+
+BACKEND_NATIVE = "native"
+BACKEND_POLLING = "polling"
+BACKEND_AUTO = "auto"
+
+CANARY_PREFIX = ".visor-canary-"
+
+logger = get_logger("watcher")
+
+# Sistemas de archivos de red donde inotify solo ve cambios locales.
+_NETWORK_FILESYSTEMS = frozenset(
+    {"cifs", "smb3", "smbfs", "nfs", "nfs4", "9p", "fuse.sshfs", "fuse.rclone", "davfs"}
+)
+
+_LATENCY_WINDOW = 500
+
+
+def _mount_fstype(path: str) -> Optional[str]:
+    """Tipo de sistema de archivos de ``path`` según ``/proc/mounts`` (solo Linux)."""
+
+    if not sys.platform.startswith("linux"):
+        return None
+
+    target = os.path.realpath(path)
+    best_match: Tuple[int, Optional[str]] = (-1, None)
+    try:
+        with open("/proc/mounts", "r", encoding="utf-8") as mounts:
+            for line in mounts:
+                parts = line.split()
+                if len(parts) < 3:
+                    continue
+                mount_point = parts[1].replace("\\040", " ")
+                if target == mount_point or target.startswith(mount_point.rstrip("/") + "/"):
+                    if len(mount_point) > best_match[0]:
+                        best_match = (len(mount_point), parts[2])
+    except OSError:
+        return None
+    return best_match[1]
+
+
+def is_network_filesystem(path: str) -> bool:
+    return (_mount_fstype(path) or "") in _NETWORK_FILESYSTEMS
+
+
+class _CanaryHandler(FileSystemEventHandler):
+    def __init__(self, canary_name: str):
+        self.canary_name = canary_name
+        self.seen = threading.Event()
+
+    def on_any_event(self, event):
+        if os.path.basename(getattr(event, "src_path", "") or "") == self.canary_name:
+            self.seen.set()
+
+
+def probe_native_events(path: str, timeout: float) -> bool:
+    """Verifica que el observador nativo reciba eventos en ``path``."""
+
+    canary_name = f"{CANARY_PREFIX}{uuid.uuid4().hex}.tmp"
+    canary_path = os.path.join(path, canary_name)
+    handler = _CanaryHandler(canary_name)
+    observer = Observer()
+
+    try:
+        observer.schedule(handler, path, recursive=False)
+        observer.start()
+    except Exception as exc:
+        logger.warning("⚠️ Observador nativo no disponible en %s: %s", path, exc)
+        return False
+
+    try:
+        try:
+            with open(canary_path, "wb") as canary:
+                canary.write(b"visor-realtime")
+        except OSError as exc:
+            logger.warning("⚠️ No se pudo escribir el archivo canario en %s: %s", path, exc)
+            return False
+        return handler.seen.wait(timeout)
+    finally:
+        try:
+            os.remove(canary_path)
+        except OSError:
+            pass
+        observer.stop()
+        observer.join(timeout=5)
+
+
+def select_backend(path: str, requested: str, probe_timeout: float) -> str:
+    requested = (requested or BACKEND_AUTO).strip().lower()
+    if requested == BACKEND_POLLING:
+        return BACKEND_POLLING
+    if requested == BACKEND_NATIVE:
+        return BACKEND_NATIVE
+
+    if is_network_filesystem(path):
+        logger.info("ℹ️ %s es un montaje de red (%s); se usa polling.", path, _mount_fstype(path))
+        return BACKEND_POLLING
+
+    if probe_native_events(path, probe_timeout):
+        return BACKEND_NATIVE
+
+    logger.info("ℹ️ El canario no generó eventos nativos; se usa polling.")
+    return BACKEND_POLLING
+
+
+class AdaptivePollingEmitter(PollingEmitter):
+    """``PollingEmitter`` que consulta el intervalo antes de cada sondeo."""
+
+    def __init__(self, *args, interval: Callable[[], float], **kwargs):
+        self._interval = interval
+        super().__init__(*args, **kwargs)
+
+    @property
+    def timeout(self) -> float:
+        try:
+            return max(float(self._interval()), 0.05)
+        except Exception:
+            return self._timeout
+
+
+class AdaptivePollingObserver(BaseObserver):
+    def __init__(self, interval: Callable[[], float]):
+        super().__init__(partial(AdaptivePollingEmitter, interval=interval), timeout=interval())
+
+
+def create_observer(
+    backend: str, poll_interval: Union[float, Callable[[], float]]
+) -> BaseObserver:
+    """Crea el observador; ``poll_interval`` puede ser fijo o una función."""
+
+    if backend == BACKEND_NATIVE:
+        return Observer()
+    if callable(poll_interval):
+        return AdaptivePollingObserver(poll_interval)
+    return PollingObserver(timeout=poll_interval)
+
+
+class WatcherStats:
+    """Backend activo y latencia archivo escrito → evento enviado por backend."""
+
+    def __init__(self):
+        self.active_backend: Optional[str] = None
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def set_backend(self, backend: str) -> None:
+        self.active_backend = backend
+
+    def record_latency(
+        self,
+        file_mtime: Optional[float],
+        now: Optional[float] = None,
+        backend: Optional[str] = None,
+    ) -> None:
+        backend = backend or self.active_backend
+        if file_mtime is None or backend is None:
+            return
+        latency = (time.time() if now is None else now) - file_mtime
+        if latency < 0:
+            latency = 0.0
+        with self._lock:
+            window = self._latencies.setdefault(backend, deque(maxlen=_LATENCY_WINDOW))
+            window.append(latency)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            snapshot = {backend: sorted(values) for backend, values in self._latencies.items()}
+
+        result: Dict[str, Dict[str, float]] = {}
+        for backend, values in snapshot.items():
+            if not values:
+                continue
+            result[backend] = {
+                "samples": len(values),
+                "p50": values[int(0.50 * (len(values) - 1))],
+                "p95": values[int(0.95 * (len(values) - 1))],
+                "max": values[-1],
+            }
+        return result
+
+    def report(self) -> None:
+        for backend, stats in self.summary().items():
+            marker = " (activo)" if backend == self.active_backend else ""
+            logger.info(
+                "📈 Latencia archivo→dashboard [%s%s]: p50=%.2fs p95=%.2fs máx=%.2fs (%s facturas)",
+                backend,
+                marker,
+                stats["p50"],
+                stats["p95"],
+                stats["max"],
+                stats["samples"],
+            )
+
+
+watcher_stats = WatcherStats()
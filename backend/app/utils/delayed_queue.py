@@ -0,0 +1,63 @@
+"""Cola de tareas diferidas atendida por un único hilo.
+
+Sustituye a ``time.sleep`` dentro de los workers: en lugar de bloquear un
+hilo mientras se espera, la tarea se agenda y el hilo queda libre.
+Las tareas deben ser cortas (un ``stat`` o encolar trabajo en otro pool).
+"""
+
+from __future__ import annotations
+
+import heapq
+import itertools
+import threading
+import time
+from typing import Any, Callable, List, Optional, Tuple
+
+from app.utils.logger import get_logger
+
+logger = get_logger("delayed")
+
+
+class DelayedTaskQueue:
+    def __init__(self, name: str = "delayed-tasks"):
+        self.name = name
+        self._heap: List[Tuple[float, int, Callable[..., Any], tuple]] = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def call_later(self, delay: float, fn: Callable[..., Any], *args: Any) -> None:
+        """Ejecuta ``fn(*args)`` dentro de ``delay`` segundos."""
+
+        due = time.monotonic() + max(0.0, float(delay))
+        with self._condition:
+            heapq.heappush(self._heap, (due, next(self._counter), fn, args))
+            self._ensure_thread()
+            self._condition.notify()
+
+    def __len__(self) -> int:
+        with self._condition:
+            return len(self._heap)
+
+    def _ensure_thread(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._heap:
+                    self._condition.wait()
+                due, _, fn, args = self._heap[0]
+                remaining = due - time.monotonic()
+                if remaining > 0:
+                    self._condition.wait(remaining)
+                    continue
+                heapq.heappop(self._heap)
+
+            try:
+                fn(*args)
+            except Exception:
+                logger.exception("❌ Error en tarea diferida %s", getattr(fn, "__name__", fn))
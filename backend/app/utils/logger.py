@@ -0,0 +1,165 @@
+"""Logging estructurado y sin bloqueo para el backend.
+
+Los registros se encolan con un ``QueueHandler`` y un único hilo
+(``QueueListener``) los escribe en stdout, así los workers de ingesta y el
+event loop nunca esperan a journald. Cada logger pasa además por un filtro
+que limita cuántas veces por ventana se repite el mismo mensaje; al reanudar
+se informa cuántos se omitieron.
+
+``LOG_FORMAT=json`` emite una línea JSON por registro; los campos pasados con
+``extra={"fields": {...}}`` se agregan como claves.
+
+Para el detalle por archivo se usa :class:`ActivitySummary`: cada evento se
+cuenta y el total se resume en una sola línea ``INFO`` por intervalo; el
+detalle individual queda en ``DEBUG``.
+"""
+
+from __future__ import annotations
+
+import atexit
+import json
+import logging
+import queue
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional, Tuple
+
+from app.config import settings
+
+ROOT_LOGGER_NAME = "visor"
+
+_configured = False
+_configure_lock = threading.Lock()
+_listener: Optional[QueueListener] = None
+
+
+class StructuredFormatter(logging.Formatter):
+    def __init__(self, json_output: bool = False):
+        super().__init__("%(asctime)s %(levelname)-7s %(name)s | %(message)s")
+        self.json_output = json_output
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = getattr(record, "fields", None) or {}
+        if not self.json_output:
+            line = super().format(record)
+            if fields:
+                line += " | " + " ".join(f"{key}={value}" for key, value in fields.items())
+            return line
+
+        payload = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            **fields,
+        }
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """Deja pasar como máximo ``limit`` registros por mensaje y ventana.
+
+    La clave es la plantilla sin formatear (``record.msg``), por eso los
+    mensajes repetitivos deben usar argumentos ``%s`` y no f-strings.
+    """
+
+    def __init__(self, limit: int, window: float):
+        super().__init__()
+        self.limit = max(0, int(limit))
+        self.window = max(0.1, float(window))
+        self._buckets: Dict[Tuple[str, int, str], list] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.limit <= 0:
+            return True
+
+        key = (record.name, record.levelno, str(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None or now - bucket[0] >= self.window:
+                suppressed = bucket[2] if bucket else 0
+                self._buckets[key] = [now, 1, 0]
+                if suppressed:
+                    record.msg = f"{record.msg} (+{suppressed} omitidos en {self.window:.0f}s)"
+                return True
+
+            if bucket[1] < self.limit:
+                bucket[1] += 1
+                return True
+
+            bucket[2] += 1
+            return False
+
+
+def configure_logging() -> None:
+    """Instala el handler con cola en el logger ``visor`` (idempotente)."""
+
+    global _configured, _listener
+    with _configure_lock:
+        if _configured:
+            return
+
+        stream = logging.StreamHandler(sys.stdout)
+        stream.setFormatter(StructuredFormatter(settings.LOG_FORMAT.lower() == "json"))
+
+        log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+        _listener = QueueListener(log_queue, stream, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+        handler = QueueHandler(log_queue)
+        handler.addFilter(
+            RateLimitFilter(settings.LOG_RATE_LIMIT, settings.LOG_RATE_LIMIT_WINDOW)
+        )
+
+        root = logging.getLogger(ROOT_LOGGER_NAME)
+        root.setLevel(getattr(logging, settings.LOG_LEVEL.upper(), logging.INFO))
+        root.addHandler(handler)
+        root.propagate = False
+        _configured = True
+
+
+def get_logger(name: str) -> logging.Logger:
+    configure_logging()
+    return logging.getLogger(f"{ROOT_LOGGER_NAME}.{name}")
+
+
+class ActivitySummary:
+    """Cuenta eventos repetitivos y los resume en una línea cada ``interval``."""
+
+    def __init__(self, logger: logging.Logger, label: str, interval: float):
+        self.logger = logger
+        self.label = label
+        self.interval = max(1.0, float(interval))
+        self._counts: Dict[str, int] = {}
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    def record(self, key: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counts[key] = self._counts.get(key, 0) + amount
+        self.flush_if_due()
+
+    def flush_if_due(self, now: Optional[float] = None) -> None:
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if now - self._last_flush < self.interval:
+                return
+            counts, self._counts = self._counts, {}
+            elapsed = now - self._last_flush
+            self._last_flush = now
+
+        if counts:
+            self.logger.info(
+                "%s en %.0fs: %s",
+                self.label,
+                elapsed,
+                ", ".join(f"{key}={value}" for key, value in sorted(counts.items())),
+                extra={"fields": counts},
+            )
@@ -0,0 +1,178 @@
+"""Tiempos por petición: SQL, cálculo y serialización en ``Server-Timing``.
+
+:class:`ServerTimingMiddleware` abre un :class:`RequestTimings` por petición
+en una ``ContextVar``. Los hooks ``before/after_cursor_execute`` que instala
+:func:`instrument_engine` suman ahí el tiempo y la cantidad de consultas
+(funciona igual con ``AsyncSession.run_sync`` y con el threadpool, que
+heredan el contexto), y la caché de respuestas mide el cálculo del payload y
+la codificación JSON. Al enviar la respuesta se agrega::
+
+    Server-Timing: db;dur=41.2;desc="7 consultas", orm;dur=18.5, encode;dur=2.1, total;dur=63.0
+
+``orm`` es el tiempo del payload fuera de la base (ORM, regresión...).
+Las consultas más lentas que ``SLOW_QUERY_MS`` se registran con su SQL
+normalizado, también las de los hilos de ingesta.
+"""
+
+from __future__ import annotations
+
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional
+
+from sqlalchemy import event
+
+from app.config import settings
+from app.utils.logger import get_logger
+
+logger = get_logger("sql")
+
+SLOW_QUERY_SECONDS = max(settings.SLOW_QUERY_MS, 0) / 1000.0
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s|\$\d+")
+_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?(?![\w.])")
+_VALUE_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_sql(statement: str, limit: int = 2000) -> str:
+    """SQL en una línea con literales y parámetros como ``?``."""
+
+    normalized = _STRING_LITERAL.sub("?", statement)
+    normalized = _PLACEHOLDER.sub("?", normalized)
+    normalized = _NUMBER.sub("?", normalized)
+    normalized = _VALUE_LIST.sub("(?...)", normalized)
+    normalized = _WHITESPACE.sub(" ", normalized).strip()
+    if len(normalized) > limit:
+        normalized = normalized[:limit] + "…"
+    return normalized
+
+
+class RequestTimings:
+    __slots__ = ("started", "db_seconds", "queries", "phases")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_seconds = 0.0
+        self.queries = 0
+        self.phases: Dict[str, float] = {}
+
+    def add_query(self, seconds: float) -> None:
+        self.db_seconds += seconds
+        self.queries += 1
+
+    def add_phase(self, name: str, seconds: float) -> None:
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def header_value(self, now: Optional[float] = None) -> str:
+        total = (now or time.perf_counter()) - self.started
+        parts = [f'db;dur={self.db_seconds * 1000:.1f};desc="{self.queries} consultas"']
+        compute = self.phases.get("compute")
+        if compute is not None:
+            # El payload corre la consulta adentro: lo que sobra es Python.
+            parts.append(f"orm;dur={max(compute - self.db_seconds, 0.0) * 1000:.1f}")
+        for name, seconds in self.phases.items():
+            if name != "compute":
+                parts.append(f"{name};dur={seconds * 1000:.1f}")
+        parts.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(parts)
+
+
+_current: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+def current_timings() -> Optional[RequestTimings]:
+    return _current.get()
+
+
+@contextmanager
+def timed_phase(name: str) -> Iterator[None]:
+    """Suma la duración del bloque a la fase ``name`` de la petición actual."""
+
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add_phase(name, time.perf_counter() - started)
+
+
+# ===============================
+#   HOOKS DE SQLALCHEMY
+# ===============================
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stack = conn.info.get("query_started")
+    if not stack:
+        return
+    elapsed = time.perf_counter() - stack.pop()
+
+    timings = _current.get()
+    if timings is not None:
+        timings.add_query(elapsed)
+
+    if SLOW_QUERY_SECONDS and elapsed >= SLOW_QUERY_SECONDS:
+        logger.warning(
+            "🐢 Consulta lenta (%.0f ms): %s",
+            elapsed * 1000,
+            normalize_sql(statement),
+            extra={"fields": {"duration_ms": round(elapsed * 1000, 1)}},
+        )
+
+
+def _handle_error(exception_context):
+    # Si la consulta falla no llega ``after_cursor_execute``: se descarta su marca.
+    connection = exception_context.connection
+    if connection is not None:
+        stack = connection.info.get("query_started")
+        if stack:
+            stack.pop()
+
+
+def instrument_engine(engine) -> None:
+    """Instala los hooks de tiempo en un ``Engine`` síncrono (o ``sync_engine``)."""
+
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+# ===============================
+#   MIDDLEWARE
+# ===============================
+class ServerTimingMiddleware:
+    """Middleware ASGI que agrega ``Server-Timing`` a cada respuesta HTTP."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = _current.set(timings)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", timings.header_value().encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
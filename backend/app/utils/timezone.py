@@ -1,10 +1,23 @@
+"""Hora local y límites del día compartidos por rutas, reset y realtime.
+
+:class:`DayClock` resuelve la zona horaria una sola vez y guarda los límites
+del día local; solo los recalcula al cruzar la medianoche. En ese momento
+publica un evento de cambio de día para que los suscriptores (historial
+realtime, caché de respuestas, cierre diario...) reaccionen una sola vez en
+lugar de comparar fechas en cada petición.
+"""
+
 from __future__ import annotations
 
-from datetime import datetime, timedelta
-from typing import Optional, Tuple
+import threading
+from datetime import date, datetime, timedelta
+from typing import Callable, List, NamedTuple, Optional, Tuple
 from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 from app.config import settings
+from app.utils.logger import get_logger
+
+logger = get_logger("day_clock")
 
 
 def _resolve_timezone() -> ZoneInfo:
@@ -22,20 +35,143 @@ def _resolve_timezone() -> ZoneInfo:
     return ZoneInfo("UTC")
 
 
+class DayBounds(NamedTuple):
+    start: datetime
+    end: datetime
+
+    @property
+    def day(self) -> date:
+        return self.start.date()
+
+    @property
+    def ordinal(self) -> int:
+        return self.start.date().toordinal()
+
+
+RolloverCallback = Callable[[DayBounds, Optional[DayBounds]], None]
+
+
+def _bounds_for(moment: datetime) -> DayBounds:
+    start = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    # ``replace`` conserva la zona; el día siguiente se calcula por fecha para
+    # no depender de la duración del día.
+    next_day = start.date() + timedelta(days=1)
+    end = datetime(next_day.year, next_day.month, next_day.day, tzinfo=start.tzinfo)
+    return DayBounds(start, end)
+
+
+class DayClock:
+    def __init__(self, tz: Optional[ZoneInfo] = None):
+        self.tz = tz or _resolve_timezone()
+        self._lock = threading.Lock()
+        self._bounds = _bounds_for(datetime.now(tz=self.tz))
+        self._subscribers: List[RolloverCallback] = []
+        self._timer: Optional[threading.Timer] = None
+
+    def now(self) -> datetime:
+        return datetime.now(tz=self.tz)
+
+    def bounds(self, now: Optional[datetime] = None) -> DayBounds:
+        """Límites del día local actual (recalculados solo al cambiar de día)."""
+
+        now = now or self.now()
+        bounds = self._bounds
+        if bounds.start <= now < bounds.end:
+            return bounds
+        return self._rollover(now)
+
+    def today_ordinal(self) -> int:
+        return self.bounds().ordinal
+
+    def local_date(self, value: datetime) -> date:
+        """Fecha local de ``value`` (las fechas sin zona se asumen locales)."""
+
+        if value.tzinfo is not None:
+            value = value.astimezone(self.tz)
+        return value.date()
+
+    def subscribe(self, callback: RolloverCallback) -> RolloverCallback:
+        """Registra ``callback(nuevo, anterior)`` para cada cambio de día."""
+
+        with self._lock:
+            self._subscribers.append(callback)
+        return callback
+
+    def _rollover(self, now: datetime) -> DayBounds:
+        with self._lock:
+            previous = self._bounds
+            if previous.start <= now < previous.end:
+                return previous
+            current = _bounds_for(now.astimezone(self.tz))
+            self._bounds = current
+            subscribers = list(self._subscribers)
+
+        # El reloj del sistema puede retroceder (NTP); solo se publica al avanzar.
+        if current.start > previous.start:
+            logger.info("📅 Cambio de día: %s → %s", previous.day, current.day)
+            # Se publica en otro hilo: quien detecta el cambio puede ser una
+            # petición dentro del event loop y el cierre diario usa la base.
+            threading.Thread(
+                target=self._publish,
+                args=(subscribers, current, previous),
+                name="day-clock-rollover",
+                daemon=True,
+            ).start()
+        return current
+
+    @staticmethod
+    def _publish(
+        subscribers: List[RolloverCallback], current: DayBounds, previous: DayBounds
+    ) -> None:
+        for callback in subscribers:
+            try:
+                callback(current, previous)
+            except Exception:
+                logger.exception("❌ Error en suscriptor de cambio de día %r", callback)
+
+    def start(self) -> None:
+        """Programa la publicación del cambio de día aunque no haya peticiones."""
+
+        self._schedule_next()
+
+    def _schedule_next(self) -> None:
+        delay = (self._bounds.end - self.now()).total_seconds()
+        timer = threading.Timer(max(delay, 0.0) + 0.5, self._on_timer)
+        timer.daemon = True
+        timer.name = "day-clock"
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = timer
+        timer.start()
+
+    def _on_timer(self) -> None:
+        try:
+            self.bounds()
+        finally:
+            self._schedule_next()
+
+
+day_clock = DayClock()
+
+
 def current_local_day_bounds(
     reference: Optional[datetime] = None,
 ) -> Tuple[datetime, datetime, datetime]:
     """Return now, the local midnight for the day, and the next midnight."""
 
-    tz = _resolve_timezone()
-    now = (reference.astimezone(tz) if reference else datetime.now(tz=tz)).astimezone(tz)
-    start_of_day = now.replace(hour=0, minute=0, second=0, microsecond=0)
-    end_of_day = start_of_day + timedelta(days=1)
-    return now, start_of_day, end_of_day
+    if reference is None:
+        now = day_clock.now()
+        bounds = day_clock.bounds(now)
+        return now, bounds.start, bounds.end
+
+    now = reference.astimezone(day_clock.tz)
+    bounds = _bounds_for(now)
+    return now, bounds.start, bounds.end
 
 
 def midnight_today(reference: Optional[datetime] = None) -> datetime:
     """Return the start of the current local day."""
 
     _, start_of_day, _ = current_local_day_bounds(reference)
-    return start_of_day
\ No newline at end of file
+    return start_of_day
@@ -0,0 +1,8 @@
+"""Benchmarks del backend (se ejecutan con ``python -m benchmarks.<modulo>``)."""
+
+import os
+import sys
+
+_REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if _REPO_ROOT not in sys.path:
+    sys.path.append(_REPO_ROOT)
@@ -0,0 +1,229 @@
+"""Benchmark de las rutas analíticas sobre los datos de ``seed_analytics``.
+
+Cada caso es una ruta con una mezcla de parámetros realista. Por caso:
+
+* se hacen ``--iterations`` peticiones por la pila ASGI completa (sin
+  levantar el servidor ni el monitor de archivos), vaciando la caché de
+  respuestas antes de cada una, y se reportan p50/p95/p99;
+* se capturan las consultas SQL que ejecuta el payload de la ruta (en los
+  pronósticos, su fase de consultas ``_today_forecast_inputs``) y se guarda
+  su ``EXPLAIN (ANALYZE, BUFFERS)``.
+
+Con ``--baseline`` se marca como regresión todo caso cuyo p95 empeore más
+que ``--threshold`` (20 % por defecto) y el proceso termina con código 1.
+
+El cierre diario se apaga con ``DAILY_RESET_ENABLED`` durante la medición:
+si corriera, movería los días sembrados a los resúmenes y al archivo.
+
+Uso::
+
+    cd backend
+    python -m benchmarks.seed_analytics --days 90 --branches 8 --invoices 1200
+    python -m benchmarks.analytics_api --output benchmarks/out/analytics.json
+    python -m benchmarks.analytics_api --baseline benchmarks/out/analytics.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+from typing import Callable, Dict, List, NamedTuple, Tuple
+
+import httpx
+from sqlalchemy import event
+
+from app.api import routes_invoices
+from app.config import settings
+from app.database import SessionLocal, engine
+from app.main import app
+from app.services.response_cache import response_cache
+from benchmarks.results import (
+    build_document,
+    compare,
+    load_document,
+    print_table,
+    summarize,
+    write_document,
+)
+from benchmarks.seed_analytics import BRANCH_PREFIX
+
+
+class Case(NamedTuple):
+    name: str
+    path: str
+    params: dict
+    payload: Callable
+    args: Tuple
+
+
+def build_cases(branch: str) -> List[Case]:
+    cases = [
+        Case("today", "/invoices/today", {"limit": 700}, routes_invoices._today_invoices_payload, (700, 0)),
+        Case(
+            "today_page2",
+            "/invoices/today",
+            {"limit": 100, "offset": 100},
+            routes_invoices._today_invoices_payload,
+            (100, 100),
+        ),
+    ]
+    for days in (7, 30, 90):
+        cases.append(
+            Case(
+                f"daily_sales_{days}d_all",
+                "/invoices/daily-sales",
+                {"days": days, "branch": "all"},
+                routes_invoices._daily_sales_payload,
+                (days, "all"),
+            )
+        )
+    cases.append(
+        Case(
+            "daily_sales_30d_branch",
+            "/invoices/daily-sales",
+            {"days": 30, "branch": branch},
+            routes_invoices._daily_sales_payload,
+            (30, branch),
+        )
+    )
+    for history_days in (7, 14, 30, 90):
+        cases.append(
+            Case(
+                f"forecast_{history_days}d_all",
+                "/invoices/today/forecast",
+                {"branch": "all", "history_days": history_days},
+                routes_invoices._today_forecast_inputs,
+                ("all", history_days),
+            )
+        )
+    cases.append(
+        Case(
+            "forecast_14d_branch",
+            "/invoices/today/forecast",
+            {"branch": branch, "history_days": 14},
+            routes_invoices._today_forecast_inputs,
+            (branch, 14),
+        )
+    )
+    return cases
+
+
+async def measure(cases: List[Case], iterations: int, warmup: int) -> Dict[str, dict]:
+    # Un solo event loop para todos los casos: el pool de asyncpg queda
+    # ligado al loop que abrió sus conexiones.
+    results: Dict[str, dict] = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for case in cases:
+            samples = []
+            started = time.perf_counter()
+            for index in range(warmup + iterations):
+                response_cache.clear()
+                begin = time.perf_counter()
+                response = await client.get(case.path, params=case.params)
+                elapsed_ms = (time.perf_counter() - begin) * 1000
+                response.raise_for_status()
+                if index >= warmup:
+                    samples.append(elapsed_ms)
+            results[case.name] = summarize(samples, time.perf_counter() - started, unit="requests")
+    return results
+
+
+def explain(case: Case) -> List[dict]:
+    """``EXPLAIN (ANALYZE, BUFFERS)`` de cada SELECT que ejecuta el payload."""
+
+    captured: List[Tuple[str, object]] = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            captured.append((statement, parameters))
+
+    db = SessionLocal()
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        case.payload(db, *case.args)
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+        db.rollback()
+
+    plans = []
+    try:
+        raw = db.connection().connection
+        with raw.cursor() as cursor:
+            for statement, parameters in captured:
+                cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS) {statement}", parameters)
+                plan = "\n".join(row[0] for row in cursor.fetchall())
+                plans.append({"statement": statement, "plan": plan})
+        db.rollback()
+    finally:
+        db.close()
+    return plans
+
+
+def _execution_total(plans: List[dict]) -> float:
+    total = 0.0
+    for entry in plans:
+        for line in entry["plan"].splitlines():
+            if line.startswith("Execution Time:"):
+                total += float(line.split(":")[1].split()[0])
+    return round(total, 3)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--branch", default=f"{BRANCH_PREFIX}01", help="Sede para los casos filtrados")
+    parser.add_argument("--cases", help="Lista separada por comas (por defecto, todos)")
+    parser.add_argument("--no-explain", action="store_true")
+    parser.add_argument("--output")
+    parser.add_argument("--baseline")
+    parser.add_argument("--threshold", type=float, default=0.20, help="Empeoramiento tolerado del p95")
+    args = parser.parse_args()
+
+    cases = build_cases(args.branch)
+    if args.cases:
+        wanted = {name.strip() for name in args.cases.split(",")}
+        cases = [case for case in cases if case.name in wanted]
+
+    # Sin cierre diario: movería los días sembrados a los resúmenes y al archivo.
+    settings.DAILY_RESET_ENABLED = False
+    scenarios = asyncio.run(measure(cases, args.iterations, args.warmup))
+    plans: Dict[str, List[dict]] = {}
+    if not args.no_explain:
+        for case in cases:
+            plans[case.name] = explain(case)
+            scenarios[case.name]["sql_statements"] = len(plans[case.name])
+            scenarios[case.name]["sql_execution_ms"] = _execution_total(plans[case.name])
+
+    print_table(scenarios, unit="requests")
+    document = build_document(
+        "analytics_api",
+        {"iterations": args.iterations, "warmup": args.warmup, "branch": args.branch},
+        scenarios,
+    )
+    document["plans"] = plans
+    if args.output:
+        write_document(args.output, document)
+        print(f"Resultados guardados en {args.output}")
+
+    if not args.baseline:
+        return 0
+
+    baseline = load_document(args.baseline)
+    regressions = []
+    print(f"Comparación de p95 contra {baseline.get('commit') or args.baseline}:")
+    for name, change in compare(document, baseline).items():
+        if change is None:
+            print(f"  {name:<26} sin dato previo")
+            continue
+        flag = change > args.threshold
+        if flag:
+            regressions.append(name)
+        print(f"  {name:<26} {change * 100:+7.1f} %{'  ⚠️ REGRESIÓN' if flag else ''}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
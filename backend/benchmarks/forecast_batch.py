@@ -0,0 +1,99 @@
+"""Compara el pronóstico de todas las sedes en un lote contra un pronóstico por petición.
+
+Uso::
+
+    cd backend
+    python -m benchmarks.forecast_batch --branches 40 --history-days 30
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import statistics
+import time
+from typing import Callable, Dict
+
+from shared import forecasting
+from shared.helpers import estimate_daily_sales_total, estimate_daily_sales_totals
+
+
+def _build_requests(branches: int, history_days: int, seed: int) -> Dict[str, dict]:
+    rng = random.Random(seed)
+    requests: Dict[str, dict] = {}
+    for index in range(branches):
+        base = rng.uniform(2_000_000, 20_000_000)
+        history = []
+        previous = base
+        for _ in range(history_days):
+            total = base * rng.uniform(0.8, 1.2)
+            partial = total * rng.uniform(0.3, 0.6)
+            invoices = int(total / rng.uniform(20_000, 40_000))
+            history.append(
+                {
+                    "partial_total": partial,
+                    "invoice_count": invoices,
+                    "previous_total": previous,
+                    "total": total,
+                }
+            )
+            previous = total
+        requests[f"B{index:03d}"] = {
+            "partial_sales": base * 0.4,
+            "invoice_count": int(base * 0.4 / 30_000),
+            "previous_total": previous,
+            "history": history,
+        }
+    return requests
+
+
+def _time(fn: Callable[[], object], repeat: int) -> list[float]:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--branches", type=int, default=40)
+    parser.add_argument("--history-days", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    requests = _build_requests(args.branches, args.history_days, args.seed)
+
+    def per_request_loop():
+        return {key: estimate_daily_sales_total(**request) for key, request in requests.items()}
+
+    def batched():
+        return estimate_daily_sales_totals(requests)
+
+    scenarios = {"per_request_loop": per_request_loop, "batched": batched}
+
+    print(
+        f"Sedes: {args.branches} | días de historial: {args.history_days} | "
+        f"repeticiones: {args.repeat} | NumPy: {forecasting.HAS_NUMPY}"
+    )
+
+    backends = [("numpy", True), ("python", False)] if forecasting.HAS_NUMPY else [("python", False)]
+    original = forecasting.HAS_NUMPY
+    try:
+        for backend_name, enabled in backends:
+            forecasting.HAS_NUMPY = enabled
+            for name, fn in scenarios.items():
+                timings = _time(fn, args.repeat)
+                print(
+                    f"{backend_name:>6} {name:<18} "
+                    f"mediana={statistics.median(timings):8.3f} ms  "
+                    f"mín={min(timings):8.3f} ms"
+                )
+    finally:
+        forecasting.HAS_NUMPY = original
+
+
+if __name__ == "__main__":
+    main()
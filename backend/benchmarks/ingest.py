@@ -0,0 +1,288 @@
+"""Benchmark de la ruta de ingesta de facturas sobre un corpus sintético.
+
+Escenarios:
+
+* ``parse``: ``parse_invoice`` + fecha de emisión, en memoria.
+* ``parse_db``: ``process_file`` completo contra el Postgres configurado
+  (lectura, parseo, deduplicación, escritura y registro de ingesta).
+* ``watcher``: un monitor real sobre una carpeta temporal; se mide desde que
+  el archivo aparece hasta que el evento llega a un WebSocket de prueba.
+
+Los escenarios con base de datos borran al final las facturas y filas del
+registro que crearon. Si no hay Postgres se reportan como omitidos.
+
+Uso::
+
+    cd backend
+    python -m benchmarks.ingest --count 500 --output benchmarks/out/ingest.json
+    python -m benchmarks.ingest --scenarios parse --baseline benchmarks/out/ingest.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+from dataclasses import asdict
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+
+from app.database import SessionLocal
+from app.models.ingestion_ledger import IngestionLedgerEntry
+from app.models.invoice import Invoice
+from app.models.invoice_item import InvoiceItem
+from app.services.invoice_sources import file_key
+from app.services.parser import parse_invoice, parse_issue_date
+from benchmarks.results import (
+    build_document,
+    load_document,
+    print_comparison,
+    print_table,
+    summarize,
+    write_document,
+)
+from benchmarks.ubl_generator import (
+    InvoiceProfile,
+    add_profile_arguments,
+    generate_corpus,
+    profile_from_args,
+)
+
+SCENARIOS = ("parse", "parse_db", "watcher")
+
+
+def run_parse(corpus: List[tuple[str, bytes]]) -> dict:
+    samples = []
+    started = time.perf_counter()
+    for _, content in corpus:
+        begin = time.perf_counter()
+        parsed = parse_invoice(content)
+        parse_issue_date(parsed["header"].get("issue_date"))
+        samples.append((time.perf_counter() - begin) * 1000)
+    return summarize(samples, time.perf_counter() - started)
+
+
+def _database_available() -> Optional[str]:
+    db = SessionLocal()
+    try:
+        db.execute(text("SELECT 1"))
+        return None
+    except Exception as exc:
+        return f"sin conexión a Postgres ({type(exc).__name__})"
+    finally:
+        db.close()
+
+
+def _invoice_numbers(corpus: List[tuple[str, bytes]], prefix: str) -> List[str]:
+    return [filename[len(prefix) : -len(".xml")] for filename, _ in corpus]
+
+
+def _cleanup(numbers: List[str], paths: List[str] = ()) -> None:
+    """Borra lo que el benchmark insertó (facturas, ítems y registro).
+
+    Las facturas se buscan por número: ``source_file`` es la ruta completa y
+    cambia con cada carpeta temporal.
+    """
+
+    keys = [file_key(path) for path in paths]
+    db = SessionLocal()
+    try:
+        for start in range(0, len(numbers), 500):
+            chunk = numbers[start : start + 500]
+            invoice_ids = db.query(Invoice.id).filter(Invoice.number.in_(chunk))
+            db.query(InvoiceItem).filter(InvoiceItem.invoice_id.in_(invoice_ids)).delete(
+                synchronize_session=False
+            )
+            db.query(Invoice).filter(Invoice.number.in_(chunk)).delete(synchronize_session=False)
+        for start in range(0, len(keys), 500):
+            chunk = keys[start : start + 500]
+            db.query(IngestionLedgerEntry).filter(IngestionLedgerEntry.filename.in_(chunk)).delete(
+                synchronize_session=False
+            )
+        db.commit()
+    finally:
+        db.close()
+
+
+def _write_corpus(directory: str, corpus: List[tuple[str, bytes]]) -> List[str]:
+    paths = []
+    for filename, content in corpus:
+        path = os.path.join(directory, filename)
+        with open(path, "wb") as handle:
+            handle.write(content)
+        paths.append(path)
+    return paths
+
+
+def run_parse_db(corpus: List[tuple[str, bytes]], prefix: str) -> dict:
+    reason = _database_available()
+    if reason:
+        return {"skipped": reason}
+
+    # ``file_reader`` arranca su pool de workers al importarse.
+    from app.services.file_reader import process_file
+    from app.services.invoice_sources import InvoiceSource, register_source
+
+    numbers = _invoice_numbers(corpus, prefix)
+    _cleanup(numbers)
+    samples = []
+    with tempfile.TemporaryDirectory(prefix="ingest-bench-") as directory:
+        register_source(InvoiceSource(directory, prefix.upper(), "BENCH"))
+        paths = _write_corpus(directory, corpus)
+        started = time.perf_counter()
+        try:
+            for path in paths:
+                begin = time.perf_counter()
+                process_file(path)
+                samples.append((time.perf_counter() - begin) * 1000)
+            elapsed = time.perf_counter() - started
+        finally:
+            _cleanup(numbers, paths)
+    return summarize(samples, elapsed)
+
+
+class _RecordingSocket:
+    """WebSocket falso que anota cuándo llega cada factura."""
+
+    def __init__(self):
+        self.received: Dict[str, float] = {}
+        self.done = threading.Event()
+        self.expected = 0
+
+    async def send_text(self, text: str) -> None:
+        number = json.loads(text).get("invoice_number")
+        if number:
+            self.received.setdefault(number, time.perf_counter())
+        if self.expected and len(self.received) >= self.expected:
+            self.done.set()
+
+
+def _start_loop() -> asyncio.AbstractEventLoop:
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="bench-loop", daemon=True).start()
+    return loop
+
+
+def run_watcher(
+    corpus: List[tuple[str, bytes]],
+    prefix: str,
+    rate: float,
+    timeout: float,
+) -> dict:
+    reason = _database_available()
+    if reason:
+        return {"skipped": reason}
+
+    from app.services import file_reader
+    from app.services.invoice_sources import InvoiceSource
+    from app.services.realtime_manager import realtime_manager
+
+    numbers = _invoice_numbers(corpus, prefix)
+    _cleanup(numbers)
+
+    loop = _start_loop()
+    realtime_manager.set_loop(loop)
+    socket = _RecordingSocket()
+    socket.expected = len(corpus)
+
+    written: Dict[str, float] = {}
+    with tempfile.TemporaryDirectory(prefix="ingest-bench-") as directory:
+        source = InvoiceSource(directory, prefix.upper(), "BENCH")
+        # El monitor registra la carpeta: ``process_file`` publica en su canal.
+        monitor = file_reader.SourceMonitor(source)
+        realtime_manager.connections.setdefault(source.branch_code, []).append(socket)
+        threading.Thread(target=monitor.run, name="bench-monitor", daemon=True).start()
+        try:
+            deadline = time.monotonic() + 30
+            while monitor.observer is None and time.monotonic() < deadline:
+                time.sleep(0.1)
+            interval = 1.0 / rate if rate > 0 else 0.0
+            started = time.perf_counter()
+            for filename, content in corpus:
+                temp_path = os.path.join(directory, f".{filename}.part")
+                with open(temp_path, "wb") as handle:
+                    handle.write(content)
+                os.replace(temp_path, os.path.join(directory, filename))
+                number = filename[len(prefix) : -len(".xml")]
+                written[number] = time.perf_counter()
+                if interval:
+                    time.sleep(interval)
+
+            socket.done.wait(timeout)
+            elapsed = time.perf_counter() - started
+        finally:
+            monitor.stop_observer()
+            realtime_manager.connections[source.branch_code].remove(socket)
+            loop.call_soon_threadsafe(loop.stop)
+            _cleanup(
+                numbers, [os.path.join(directory, filename) for filename, _ in corpus]
+            )
+
+    samples = [
+        (socket.received[number] - moment) * 1000
+        for number, moment in written.items()
+        if number in socket.received
+    ]
+    result = summarize(samples, elapsed)
+    result["missing"] = len(written) - len(samples)
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--prefix", default="01001FL")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--watcher-rate", type=float, default=20.0, help="Archivos por segundo")
+    parser.add_argument("--watcher-timeout", type=float, default=120.0)
+    parser.add_argument("--output", help="Ruta del JSON de resultados")
+    parser.add_argument("--baseline", help="JSON de una ejecución anterior para comparar")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    profile: InvoiceProfile = profile_from_args(args)
+    corpus = list(generate_corpus(args.count, args.seed, profile, args.prefix))
+    size = sum(len(content) for _, content in corpus)
+    print(f"Corpus: {len(corpus)} facturas, {size / 1024:.0f} KiB, semilla {args.seed}")
+
+    selected = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    scenarios: Dict[str, dict] = {}
+    for name in selected:
+        if name == "parse":
+            scenarios[name] = run_parse(corpus)
+        elif name == "parse_db":
+            scenarios[name] = run_parse_db(corpus, args.prefix)
+        elif name == "watcher":
+            scenarios[name] = run_watcher(
+                corpus, args.prefix, args.watcher_rate, args.watcher_timeout
+            )
+        else:
+            parser.error(f"escenario desconocido: {name}")
+
+    print_table(scenarios)
+    document = build_document(
+        "ingest",
+        {
+            "count": args.count,
+            "seed": args.seed,
+            "corpus_bytes": size,
+            "profile": asdict(profile),
+            "watcher_rate": args.watcher_rate,
+        },
+        scenarios,
+    )
+    if args.output:
+        write_document(args.output, document)
+        print(f"Resultados guardados en {args.output}")
+    if args.baseline:
+        print_comparison(document, load_document(args.baseline))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+"""Prueba de carga del canal realtime (``/ws/{sede}``).
+
+Levanta en otro proceso un servidor uvicorn con el router realtime real y
+``RealtimeManager``, alimentado por una fuente de facturas simulada en lugar
+del monitor de archivos (no necesita Postgres ni la carpeta compartida).
+Luego abre N clientes WebSocket repartidos entre sedes, algunos lentos a
+propósito, y mide:
+
+* latencia de entrega por mensaje (clientes rápidos y lentos por separado);
+* duración de la reproducción del historial del día al conectar;
+* duración de cada ``broadcast`` en el servidor;
+* memoria residente del servidor antes y después de la carga.
+
+Uso::
+
+    cd backend
+    python -m benchmarks.realtime_load --clients 200 --slow 20 --rate 50 --duration 20
+    python -m benchmarks.realtime_load --output benchmarks/out/realtime.json --baseline anterior.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import urllib.request
+from typing import List, Optional
+
+from benchmarks.results import (
+    build_document,
+    load_document,
+    print_comparison,
+    print_table,
+    summarize,
+    write_document,
+)
+
+
+# ===============================
+#   SERVIDOR
+# ===============================
+def _resident_memory() -> Optional[int]:
+    """Memoria residente del proceso en bytes (``None`` si no se puede leer)."""
+
+    try:
+        with open("/proc/self/status", "r", encoding="ascii") as handle:
+            for line in handle:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except (ImportError, AttributeError):
+        return None
+
+
+def build_app(branches: List[str], history: int):
+    from fastapi import FastAPI
+
+    from app.api import routes_realtime
+    from app.services.realtime_events import InvoiceEvent
+    from app.services.realtime_manager import realtime_manager
+
+    app = FastAPI(title="Visor realtime load test")
+    app.include_router(routes_realtime.router)
+    state = {"broadcast_ms": [], "producing": False, "sent": 0}
+
+    def _event(branch: str, number: str, extra: dict) -> InvoiceEvent:
+        return InvoiceEvent.create(
+            branch,
+            invoice_number=number,
+            items=random.randint(1, 30),
+            total=random.uniform(5_000, 400_000),
+            file=f"{number}.xml",
+            extra=extra,
+        )
+
+    @app.on_event("startup")
+    async def seed_history():
+        realtime_manager.set_loop(asyncio.get_running_loop())
+        for branch in branches:
+            for index in range(history):
+                await realtime_manager.broadcast(
+                    branch, _event(branch, f"H{branch}{index:06d}", {"bench_history": True})
+                )
+
+    async def produce(rate: float, duration: float):
+        state["producing"] = True
+        total = int(rate * duration)
+        started = time.perf_counter()
+        try:
+            for index in range(total):
+                # Ritmo por reloj absoluto: un broadcast lento no reduce la tasa pedida.
+                delay = started + index / rate - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                branch = branches[index % len(branches)]
+                event = _event(branch, f"L{index:08d}", {"bench_sent_at": time.time()})
+                begin = time.perf_counter()
+                await realtime_manager.broadcast(branch, event)
+                state["broadcast_ms"].append((time.perf_counter() - begin) * 1000)
+                state["sent"] += 1
+        finally:
+            state["producing"] = False
+
+    @app.post("/bench/produce")
+    async def start_producing(rate: float, duration: float):
+        asyncio.get_running_loop().create_task(produce(rate, duration))
+        return {"scheduled": int(rate * duration)}
+
+    @app.get("/bench/stats")
+    def stats():
+        return {
+            "rss_bytes": _resident_memory(),
+            "connections": sum(len(sockets) for sockets in realtime_manager.connections.values()),
+            "history": sum(len(events) for events in realtime_manager.daily_messages.values()),
+            "producing": state["producing"],
+            "sent": state["sent"],
+            "broadcast_ms": state["broadcast_ms"],
+        }
+
+    return app
+
+
+def serve(port: int, branches: List[str], history: int) -> None:
+    import uvicorn
+
+    uvicorn.run(build_app(branches, history), host="127.0.0.1", port=port, log_level="warning")
+
+
+# ===============================
+#   CLIENTES
+# ===============================
+class ClientResult:
+    __slots__ = ("slow", "latencies_ms", "replay_ms", "history_received", "error")
+
+    def __init__(self, slow: bool):
+        self.slow = slow
+        self.latencies_ms: List[float] = []
+        self.replay_ms: Optional[float] = None
+        self.history_received = 0
+        self.error: Optional[str] = None
+
+
+async def run_client(
+    url: str,
+    expected_history: int,
+    slow_delay: float,
+    result: ClientResult,
+    stop: asyncio.Event,
+) -> None:
+    import websockets
+
+    started = time.perf_counter()
+    try:
+        async with websockets.connect(url, max_size=None) as socket:
+            if expected_history == 0:
+                result.replay_ms = 0.0
+            while not stop.is_set():
+                try:
+                    text = await asyncio.wait_for(socket.recv(), timeout=0.5)
+                except asyncio.TimeoutError:
+                    continue
+                received = time.time()
+                payload = json.loads(text)
+                if payload.get("bench_history"):
+                    result.history_received += 1
+                    if result.history_received == expected_history:
+                        result.replay_ms = (time.perf_counter() - started) * 1000
+                elif "bench_sent_at" in payload:
+                    result.latencies_ms.append((received - payload["bench_sent_at"]) * 1000)
+                if result.slow:
+                    await asyncio.sleep(slow_delay)
+    except Exception as exc:
+        result.error = f"{type(exc).__name__}: {exc}"
+
+
+def _http(method: str, url: str) -> dict:
+    request = urllib.request.Request(url, method=method)
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.loads(response.read())
+
+
+def _wait_ready(base_url: str, timeout: float = 30.0) -> dict:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return _http("GET", f"{base_url}/bench/stats")
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.2)
+
+
+async def drive(args: argparse.Namespace, base_url: str, branches: List[str]) -> dict:
+    before = _wait_ready(base_url)
+    stop = asyncio.Event()
+    results: List[ClientResult] = []
+    tasks = []
+    ws_base = base_url.replace("http://", "ws://")
+    for index in range(args.clients):
+        result = ClientResult(slow=index < args.slow)
+        results.append(result)
+        url = f"{ws_base}/ws/{branches[index % len(branches)]}"
+        tasks.append(
+            asyncio.create_task(run_client(url, args.history, args.slow_delay, result, stop))
+        )
+        if (index + 1) % args.connect_batch == 0:
+            await asyncio.sleep(0.05)
+
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        stats = await asyncio.to_thread(_http, "GET", f"{base_url}/bench/stats")
+        if stats["connections"] >= args.clients - sum(1 for r in results if r.error):
+            break
+        await asyncio.sleep(0.2)
+    connected = await asyncio.to_thread(_http, "GET", f"{base_url}/bench/stats")
+
+    await asyncio.to_thread(
+        _http, "POST", f"{base_url}/bench/produce?rate={args.rate}&duration={args.duration}"
+    )
+    started = time.perf_counter()
+    await asyncio.sleep(args.duration)
+    while (await asyncio.to_thread(_http, "GET", f"{base_url}/bench/stats"))["producing"]:
+        await asyncio.sleep(0.2)
+    await asyncio.sleep(args.drain)
+    elapsed = time.perf_counter() - started
+    after = await asyncio.to_thread(_http, "GET", f"{base_url}/bench/stats")
+
+    stop.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    fast = [r for r in results if not r.slow]
+    slow = [r for r in results if r.slow]
+    per_branch = after["sent"] / len(branches) if branches else 0
+    scenarios = {
+        "delivery_fast": summarize(
+            [v for r in fast for v in r.latencies_ms], elapsed, unit="messages"
+        ),
+        "delivery_slow": summarize(
+            [v for r in slow for v in r.latencies_ms], elapsed, unit="messages"
+        ),
+        "history_replay": summarize(
+            [r.replay_ms for r in results if r.replay_ms is not None], elapsed, unit="messages"
+        ),
+        "server_broadcast": summarize(after["broadcast_ms"], elapsed, unit="messages"),
+    }
+    for name, group in (("delivery_fast", fast), ("delivery_slow", slow)):
+        expected = per_branch * len(group)
+        delivered = sum(len(r.latencies_ms) for r in group)
+        scenarios[name]["delivered_ratio"] = round(delivered / expected, 4) if expected else None
+    scenarios["history_replay"]["incomplete"] = sum(1 for r in results if r.replay_ms is None)
+
+    return {
+        "scenarios": scenarios,
+        "memory": {
+            "rss_idle_bytes": before["rss_bytes"],
+            "rss_connected_bytes": connected["rss_bytes"],
+            "rss_after_bytes": after["rss_bytes"],
+        },
+        "errors": sorted({r.error for r in results if r.error}),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--slow", type=int, default=10, help="Clientes lentos")
+    parser.add_argument("--slow-delay", type=float, default=0.25, help="Segundos por mensaje")
+    parser.add_argument("--branches", default="FLO,CEN,NOR")
+    parser.add_argument("--history", type=int, default=500, help="Facturas en el historial por sede")
+    parser.add_argument("--rate", type=float, default=20.0, help="Facturas por segundo (todas las sedes)")
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--drain", type=float, default=2.0, help="Espera final para entregas pendientes")
+    parser.add_argument("--connect-batch", type=int, default=50)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--output")
+    parser.add_argument("--baseline")
+    args = parser.parse_args()
+
+    branches = [code.strip().upper() for code in args.branches.split(",") if code.strip()]
+    if args.serve:
+        serve(args.port, branches, args.history)
+        return
+
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "benchmarks.realtime_load",
+            "--serve",
+            "--port",
+            str(args.port),
+            "--branches",
+            ",".join(branches),
+            "--history",
+            str(args.history),
+        ],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        # Cada conexión registra una línea INFO; no interesa durante la carga.
+        env={**os.environ, "LOG_LEVEL": os.environ.get("LOG_LEVEL", "WARNING")},
+    )
+    try:
+        report = asyncio.run(drive(args, f"http://127.0.0.1:{args.port}", branches))
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+    print_table(report["scenarios"], unit="messages")
+    memory = report["memory"]
+    if memory["rss_idle_bytes"]:
+        print(
+            "Memoria del servidor: "
+            + "  ".join(f"{key[4:-6]}={value / 2**20:.1f} MiB" for key, value in memory.items() if value)
+        )
+    for error in report["errors"]:
+        print(f"⚠️ {error}")
+
+    document = build_document(
+        "realtime_load",
+        {
+            "clients": args.clients,
+            "slow": args.slow,
+            "slow_delay": args.slow_delay,
+            "branches": branches,
+            "history": args.history,
+            "rate": args.rate,
+            "duration": args.duration,
+        },
+        report["scenarios"],
+    )
+    document["memory"] = memory
+    document["errors"] = report["errors"]
+    if args.output:
+        write_document(args.output, document)
+        print(f"Resultados guardados en {args.output}")
+    if args.baseline:
+        print_comparison(document, load_document(args.baseline))
+
+
+if __name__ == "__main__":
+    main()
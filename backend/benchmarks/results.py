@@ -0,0 +1,114 @@
+"""Estadísticas y resultados en JSON compartidos por los benchmarks.
+
+Cada ejecución guarda un documento con el commit, la versión de Python y un
+resumen por escenario (p50/p95/p99 en milisegundos y archivos o peticiones
+por segundo) para poder comparar dos commits con ``--baseline``.
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import os
+import platform
+import subprocess
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Sequence
+
+
+def percentile(sorted_samples: Sequence[float], fraction: float) -> float:
+    """Percentil por rango más cercano sobre muestras ya ordenadas."""
+
+    if not sorted_samples:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(sorted_samples)))
+    return sorted_samples[min(rank, len(sorted_samples)) - 1]
+
+
+def summarize(samples_ms: Iterable[float], elapsed: float, unit: str = "files") -> dict:
+    ordered: List[float] = sorted(samples_ms)
+    count = len(ordered)
+    return {
+        "count": count,
+        "p50_ms": round(percentile(ordered, 0.50), 3),
+        "p95_ms": round(percentile(ordered, 0.95), 3),
+        "p99_ms": round(percentile(ordered, 0.99), 3),
+        "max_ms": round(ordered[-1], 3) if ordered else 0.0,
+        "mean_ms": round(sum(ordered) / count, 3) if count else 0.0,
+        "elapsed_s": round(elapsed, 3),
+        f"{unit}_per_sec": round(count / elapsed, 2) if elapsed > 0 else 0.0,
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def build_document(benchmark: str, parameters: dict, scenarios: Dict[str, dict]) -> dict:
+    return {
+        "benchmark": benchmark,
+        "commit": git_commit(),
+        "created_at": datetime.now(tz=timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "parameters": parameters,
+        "scenarios": scenarios,
+    }
+
+
+def write_document(path: str, document: dict) -> None:
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as handle:
+        json.dump(document, handle, ensure_ascii=False, indent=2)
+        handle.write("\n")
+
+
+def load_document(path: str) -> dict:
+    with open(path, "r", encoding="utf-8") as handle:
+        return json.load(handle)
+
+
+def compare(current: dict, baseline: dict, metric: str = "p95_ms") -> Dict[str, Optional[float]]:
+    """Cambio relativo de ``metric`` por escenario (``0.10`` = 10 % peor)."""
+
+    changes: Dict[str, Optional[float]] = {}
+    for name, result in current.get("scenarios", {}).items():
+        previous = baseline.get("scenarios", {}).get(name) or {}
+        before, after = previous.get(metric), result.get(metric)
+        if not before or after is None:
+            changes[name] = None
+            continue
+        changes[name] = (after - before) / before
+    return changes
+
+
+def print_table(scenarios: Dict[str, dict], unit: str = "files") -> None:
+    rate_key = f"{unit}_per_sec"
+    for name, result in scenarios.items():
+        if "skipped" in result:
+            print(f"{name:<18} omitido: {result['skipped']}")
+            continue
+        print(
+            f"{name:<18} n={result['count']:<6} p50={result['p50_ms']:9.3f} ms  "
+            f"p95={result['p95_ms']:9.3f} ms  p99={result['p99_ms']:9.3f} ms  "
+            f"{result[rate_key]:9.1f} {unit}/s"
+        )
+
+
+def print_comparison(current: dict, baseline: dict, metric: str = "p95_ms") -> None:
+    print(f"Comparación de {metric} contra {baseline.get('commit') or 'la línea base'}:")
+    for name, change in compare(current, baseline, metric).items():
+        if change is None:
+            print(f"  {name:<18} sin dato previo")
+        else:
+            print(f"  {name:<18} {change * 100:+7.1f} %")
@@ -0,0 +1,190 @@
+"""Llena un Postgres local con N días × M sedes × K facturas para los benchmarks.
+
+Las sedes sembradas se llaman ``BENCH01``, ``BENCH02``... y todas sus
+facturas llevan ``source_file`` con prefijo ``seed-``, así ``--drop`` las
+borra sin tocar datos reales. Todos los días quedan en ``invoices`` (sin
+pasar por el cierre diario), que es el volumen que recorren la ventana del
+pronóstico y los conteos de ítems; ``benchmarks.analytics_api`` evita el
+cierre mientras mide.
+
+Uso::
+
+    cd backend
+    python -m benchmarks.seed_analytics --days 90 --branches 8 --invoices 1200
+    python -m benchmarks.seed_analytics --drop
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import List
+
+from sqlalchemy import text
+
+from app.database import SessionLocal
+from app.models.branch import Branch
+from app.models.daily_summary import DailySalesSummary
+from app.models.invoice import Invoice
+from app.models.invoice_item import InvoiceItem
+from app.services.db_writer import INVOICE_COPY_COLUMNS, ITEM_COPY_COLUMNS, copy_rows
+from app.services.partitions import ensure_partitions
+from app.utils.timezone import day_clock
+
+BRANCH_PREFIX = "BENCH"
+SOURCE_PREFIX = "seed-"
+
+# Horario del PDV: 07:00 a 21:00, con picos al mediodía y en la tarde.
+_OPEN_SECONDS = 7 * 3600
+_CLOSE_SECONDS = 21 * 3600
+_PEAKS = (12.5 * 3600, 18.5 * 3600)
+
+
+def _ensure_branches(db, count: int) -> List[Branch]:
+    branches = []
+    for index in range(1, count + 1):
+        code = f"{BRANCH_PREFIX}{index:02d}"
+        branch = db.query(Branch).filter(Branch.code == code).one_or_none()
+        if branch is None:
+            branch = Branch(name=f"Sede benchmark {index:02d}", code=code)
+            db.add(branch)
+            db.flush()
+        branches.append(branch)
+    db.commit()
+    return branches
+
+
+def _second_of_day(rng: random.Random) -> float:
+    second = rng.gauss(rng.choice(_PEAKS), 2.5 * 3600)
+    return min(max(second, _OPEN_SECONDS), _CLOSE_SECONDS - 1)
+
+
+def _day_rows(rng: random.Random, day_start: datetime, branch: Branch, count: int, items: float, limit):
+    invoices, invoice_items = [], []
+    for _ in range(count):
+        moment = day_start + timedelta(seconds=_second_of_day(rng))
+        if limit is not None and moment >= limit:
+            continue
+        invoice_id = uuid.uuid4()
+        subtotal = 0.0
+        for line_number in range(1, max(1, int(rng.expovariate(1 / items))) + 1):
+            quantity = rng.randint(1, 6)
+            unit_price = round(rng.uniform(900, 60_000), 2)
+            line_total = round(quantity * unit_price, 2)
+            subtotal += line_total
+            invoice_items.append(
+                {
+                    "id": uuid.uuid4(),
+                    "invoice_id": invoice_id,
+                    "line_number": line_number,
+                    "product_code": f"SKU-{rng.randint(1, 5000):04d}",
+                    "description": "Producto benchmark",
+                    "quantity": quantity,
+                    "unit_price": unit_price,
+                    "subtotal": line_total,
+                    "created_at": moment,
+                }
+            )
+        vat = round(subtotal * 0.19, 2)
+        invoices.append(
+            {
+                "id": invoice_id,
+                "number": f"S{branch.code}{invoice_id.hex[:12].upper()}",
+                "branch_id": branch.id,
+                "issued_at": None,
+                "invoice_date": moment,
+                "subtotal": round(subtotal, 2),
+                "vat": vat,
+                "discount": 0,
+                "total": round(subtotal + vat, 2),
+                "source_file": f"{SOURCE_PREFIX}{invoice_id.hex}.xml",
+                "created_at": moment,
+            }
+        )
+    return invoices, invoice_items
+
+
+def drop_seeded() -> int:
+    db = SessionLocal()
+    try:
+        seeded = db.query(Invoice.id).filter(Invoice.source_file.like(f"{SOURCE_PREFIX}%"))
+        db.query(InvoiceItem).filter(InvoiceItem.invoice_id.in_(seeded)).delete(
+            synchronize_session=False
+        )
+        removed = db.query(Invoice).filter(Invoice.source_file.like(f"{SOURCE_PREFIX}%")).delete(
+            synchronize_session=False
+        )
+        branch_ids = db.query(Branch.id).filter(Branch.code.like(f"{BRANCH_PREFIX}%"))
+        db.query(DailySalesSummary).filter(DailySalesSummary.branch_id.in_(branch_ids)).delete(
+            synchronize_session=False
+        )
+        db.query(Branch).filter(Branch.code.like(f"{BRANCH_PREFIX}%")).delete(
+            synchronize_session=False
+        )
+        db.commit()
+        return removed
+    finally:
+        db.close()
+
+
+def seed(days: int, branch_count: int, invoices_per_day: int, items_per_invoice: float, seed_value: int) -> dict:
+    rng = random.Random(seed_value)
+    now = day_clock.now()
+    today = day_clock.bounds(now)
+    totals = {"invoices": 0, "items": 0}
+
+    db = SessionLocal()
+    try:
+        branches = _ensure_branches(db, branch_count)
+        ensure_partitions(db, (today.day - timedelta(days=offset) for offset in range(days + 1)))
+        # ``days`` días completos hacia atrás más lo transcurrido de hoy.
+        for offset in range(days, -1, -1):
+            day_start = today.start - timedelta(days=offset)
+            limit = now if offset == 0 else None
+            for branch in branches:
+                invoices, items = _day_rows(
+                    rng, day_start, branch, invoices_per_day, items_per_invoice, limit
+                )
+                copy_rows(db, "invoices", INVOICE_COPY_COLUMNS, invoices)
+                copy_rows(db, "invoice_items", ITEM_COPY_COLUMNS, items)
+                totals["invoices"] += len(invoices)
+                totals["items"] += len(items)
+            db.commit()
+            print(f"📅 {day_start.date()} sembrado ({totals['invoices']} facturas acumuladas)")
+
+        db.execute(text("ANALYZE invoices"))
+        db.execute(text("ANALYZE invoice_items"))
+        db.commit()
+    finally:
+        db.close()
+    return totals
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, default=30, help="Días completos antes de hoy")
+    parser.add_argument("--branches", type=int, default=4)
+    parser.add_argument("--invoices", type=int, default=800, help="Facturas por sede y día")
+    parser.add_argument("--items", type=float, default=6.0, help="Ítems promedio por factura")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--drop", action="store_true", help="Borra los datos sembrados y termina")
+    args = parser.parse_args()
+
+    if args.drop:
+        print(f"🧹 {drop_seeded()} facturas sembradas eliminadas")
+        return
+
+    started = time.perf_counter()
+    totals = seed(args.days, args.branches, args.invoices, args.items, args.seed)
+    elapsed = time.perf_counter() - started
+    print(
+        f"✅ {totals['invoices']} facturas y {totals['items']} ítems en {elapsed:.1f} s "
+        f"({totals['invoices'] / elapsed:.0f} facturas/s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
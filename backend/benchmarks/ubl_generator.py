@@ -0,0 +1,214 @@
+"""Generador determinista de facturas UBL 2.1 para los benchmarks de ingesta.
+
+Con la misma semilla produce exactamente los mismos bytes, así los
+resultados de distintos commits se comparan sobre el mismo corpus. El
+número de líneas sigue una distribución log-normal (pocas facturas muy
+largas, como en un PDV real) y cada línea lleva uno o más
+``TaxSubtotal``.
+
+Uso::
+
+    cd backend
+    python -m benchmarks.ubl_generator /tmp/corpus --count 2000 --seed 7
+"""
+
+from __future__ import annotations
+
+import argparse
+import math
+import os
+import random
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Iterator, Tuple
+from xml.sax.saxutils import escape
+
+TAX_RATES = (Decimal("19"), Decimal("5"), Decimal("0"))
+
+_PRODUCTS = (
+    "Leche entera 1L",
+    "Pan tajado",
+    "Arroz 500g",
+    "Huevos x30",
+    "Café molido 250g",
+    "Aceite vegetal 1L",
+    "Azúcar 1kg",
+    "Jabón de barra",
+    "Gaseosa 1.5L",
+    "Queso campesino",
+)
+
+_CENT = Decimal("0.01")
+
+
+@dataclass(frozen=True)
+class InvoiceProfile:
+    """Forma del corpus generado."""
+
+    lines_median: float = 6.0
+    lines_sigma: float = 0.9
+    max_lines: int = 400
+    tax_subtotals: int = 1
+    description_padding: int = 0
+
+    def line_count(self, rng: random.Random) -> int:
+        count = int(round(rng.lognormvariate(math.log(self.lines_median), self.lines_sigma)))
+        return max(1, min(count, self.max_lines))
+
+
+def _money(value: Decimal) -> str:
+    return str(value.quantize(_CENT, rounding=ROUND_HALF_UP))
+
+
+def generate_invoice(
+    rng: random.Random,
+    number: str,
+    issued_at: datetime,
+    profile: InvoiceProfile,
+) -> bytes:
+    lines = []
+    subtotal = Decimal("0")
+    tax_total = Decimal("0")
+
+    for line_number in range(1, profile.line_count(rng) + 1):
+        quantity = Decimal(rng.randint(1, 12))
+        price = Decimal(rng.randint(800, 95_000))
+        amount = quantity * price
+        subtotal += amount
+
+        taxes = []
+        for index in range(max(1, profile.tax_subtotals)):
+            rate = TAX_RATES[(line_number + index) % len(TAX_RATES)] if index else rng.choice(TAX_RATES)
+            tax = (amount * rate / 100).quantize(_CENT, rounding=ROUND_HALF_UP)
+            tax_total += tax
+            taxes.append(
+                "      <cac:TaxSubtotal>\n"
+                f"        <cbc:TaxAmount currencyID=\"COP\">{_money(tax)}</cbc:TaxAmount>\n"
+                "        <cac:TaxCategory>\n"
+                f"          <cbc:Percent>{rate}</cbc:Percent>\n"
+                "        </cac:TaxCategory>\n"
+                "      </cac:TaxSubtotal>\n"
+            )
+
+        description = rng.choice(_PRODUCTS)
+        if profile.description_padding:
+            description = f"{description} {'x' * profile.description_padding}"
+        lines.append(
+            "  <cac:InvoiceLine>\n"
+            f"    <cbc:ID>{line_number}</cbc:ID>\n"
+            f"    <cbc:InvoicedQuantity unitCode=\"EA\">{quantity}</cbc:InvoicedQuantity>\n"
+            f"    <cbc:LineExtensionAmount currencyID=\"COP\">{_money(amount)}</cbc:LineExtensionAmount>\n"
+            "    <cac:TaxTotal>\n"
+            f"{''.join(taxes)}"
+            "    </cac:TaxTotal>\n"
+            "    <cac:Item>\n"
+            f"      <cbc:Description>{escape(description)}</cbc:Description>\n"
+            "      <cac:StandardItemIdentification>\n"
+            f"        <cbc:ID>SKU-{rng.randint(1, 9999):04d}</cbc:ID>\n"
+            "      </cac:StandardItemIdentification>\n"
+            "    </cac:Item>\n"
+            "    <cac:Price>\n"
+            f"      <cbc:PriceAmount currencyID=\"COP\">{_money(price)}</cbc:PriceAmount>\n"
+            "    </cac:Price>\n"
+            "  </cac:InvoiceLine>\n"
+        )
+
+    document = (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<Invoice xmlns="urn:oasis:names:specification:ubl:schema:xsd:Invoice-2"\n'
+        '         xmlns:cac="urn:oasis:names:specification:ubl:schema:xsd:CommonAggregateComponents-2"\n'
+        '         xmlns:cbc="urn:oasis:names:specification:ubl:schema:xsd:CommonBasicComponents-2">\n'
+        "  <cbc:UBLVersionID>UBL 2.1</cbc:UBLVersionID>\n"
+        f"  <cbc:ID>{number}</cbc:ID>\n"
+        f"  <cbc:IssueDate>{issued_at:%Y-%m-%d}</cbc:IssueDate>\n"
+        f"  <cbc:IssueTime>{issued_at:%H:%M:%S}</cbc:IssueTime>\n"
+        "  <cbc:DocumentCurrencyCode>COP</cbc:DocumentCurrencyCode>\n"
+        "  <cac:AccountingSupplierParty>\n"
+        "    <cac:Party>\n"
+        "      <cac:PartyName><cbc:Name>Supermercado Benchmark S.A.S.</cbc:Name></cac:PartyName>\n"
+        "    </cac:Party>\n"
+        "  </cac:AccountingSupplierParty>\n"
+        "  <cac:AccountingCustomerParty>\n"
+        "    <cac:Party>\n"
+        f"      <cac:PartyIdentification><cbc:ID>{rng.randint(10_000_000, 99_999_999)}</cbc:ID></cac:PartyIdentification>\n"
+        "      <cac:PartyName><cbc:Name>Consumidor final</cbc:Name></cac:PartyName>\n"
+        "    </cac:Party>\n"
+        "  </cac:AccountingCustomerParty>\n"
+        "  <cac:TaxTotal>\n"
+        f"    <cbc:TaxAmount currencyID=\"COP\">{_money(tax_total)}</cbc:TaxAmount>\n"
+        "  </cac:TaxTotal>\n"
+        "  <cac:LegalMonetaryTotal>\n"
+        f"    <cbc:LineExtensionAmount currencyID=\"COP\">{_money(subtotal)}</cbc:LineExtensionAmount>\n"
+        f"    <cbc:PayableAmount currencyID=\"COP\">{_money(subtotal + tax_total)}</cbc:PayableAmount>\n"
+        "  </cac:LegalMonetaryTotal>\n"
+        f"{''.join(lines)}"
+        "</Invoice>\n"
+    )
+    return document.encode("utf-8")
+
+
+def generate_corpus(
+    count: int,
+    seed: int = 7,
+    profile: InvoiceProfile = InvoiceProfile(),
+    prefix: str = "01001FL",
+    start: datetime = datetime(2024, 5, 10, 7, 0),
+) -> Iterator[Tuple[str, bytes]]:
+    """``(nombre de archivo, contenido)`` para ``count`` facturas."""
+
+    rng = random.Random(seed)
+    issued_at = start
+    for index in range(count):
+        issued_at += timedelta(seconds=rng.randint(5, 90))
+        number = f"BEN{seed:03d}{index:07d}"
+        yield f"{prefix}{number}.xml", generate_invoice(rng, number, issued_at, profile)
+
+
+def write_corpus(directory: str, count: int, seed: int = 7, **kwargs) -> list[str]:
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for filename, content in generate_corpus(count, seed, **kwargs):
+        path = os.path.join(directory, filename)
+        with open(path, "wb") as handle:
+            handle.write(content)
+        paths.append(path)
+    return paths
+
+
+def add_profile_arguments(parser: argparse.ArgumentParser) -> None:
+    defaults = InvoiceProfile()
+    parser.add_argument("--lines-median", type=float, default=defaults.lines_median)
+    parser.add_argument("--lines-sigma", type=float, default=defaults.lines_sigma)
+    parser.add_argument("--max-lines", type=int, default=defaults.max_lines)
+    parser.add_argument("--tax-subtotals", type=int, default=defaults.tax_subtotals)
+    parser.add_argument("--description-padding", type=int, default=defaults.description_padding)
+
+
+def profile_from_args(args: argparse.Namespace) -> InvoiceProfile:
+    return InvoiceProfile(
+        lines_median=args.lines_median,
+        lines_sigma=args.lines_sigma,
+        max_lines=args.max_lines,
+        tax_subtotals=args.tax_subtotals,
+        description_padding=args.description_padding,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("directory")
+    parser.add_argument("--count", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--prefix", default="01001FL")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    profile = profile_from_args(args)
+    paths = write_corpus(args.directory, args.count, args.seed, profile=profile, prefix=args.prefix)
+    size = sum(os.path.getsize(path) for path in paths)
+    print(f"{len(paths)} facturas en {args.directory} ({size / 1024:.0f} KiB) | {asdict(profile)}")
+
+
+if __name__ == "__main__":
+    main()
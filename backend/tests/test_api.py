@@ -0,0 +1,403 @@
+import os
+import sys
+from collections import namedtuple
+from datetime import date, datetime
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.api.routes_invoices import _build_forecast_response, _summarise_forecast_history
+from shared.forecasting import fit_linear_model, fit_linear_models
+
+
+HistoryRow = namedtuple(
+    "HistoryRow",
+    ["day", "invoice_count", "total_sales", "first_chunk_total", "partial_total"],
+)
+
+
+def _history_rows():
+    rows = []
+    for offset, first_chunk in enumerate([900.0, 1100.0, 1000.0, 1200.0, 950.0]):
+        rows.append(
+            HistoryRow(
+                day=datetime(2024, 5, 10 - offset),
+                invoice_count=120,
+                total_sales=first_chunk * 4 + offset * 10,
+                first_chunk_total=first_chunk,
+                partial_total=first_chunk * 2,
+            )
+        )
+    return rows
+
+
+def test_summarise_forecast_history_builds_regression_samples():
+    history = _summarise_forecast_history(_history_rows(), date(2024, 5, 10))
+
+    assert [entry["date"] for entry in history["entries"]] == [
+        "2024-05-06",
+        "2024-05-07",
+        "2024-05-08",
+        "2024-05-09",
+        "2024-05-10",
+    ]
+    assert len(history["regression_samples"]) == 4
+    assert history["yesterday_first_chunk_total"] == pytest.approx(900.0)
+
+
+def test_batched_forecast_matches_single_branch_forecast():
+    yesterday = date(2024, 5, 10)
+    history = _summarise_forecast_history(_history_rows(), yesterday)
+    today = {
+        "first_chunk_total": 1000.0,
+        "first_chunk_invoices": 100,
+        "current_total": 2500.0,
+        "current_net_total": 2100.0,
+        "invoice_count": 180,
+    }
+    previous = {"total": 3600.0, "net_total": 3000.0, "invoice_count": 120}
+
+    single = _build_forecast_response(
+        "FLO", history, today, previous, yesterday,
+        fit_linear_model(history["regression_samples"]),
+    )
+    batched = _build_forecast_response(
+        "FLO", history, today, previous, yesterday,
+        fit_linear_models({"FLO": history["regression_samples"]})["FLO"],
+    )
+
+    assert single["forecast"]["method"] == "linear_regression"
+    assert batched["forecast"]["total"] == pytest.approx(single["forecast"]["total"])
+
+
+def _sqlite_invoices_app(monkeypatch):
+    import uuid
+    from datetime import timedelta
+
+    from fastapi import FastAPI
+    from sqlalchemy import create_engine, event
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+
+    from app.api import routes_invoices
+    from app.database import ThreadpoolSession, get_async_db
+    from app.models.branch import Branch
+    from app.models.daily_summary import DailySalesSummary
+    from app.models.invoice import Invoice
+    from app.models.invoice_item import InvoiceItem
+    from app.services.branch_registry import BranchRegistry
+    from app.services.response_cache import response_cache
+    from app.utils.timezone import day_clock
+
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+
+    @event.listens_for(engine, "connect")
+    def _date_trunc(dbapi_connection, _record):
+        dbapi_connection.create_function("date_trunc", 2, lambda _unit, value: value and value[:10])
+
+    for model in (Branch, Invoice, InvoiceItem, DailySalesSummary):
+        model.__table__.create(bind=engine)
+    Session = sessionmaker(bind=engine)
+
+    centro = uuid.uuid4()
+    today_start = day_clock.bounds().start
+    with Session() as db:
+        db.add(Branch(id=centro, name="Centro", code="CEN"))
+        for offset, branch_id in enumerate([None, centro, centro]):
+            db.add(
+                Invoice(
+                    number=f"F{offset}",
+                    branch_id=branch_id,
+                    total=100 + offset,
+                    subtotal=80,
+                    created_at=today_start + timedelta(minutes=offset + 1),
+                )
+            )
+        db.commit()
+
+    monkeypatch.setattr(routes_invoices, "branch_registry", BranchRegistry(3600, session_factory=Session))
+
+    async def override_db():
+        yield ThreadpoolSession(Session())
+
+    app = FastAPI()
+    app.include_router(routes_invoices.router, prefix="/invoices")
+    app.dependency_overrides[get_async_db] = override_db
+    app.state.session_factory = Session
+    response_cache.clear()
+    return app
+
+
+def test_today_route_serves_cached_body_until_data_version_changes(monkeypatch):
+    from datetime import timedelta
+
+    from fastapi.testclient import TestClient
+
+    from app.models.invoice import Invoice
+    from app.services.response_cache import bump_data_version, response_cache
+    from app.utils.timezone import day_clock
+
+    app = _sqlite_invoices_app(monkeypatch)
+    client = TestClient(app)
+
+    first = client.get("/invoices/today")
+    hits_before = response_cache.hits
+    with app.state.session_factory() as db:
+        db.add(Invoice(number="F9", total=50, subtotal=40,
+                       created_at=day_clock.bounds().start + timedelta(minutes=30)))
+        db.commit()
+    second = client.get("/invoices/today")
+
+    assert first.status_code == 200
+    assert second.content == first.content
+    assert response_cache.hits == hits_before + 1
+
+    bump_data_version()
+    third = client.get("/invoices/today")
+    assert third.content != first.content
+    assert third.headers["etag"] != first.headers["etag"]
+
+
+def test_today_route_returns_304_for_matching_etag(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    client = TestClient(_sqlite_invoices_app(monkeypatch))
+
+    first = client.get("/invoices/today")
+    revalidated = client.get("/invoices/today", headers={"If-None-Match": first.headers["etag"]})
+
+    assert first.status_code == 200
+    assert revalidated.status_code == 304
+    assert revalidated.content == b""
+    assert revalidated.headers["etag"] == first.headers["etag"]
+
+
+def test_server_timing_header_counts_queries_and_phases():
+    from fastapi import FastAPI, Request
+    from fastapi.testclient import TestClient
+    from sqlalchemy import create_engine, text
+
+    from app.services.response_cache import cached_json_response, response_cache
+    from app.utils.request_timing import ServerTimingMiddleware, instrument_engine, normalize_sql
+
+    engine = create_engine("sqlite://")
+    instrument_engine(engine)
+    app = FastAPI()
+    app.add_middleware(ServerTimingMiddleware)
+
+    @app.get("/report")
+    async def report(request: Request):
+        async def compute():
+            with engine.connect() as conn:
+                values = [conn.execute(text("SELECT :n"), {"n": n}).scalar() for n in (1, 2)]
+            return {"values": values}
+
+        return await cached_json_response(request, "report", {}, 0, compute)
+
+    response_cache.clear()
+    response = TestClient(app).get("/report")
+
+    header = response.headers["server-timing"]
+    assert response.json() == {"values": [1, 2]}
+    assert 'desc="2 consultas"' in header
+    assert "orm;dur=" in header and "encode;dur=" in header and "total;dur=" in header
+
+    assert normalize_sql("SELECT *\n  FROM t WHERE id IN (%(a)s, %(b)s) AND x = 'y' LIMIT 10") == (
+        "SELECT * FROM t WHERE id IN (?...) AND x = ? LIMIT ?"
+    )
+
+
+def test_metrics_registry_renders_prometheus_histograms(monkeypatch):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from app.api import routes_metrics
+    from app.services.metrics import MetricsRegistry
+
+    registry = MetricsRegistry()
+    stages = registry.histogram("test_stage_seconds", "Etapas.", ("stage",), buckets=(0.1, 1.0))
+    outcomes = registry.counter("test_files_total", "Archivos.", ("outcome",))
+    stages.observe(0.05, stage="read")
+    stages.observe(0.5, stage="read")
+    stages.observe(1.0, stage="read")
+    outcomes.inc(outcome="stored")
+    outcomes.inc(2, outcome="stored")
+
+    text = registry.render()
+    assert "# TYPE test_stage_seconds histogram" in text
+    assert 'test_stage_seconds_bucket{stage="read",le="0.1"} 1' in text
+    assert 'test_stage_seconds_bucket{stage="read",le="1"} 3' in text
+    assert 'test_stage_seconds_bucket{stage="read",le="+Inf"} 3' in text
+    assert 'test_stage_seconds_count{stage="read"} 3' in text
+    assert 'test_files_total{outcome="stored"} 3' in text
+
+    app = FastAPI()
+    app.include_router(routes_metrics.router)
+    response = TestClient(app).get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert "visor_ingest_stage_seconds" in response.text
+
+    from app.config import settings
+
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", "secreto")
+    assert TestClient(app).get("/diagnostics").status_code == 403
+
+
+def test_admin_profile_requires_token_and_returns_collapsed_stacks(monkeypatch):
+    import threading
+
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from app.api import routes_admin
+    from app.config import settings
+
+    app = FastAPI()
+    app.include_router(routes_admin.router, prefix="/admin")
+    client = TestClient(app)
+
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", "")
+    assert client.get("/admin/profile").status_code == 404
+
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", "secreto")
+    assert client.get("/admin/profile", headers={"X-Admin-Token": "otro"}).status_code == 403
+    assert client.get("/admin/profile", headers={"X-Admin-Token": "é".encode("latin-1")}).status_code == 403
+
+    stop = threading.Event()
+
+    def busy_loop():
+        while not stop.is_set():
+            sum(range(200))
+
+    worker = threading.Thread(target=busy_loop, name="ingest-worker_7", daemon=True)
+    worker.start()
+    try:
+        response = client.get(
+            "/admin/profile",
+            params={"seconds": 0.2, "interval_ms": 5},
+            headers={"X-Admin-Token": "secreto"},
+        )
+    finally:
+        stop.set()
+        worker.join()
+
+    assert response.status_code == 200
+    lines = response.text.strip().splitlines()
+    assert any(line.startswith("ingest-worker;") and "busy_loop (" in line for line in lines)
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+
+
+def test_branch_registry_resolves_codes_case_insensitively_and_reloads(monkeypatch):
+    import uuid
+
+    from sqlalchemy import create_engine, event, text
+    from sqlalchemy.orm import sessionmaker
+
+    from app.api.routes_invoices import _resolve_branch_filters
+    from app.models.branch import Branch
+    from app.services.branch_registry import BranchRegistry
+
+    engine = create_engine("sqlite://")
+    Branch.__table__.create(bind=engine)
+    Session = sessionmaker(bind=engine)
+    queries = []
+    event.listen(engine, "before_cursor_execute", lambda *args: queries.append(args[2]))
+
+    with Session() as db:
+        db.add(Branch(id=uuid.uuid4(), name="Centro", code="CEN"))
+        db.commit()
+    queries.clear()
+
+    registry = BranchRegistry(refresh_seconds=3600, session_factory=Session)
+    centro = registry.by_code("cen")
+    assert centro.code == "CEN" and registry.by_id(centro.id) == centro
+    assert registry.by_code("NOR") is None
+    assert len(queries) == 1
+
+    with Session() as db:
+        db.add(Branch(id=uuid.uuid4(), name="Norte", code="NOR"))
+        db.commit()
+    registry.invalidate()
+    assert registry.by_code("nor").name == "Norte"
+    assert registry.code_map()[centro.id] == "CEN"
+
+    monkeypatch.setattr("app.api.routes_invoices.branch_registry", registry)
+    assert _resolve_branch_filters(None, "Cen")["label"] == "CEN"
+    assert _resolve_branch_filters(None, "XYZ")["filters"] is None
+
+    # Sin tabla: la recarga falla dentro de un SAVEPOINT, la sesión sigue
+    # usable y no se reintenta en cada búsqueda.
+    broken = sessionmaker(bind=create_engine("sqlite://"))
+    failing = BranchRegistry(refresh_seconds=3600, session_factory=broken, retry_seconds=3600)
+    with broken() as db:
+        assert failing.by_code("CEN", db) is None
+        assert db.execute(text("SELECT 1")).scalar() == 1
+    failing._session_factory = Session
+    assert failing.by_code("CEN") is None
+    failing.invalidate()
+    assert failing.by_code("CEN").name == "Centro"
+
+
+def test_archive_round_trip_partitions_by_day_and_branch(tmp_path):
+    from datetime import date, datetime
+
+    from app.services import archive
+
+    invoices = [
+        {"id": "a", "number": "1", "branch_code": "FLO", "invoice_date": datetime(2024, 5, 9, 10), "total": 100},
+        {"id": "b", "number": "2", "branch_code": "CEN", "invoice_date": datetime(2024, 5, 9, 11), "total": 50},
+        {"id": "c", "number": "3", "branch_code": "FLO", "created_at": datetime(2024, 5, 8, 9), "total": 10},
+    ]
+    items = [
+        {"id": "i1", "invoice_id": "a", "line_number": 1, "quantity": 2, "subtotal": 80},
+        {"id": "i2", "invoice_id": "c", "line_number": 1, "quantity": 1, "subtotal": 10},
+    ]
+
+    written = archive.write_archive(invoices, items, base_dir=str(tmp_path), fmt="ndjson")
+    assert written == {("2024-05-09", "FLO"): 1, ("2024-05-09", "CEN"): 1, ("2024-05-08", "FLO"): 1}
+    assert (tmp_path / "invoices" / "date=2024-05-09" / "branch=FLO").is_dir()
+
+    # Un cierre repetido no duplica filas al leer.
+    archive.write_archive(invoices[:1], items[:1], base_dir=str(tmp_path), fmt="ndjson")
+
+    may_9 = archive.read_archived_invoices(date(2024, 5, 9), date(2024, 5, 9), base_dir=str(tmp_path))
+    assert sorted(row["id"] for row in may_9) == ["a", "b"]
+
+    flo = archive.read_archived_invoices(branch="flo", base_dir=str(tmp_path))
+    assert sorted(row["id"] for row in flo) == ["a", "c"]
+    assert flo[0]["total"] in (100.0, 10.0)
+
+    flo_items = archive.read_archived_items(date(2024, 5, 9), date(2024, 5, 9), "FLO", base_dir=str(tmp_path))
+    assert [item["id"] for item in flo_items] == ["i1"]
+
+    assert archive.archived_days(base_dir=str(tmp_path)) == [
+        {"date": "2024-05-08", "branches": ["FLO"]},
+        {"date": "2024-05-09", "branches": ["CEN", "FLO"]},
+    ]
+
+
+def test_forecast_batch_endpoint_expands_all_split_and_flags_unknown_labels(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    app = _sqlite_invoices_app(monkeypatch)
+
+    response = TestClient(app).get(
+        "/invoices/today/forecast/batch", params={"branches": "all_split,XYZ", "history_days": 7}
+    )
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["history_days"] == 7
+    assert set(body["branches"]) == {"FLO", "CEN", "XYZ"}
+    assert body["branches"]["XYZ"]["forecast"]["method"] == "no_branch_match"
+    assert body["branches"]["XYZ"]["today"]["invoice_count"] == 0
+    for label, expected_count in (("FLO", 1), ("CEN", 2)):
+        entry = body["branches"][label]
+        assert set(entry) == {"branch", "history", "today", "forecast"}
+        assert entry["branch"] == label
+        assert entry["today"]["invoice_count"] == expected_count
+    assert body["branches"]["CEN"]["today"]["current_total"] == pytest.approx(203.0)
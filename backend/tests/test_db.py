@@ -0,0 +1,165 @@
+import os
+import sys
+from datetime import date
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+def test_partition_ddl_and_bounds_follow_local_days(monkeypatch):
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    from app.services import partitions
+
+    ddl = partitions.partitioned_table_ddl("invoices")
+    assert ddl.endswith("PARTITION BY RANGE ((COALESCE(invoice_date, created_at)))")
+    assert "PRIMARY KEY" not in ddl
+    assert "branch_id UUID REFERENCES branches (id) ON DELETE CASCADE" in ddl
+    assert "REFERENCES" not in partitions.partitioned_table_ddl("invoice_items")
+
+    assert partitions.partition_name("invoice_items", date(2024, 3, 9)) == "invoice_items_p20240309"
+    start, end = partitions.day_range(date(2024, 3, 9))
+    assert (start.date(), end.date()) == (date(2024, 3, 9), date(2024, 3, 10))
+    assert start.tzinfo is not None and start.hour == 0
+
+    # Fuera de Postgres (o sin tablas particionadas) todo es un no-op.
+    monkeypatch.setattr(partitions, "_partitioned", None)
+    db = sessionmaker(bind=create_engine("sqlite://"))()
+    try:
+        assert partitions.partitioned_tables(db) == frozenset()
+        assert partitions.ensure_partitions(db, [date(2024, 3, 9)]) == 0
+        assert partitions.drop_partitions_before(db, date(2024, 3, 10)) == []
+    finally:
+        db.close()
+
+
+def test_migrate_and_reset_drop_partitions_without_orphans_on_postgres(tmp_path, monkeypatch):
+    """Integración: necesita ``TEST_DATABASE_URL`` (Postgres desechable)."""
+
+    import uuid
+    from datetime import timedelta
+
+    import pytest
+    from sqlalchemy import create_engine, text
+    from sqlalchemy.orm import sessionmaker
+
+    url = os.getenv("TEST_DATABASE_URL")
+    if not url:
+        pytest.skip("TEST_DATABASE_URL no definido (Postgres de pruebas)")
+
+    from app.config import settings
+    from app.database import Base
+    from app.models.branch import Branch
+    from app.models.invoice import Invoice
+    from app.models.invoice_item import InvoiceItem
+    from app.services import daily_reset, partitions
+    from app.services.branch_registry import BranchRegistry
+    from app.utils.timezone import day_clock
+    from tools import partition_tables
+
+    schema = f"test_partitions_{uuid.uuid4().hex[:8]}"
+    admin = create_engine(url)
+    with admin.begin() as conn:
+        conn.execute(text(f"CREATE SCHEMA {schema}"))
+    engine = create_engine(url, connect_args={"options": f"-c search_path={schema}"})
+    Session = sessionmaker(bind=engine)
+
+    try:
+        Base.metadata.create_all(
+            engine, tables=[Branch.__table__, Invoice.__table__, InvoiceItem.__table__]
+        )
+        today = day_clock.bounds()
+        yesterday_late = today.start - timedelta(minutes=1)
+        after_midnight = today.start + timedelta(minutes=1)
+
+        late, aligned, current = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+        with Session() as db:
+            for invoice_id, moment in ((late, yesterday_late), (aligned, yesterday_late), (current, after_midnight)):
+                db.add(Invoice(id=invoice_id, number=str(invoice_id)[:8], invoice_date=moment, total=10, subtotal=8))
+            db.flush()
+            # La factura de las 23:59 llegó a las 00:01: su ítem es de hoy.
+            for invoice_id, moment in ((late, after_midnight), (aligned, yesterday_late), (current, after_midnight)):
+                db.add(InvoiceItem(invoice_id=invoice_id, line_number=1, subtotal=8, created_at=moment))
+            db.commit()
+
+        monkeypatch.setattr(partition_tables, "SessionLocal", Session)
+        monkeypatch.setattr(partitions, "_partitioned", None)
+        report = partition_tables.migrate(keep_old=False)
+        assert report["copied"] == {"invoices": 3, "invoice_items": 3}
+
+        with Session() as db:
+            assert partitions.partitioned_tables(db, refresh=True) == frozenset(partitions.PARTITION_KEYS)
+            yesterday_partition = partitions.partition_name("invoices", yesterday_late.date())
+            assert db.execute(text(f"SELECT count(*) FROM {yesterday_partition}")).scalar() == 2
+
+        monkeypatch.setattr(settings, "ARCHIVE_DIR", str(tmp_path))
+        monkeypatch.setattr(daily_reset, "_reset_checked_day", None)
+        monkeypatch.setattr(daily_reset, "branch_registry", BranchRegistry(3600, session_factory=Session))
+        with Session() as db:
+            assert daily_reset.ensure_daily_reset(db) is True
+
+        with Session() as db:
+            remaining = {row.id for row in db.query(Invoice.id)}
+            assert remaining == {current}
+            assert {row.invoice_id for row in db.query(InvoiceItem.invoice_id)} == {current}
+            assert db.execute(text("SELECT to_regclass(:name)"), {"name": yesterday_partition}).scalar() is None
+    finally:
+        engine.dispose()
+        with admin.begin() as conn:
+            conn.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+        admin.dispose()
+        partitions._partitioned = None
+
+
+def test_failed_daily_reset_is_retried_with_backoff_until_done(monkeypatch):
+    from app.config import settings
+    from app.services import daily_reset
+    from app.utils.timezone import day_clock
+
+    class _Session:
+        def close(self):
+            pass
+
+    class _Queue:
+        def __init__(self):
+            self.calls = []
+
+        def call_later(self, delay, fn, *args):
+            self.calls.append((delay, fn, args))
+
+    outcomes = [RuntimeError("sin conexión"), RuntimeError("sin conexión"), True]
+
+    def fake_ensure(db):
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        daily_reset._reset_checked_day = day_clock.bounds().ordinal
+        return outcome
+
+    queue = _Queue()
+    monkeypatch.setattr(daily_reset, "SessionLocal", _Session)
+    monkeypatch.setattr(daily_reset, "ensure_daily_reset", fake_ensure)
+    monkeypatch.setattr(daily_reset, "_retry_tasks", queue)
+    monkeypatch.setattr(daily_reset, "_retry_pending", False)
+    monkeypatch.setattr(daily_reset, "_reset_checked_day", None)
+    monkeypatch.setattr(settings, "DAILY_RESET_RETRY_BASE_SECONDS", 10.0)
+    monkeypatch.setattr(settings, "DAILY_RESET_RETRY_MAX_SECONDS", 15.0)
+
+    assert daily_reset.run_daily_reset() is False
+    # Un segundo fallo mientras hay un reintento pendiente no duplica la cadena.
+    outcomes.insert(0, RuntimeError("sin conexión"))
+    assert daily_reset.run_daily_reset() is False
+    assert [delay for delay, _, _ in queue.calls] == [10.0]
+
+    delay, fn, args = queue.calls.pop()
+    fn(*args)
+    assert [delay for delay, _, _ in queue.calls] == [15.0]
+
+    delay, fn, args = queue.calls.pop()
+    fn(*args)
+    assert queue.calls == []
+    assert daily_reset._reset_checked_day == day_clock.bounds().ordinal
+
+    # Si otro disparo ya completó el cierre, el reintento no hace nada.
+    fn(*args)
+    assert outcomes == []
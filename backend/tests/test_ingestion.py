@@ -0,0 +1,497 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.services import ingestion_ledger as ledger_module
+from app.services.ingestion_ledger import (
+    OUTCOME_DUPLICATE,
+    OUTCOME_PARSE_ERROR,
+    OUTCOME_QUARANTINED,
+    IngestionLedger,
+)
+
+
+@pytest.fixture
+def ledger(monkeypatch):
+    monkeypatch.setattr(ledger_module.IngestionLedger, "_persist", staticmethod(lambda record: None))
+    instance = IngestionLedger()
+    instance.retry_base_seconds = 10
+    instance.retry_max_seconds = 25
+    instance.max_attempts = 4
+    return instance
+
+
+def test_ledger_skips_terminal_outcomes_until_file_changes(ledger):
+    ledger.record_success("A.xml", (100, 1.0), OUTCOME_DUPLICATE, "hash")
+
+    assert ledger.should_process("A.xml", (100, 1.0)) is False
+    assert ledger.should_process("A.xml", (120, 2.0)) is True
+    assert ledger.is_known_content("A.xml", "hash") is True
+
+
+def test_ledger_backs_off_exponentially_and_quarantines(ledger):
+    stat = (100, 1.0)
+
+    first = ledger.record_failure("B.xml", stat, OUTCOME_PARSE_ERROR, "boom", now=0)
+    assert first.next_attempt_at == 10
+    assert ledger.should_process("B.xml", stat, now=5) is False
+    assert ledger.should_process("B.xml", stat, now=10) is True
+
+    second = ledger.record_failure("B.xml", stat, OUTCOME_PARSE_ERROR, "boom", now=10)
+    assert second.next_attempt_at == 30
+    third = ledger.record_failure("B.xml", stat, OUTCOME_PARSE_ERROR, "boom", now=30)
+    assert third.next_attempt_at == 55  # limitado por retry_max_seconds
+
+    fourth = ledger.record_failure("B.xml", stat, OUTCOME_PARSE_ERROR, "boom", now=55)
+    assert fourth.outcome == OUTCOME_QUARANTINED
+    assert ledger.should_process("B.xml", stat, now=10_000) is False
+
+    # Una versión nueva del archivo sale de cuarentena y reinicia el conteo.
+    assert ledger.should_process("B.xml", (150, 2.0)) is True
+    retry = ledger.record_failure("B.xml", (150, 2.0), OUTCOME_PARSE_ERROR, "boom", now=60)
+    assert retry.attempts == 1
+
+
+def test_db_outage_retries_valid_invoices_without_quarantine(ledger, tmp_path, monkeypatch):
+    from types import SimpleNamespace
+
+    from sqlalchemy.exc import OperationalError
+
+    from app.services import file_reader
+    from app.services.ingestion_ledger import OUTCOME_DB_ERROR
+    from app.services.invoice_sources import InvoiceSource, register_source
+
+    register_source(InvoiceSource(str(tmp_path), "01002CE", "CEN"))
+    path = tmp_path / "01002CE001.xml"
+    path.write_bytes(b"<Invoice/>")
+
+    def unavailable():
+        raise OperationalError("SELECT 1", {}, Exception("connection refused"))
+
+    clock = [0.0]
+    monkeypatch.setattr(ledger_module, "time", SimpleNamespace(time=lambda: clock[0]))
+    monkeypatch.setattr(file_reader, "ingestion_ledger", ledger)
+    monkeypatch.setattr(file_reader, "SessionLocal", unavailable)
+    monkeypatch.setattr(
+        file_reader,
+        "parse_invoice",
+        lambda content: {"header": {"number": "CE001"}, "items": [], "totals": {}},
+    )
+
+    for _ in range(ledger.max_attempts * 3):
+        file_reader.process_file(str(path))
+        record = ledger.get(str(path))
+        assert record.outcome == OUTCOME_DB_ERROR
+        assert record.next_attempt_at - clock[0] <= ledger.retry_max_seconds
+        clock[0] = record.next_attempt_at
+
+    assert record.attempts == ledger.max_attempts * 3
+    assert ledger.should_process(str(path), file_reader._stat_file(str(path)), now=clock[0])
+
+
+def test_rescan_prunes_missing_files_and_rereads_only_quarantine(ledger, tmp_path, monkeypatch):
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    from app.models.ingestion_ledger import IngestionLedgerEntry
+    from app.services import file_reader
+    from app.services.invoice_sources import InvoiceSource
+
+    engine = create_engine("sqlite://")
+    IngestionLedgerEntry.__table__.create(bind=engine)
+    Session = sessionmaker(bind=engine)
+    monkeypatch.setattr(ledger_module, "SessionLocal", Session)
+    monkeypatch.setattr(file_reader, "ingestion_ledger", ledger)
+    monkeypatch.setattr(file_reader, "schedule_file_processing", lambda path: None)
+    ledger._loaded = True
+
+    centro, otra = tmp_path / "centro", tmp_path / "otra"
+    centro.mkdir()
+    otra.mkdir()
+    key = {n: str(centro / f"01002CE00{n}.xml") for n in range(1, 5)}
+    (centro / "01002CE001.xml").write_bytes(b"<Invoice/>")
+    for name in (key[1], key[2], str(otra / "01002CE002.xml")):
+        ledger.record_success(name, None, OUTCOME_DUPLICATE)
+    with Session() as db:
+        for name in (key[2], key[3]):
+            db.add(IngestionLedgerEntry(filename=name, outcome=OUTCOME_QUARANTINED))
+        db.commit()
+    for n in (3, 4):
+        ledger._records[key[n]] = ledger_module.LedgerRecord(key[n], outcome=OUTCOME_QUARANTINED)
+        (centro / f"01002CE00{n}.xml").write_bytes(b"<Invoice/>")
+
+    # La fila de 01002CE004 se borró a mano: sale de cuarentena.
+    assert ledger.refresh_quarantined() == 1
+    assert ledger.get(key[4]) is None
+    assert ledger.get(key[3]).outcome == OUTCOME_QUARANTINED
+
+    (centro / "01002CE003.xml").unlink()
+    file_reader.scan_source(InvoiceSource(str(centro), "01002CE", "CEN"))
+
+    assert ledger.get(key[2]) is None and ledger.get(key[3]) is None
+    assert ledger.get(key[1]) is not None
+    # El mismo nombre en otra carpeta no se toca.
+    assert ledger.get(str(otra / "01002CE002.xml")) is not None
+    with Session() as db:
+        assert db.query(IngestionLedgerEntry).count() == 0
+
+
+def test_same_filename_in_two_sources_is_ingested_twice(ledger, tmp_path, monkeypatch):
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+
+    from app.models.branch import Branch
+    from app.models.invoice import Invoice
+    from app.models.invoice_item import InvoiceItem
+    from app.services import file_reader
+    from app.services.ingestion_ledger import OUTCOME_STORED
+    from app.services.invoice_sources import InvoiceSource, register_source
+
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    for model in (Branch, Invoice, InvoiceItem):
+        model.__table__.create(bind=engine)
+    Session = sessionmaker(bind=engine)
+    monkeypatch.setattr(file_reader, "SessionLocal", Session)
+    monkeypatch.setattr(file_reader, "ingestion_ledger", ledger)
+    monkeypatch.setattr(file_reader, "resolve_branch_id", lambda code: None)
+    monkeypatch.setattr(
+        file_reader,
+        "parse_invoice",
+        lambda content: {"header": {"number": content.decode()}, "items": [], "totals": {}},
+    )
+
+    paths = []
+    for folder, number in (("norte", "N-1"), ("sur", "S-1")):
+        directory = tmp_path / folder
+        directory.mkdir()
+        register_source(InvoiceSource(str(directory), "01009XX", folder.upper()))
+        path = directory / "01009XX001.xml"
+        path.write_bytes(number.encode())
+        paths.append(str(path))
+
+    keys = [file_reader.file_key(path) for path in paths]
+    assert keys[0] != keys[1]
+    assert all(file_reader._mark_file_processing(key) for key in keys)
+    for key in keys:
+        file_reader._release_file(key)
+
+    for path in paths:
+        file_reader.process_file(path)
+
+    assert [ledger.get(key).outcome for key in keys] == [OUTCOME_STORED, OUTCOME_STORED]
+    with Session() as db:
+        stored = dict(db.query(Invoice.number, Invoice.source_file))
+    assert stored == {"N-1": keys[0], "S-1": keys[1]}
+
+
+def test_stability_gate_waits_for_two_identical_polls(tmp_path, monkeypatch):
+    from app.services import file_reader
+
+    invoice = tmp_path / "01001FL0001.xml"
+    invoice.write_bytes(b"<Invoice>")
+
+    pending = []
+    submitted = []
+    monkeypatch.setattr(
+        file_reader._delayed_tasks, "call_later", lambda delay, fn, *args: pending.append((fn, args))
+    )
+    monkeypatch.setattr(file_reader, "_submit_file", lambda path, attempt: submitted.append(path))
+
+    file_reader.schedule_file_processing(str(invoice))
+    assert submitted == [] and len(pending) == 1
+
+    # El archivo sigue creciendo: se vuelve a sondear.
+    invoice.write_bytes(b"<Invoice></Invoice>")
+    fn, args = pending.pop()
+    fn(*args)
+    assert submitted == [] and len(pending) == 1
+
+    # Sin cambios entre dos sondeos: se entrega al pool.
+    fn, args = pending.pop()
+    fn(*args)
+    assert submitted == [str(invoice)]
+    file_reader._release_file(str(invoice))
+
+
+def test_busy_file_is_rescheduled_without_blocking_the_worker(monkeypatch):
+    from app.services import file_reader
+
+    def busy(path, attempt):
+        raise file_reader.FileBusyError("locked")
+
+    pending = []
+    monkeypatch.setattr(file_reader, "process_file", busy)
+    monkeypatch.setattr(
+        file_reader._delayed_tasks, "call_later", lambda delay, fn, *args: pending.append((delay, fn, args))
+    )
+
+    key = file_reader.file_key("/share/busy.xml")
+    assert file_reader._mark_file_processing(key)
+    file_reader._run_file("/share/busy.xml", 2)
+
+    delay, fn, args = pending[0]
+    assert delay == pytest.approx(file_reader.READ_RETRY_DELAY * 2)
+    assert fn is file_reader._submit_file and args == ("/share/busy.xml", 3)
+    # El archivo sigue marcado mientras espera su reintento.
+    assert file_reader._mark_file_processing(key) is False
+    file_reader._release_file(key)
+
+
+def test_watcher_backend_selection(tmp_path, monkeypatch):
+    from app.services import watcher
+    from app.services.watcher import BACKEND_NATIVE, BACKEND_POLLING, select_backend
+
+    assert select_backend(str(tmp_path), "polling", 1.0) == BACKEND_POLLING
+    assert select_backend(str(tmp_path), "native", 1.0) == BACKEND_NATIVE
+
+    # El canario real siempre se elimina, funcione o no el backend nativo.
+    watcher.probe_native_events(str(tmp_path), 0.5)
+    assert list(tmp_path.iterdir()) == []
+
+    probes = []
+
+    def fake_probe(path, timeout):
+        probes.append(path)
+        return native_events
+
+    monkeypatch.setattr(watcher, "probe_native_events", fake_probe)
+
+    monkeypatch.setattr(watcher, "is_network_filesystem", lambda path: True)
+    native_events = True
+    assert select_backend(str(tmp_path), "auto", 3.0) == BACKEND_POLLING
+    assert probes == []  # En un montaje de red ni se prueba el canario.
+
+    monkeypatch.setattr(watcher, "is_network_filesystem", lambda path: False)
+    assert select_backend(str(tmp_path), "auto", 3.0) == BACKEND_NATIVE
+    native_events = False
+    assert select_backend(str(tmp_path), "", 3.0) == BACKEND_POLLING
+    assert probes == [str(tmp_path), str(tmp_path)]
+
+
+def test_watcher_stats_reports_latency_per_backend():
+    from app.services.watcher import WatcherStats
+
+    stats = WatcherStats()
+    stats.set_backend("polling")
+    for latency in (1.0, 2.0, 3.0):
+        stats.record_latency(100.0, now=100.0 + latency)
+    stats.set_backend("native")
+    stats.record_latency(100.0, now=100.2)
+
+    summary = stats.summary()
+    assert summary["polling"]["samples"] == 3
+    assert summary["polling"]["p50"] == pytest.approx(2.0)
+    assert summary["native"]["max"] == pytest.approx(0.2)
+
+
+def test_adaptive_poll_interval_follows_arrival_rate():
+    from datetime import datetime, time as dt_time
+
+    from app.services.file_reader import AdaptivePollScheduler
+
+    scheduler = AdaptivePollScheduler(
+        floor=0.5,
+        ceiling=30.0,
+        business_ceiling=2.0,
+        rescan_period=120.0,
+        rescan_floor=45.0,
+        rescan_ceiling=900.0,
+        half_life=60.0,
+        business_hours=[(dt_time(7, 0), dt_time(21, 0))],
+    )
+    night = datetime(2024, 1, 1, 3, 0)
+    midday = datetime(2024, 1, 1, 12, 0)
+
+    # Sin llegadas: techo nocturno y techo comercial.
+    assert scheduler.poll_interval(now=0.0, local_now=night) == 30.0
+    assert scheduler.poll_interval(now=0.0, local_now=midday) == 2.0
+    assert scheduler.rescan_interval(now=0.0, local_now=night) == 900.0
+
+    # Ráfaga de facturas: el intervalo baja hasta el piso.
+    for second in range(60):
+        scheduler.record_arrivals(5, now=float(second))
+    assert scheduler.poll_interval(now=60.0, local_now=night) == 0.5
+    # El re-escaneo baja por debajo del periodo configurado, hasta su piso.
+    assert scheduler.rescan_interval(now=60.0, local_now=night) == 45.0
+
+    # Tras varias vidas medias sin llegadas vuelve a relajarse.
+    assert scheduler.poll_interval(now=3600.0, local_now=night) == 30.0
+
+
+def test_adaptive_polling_observer_reads_interval_each_cycle(tmp_path):
+    from watchdog.events import FileSystemEventHandler
+
+    from app.services.watcher import AdaptivePollingObserver, create_observer
+
+    current = {"interval": 2.0}
+    observer = create_observer("polling", lambda: current["interval"])
+    assert isinstance(observer, AdaptivePollingObserver)
+
+    observer.schedule(FileSystemEventHandler(), str(tmp_path), recursive=False)
+    (emitter,) = observer.emitters
+    assert emitter.timeout == 2.0
+    current["interval"] = 0.5
+    assert emitter.timeout == 0.5
+
+
+def test_invoice_sources_are_parsed_per_branch(tmp_path):
+    from app.services.invoice_sources import parse_sources
+
+    north = tmp_path / "norte"
+    south = tmp_path / "sur"
+    raw = f"{north}|01001fl|flo; {south}|01002ce|CEN ;mal-formada|X"
+
+    sources = parse_sources(raw, "/default", "01001FL", "FLO")
+    assert [(s.prefix, s.branch_code) for s in sources] == [("01001FL", "FLO"), ("01002CE", "CEN")]
+    assert sources[1].key == str(south)
+
+    # Sin INVOICE_SOURCES se conserva la carpeta única histórica.
+    (default,) = parse_sources("", "/default", "01001fl", "flo")
+    assert (default.path, default.prefix, default.branch_code) == ("/default", "01001FL", "FLO")
+
+
+def test_scan_source_only_takes_files_with_its_prefix(tmp_path, monkeypatch):
+    from app.services import file_reader
+    from app.services.invoice_sources import InvoiceSource
+
+    for name in ("01002CE001.xml", "01002ce002.XML", "01001FL001.xml", "01002CE003.pdf.xml", "01002CE004.txt"):
+        (tmp_path / name).write_bytes(b"<Invoice/>")
+
+    scheduled = []
+    monkeypatch.setattr(file_reader.ingestion_ledger, "ensure_loaded", lambda: None)
+    monkeypatch.setattr(file_reader.ingestion_ledger, "should_process", lambda *args: True)
+    monkeypatch.setattr(file_reader, "schedule_file_processing", scheduled.append)
+
+    result = file_reader.scan_source(InvoiceSource(str(tmp_path), "01002CE", "CEN"))
+    assert result["scheduled"] == 2
+    assert sorted(os.path.basename(path) for path in scheduled) == ["01002CE001.xml", "01002ce002.XML"]
+
+
+def test_unknown_folders_and_flo_do_not_get_a_guessed_branch(tmp_path, monkeypatch):
+    import uuid
+
+    from app.services import invoice_sources
+    from app.services.branch_registry import BranchRecord
+    from app.services.invoice_sources import InvoiceSource, register_source, source_for_path
+
+    assert source_for_path(str(tmp_path / "01002CE001.xml")) is None
+    centro = register_source(InvoiceSource(str(tmp_path), "01002CE", "CEN"))
+    assert source_for_path(str(tmp_path / "01002CE001.xml")) == centro
+
+    records = {code: BranchRecord(uuid.uuid4(), code, code) for code in ("FLO", "CEN")}
+    monkeypatch.setattr(invoice_sources.branch_registry, "by_code", lambda code, db=None: records.get(code))
+    # Las rutas leen FLO como ``branch_id`` nulo aunque exista la fila.
+    assert invoice_sources.resolve_branch_id("flo") is None
+    assert invoice_sources.resolve_branch_id("cen") == records["CEN"].id
+
+
+def test_diagnostics_reports_monitor_scan_and_processing_state(tmp_path, monkeypatch):
+    from app.services import diagnostics, file_reader
+    from app.services.invoice_sources import InvoiceSource
+
+    (tmp_path / "01002CE001.xml").write_bytes(b"<Invoice/>")
+    monkeypatch.setattr(file_reader.ingestion_ledger, "ensure_loaded", lambda: None)
+    monkeypatch.setattr(file_reader.ingestion_ledger, "should_process", lambda *args: True)
+    monkeypatch.setattr(file_reader, "schedule_file_processing", lambda path: None)
+
+    monitor = file_reader.SourceMonitor(InvoiceSource(str(tmp_path), "01002CE", "CEN"))
+    monitor.scan()
+    monkeypatch.setitem(file_reader._monitors, "test-cen", monitor)
+    assert file_reader._mark_file_processing("01002CE001.xml")
+    try:
+        snapshot = diagnostics.collect()
+    finally:
+        file_reader._release_file("01002CE001.xml")
+
+    (entry,) = [item for item in snapshot["ingest"]["monitors"] if item["branch"] == "CEN"]
+    assert entry["last_scan_seconds"] is not None and entry["last_scan_error"] is None
+    assert entry["thread_alive"] is False and entry["observer_alive"] is False
+    assert snapshot["ingest"]["processing_files"] >= 1
+    assert snapshot["db_pools"]["sync"]["checkedout"] == 0
+    assert snapshot["threads"]["total"] >= 1
+
+
+def test_rate_limit_filter_drops_repeats_and_reports_them():
+    import logging
+
+    from app.utils.logger import RateLimitFilter
+
+    limiter = RateLimitFilter(limit=2, window=60)
+
+    def record(msg):
+        return logging.LogRecord("visor.test", logging.INFO, __file__, 1, msg, ("x",), None)
+
+    allowed = [limiter.filter(record("archivo %s")) for _ in range(5)]
+    assert allowed == [True, True, False, False, False]
+    # Otro mensaje tiene su propio cupo.
+    assert limiter.filter(record("otro %s")) is True
+
+    # Al abrir la ventana siguiente se informa cuántos se omitieron.
+    key = ("visor.test", logging.INFO, "archivo %s")
+    limiter._buckets[key][0] -= 61
+    resumed = record("archivo %s")
+    assert limiter.filter(resumed) is True
+    assert "+3 omitidos" in resumed.getMessage()
+
+
+def test_activity_summary_groups_counts_per_interval(caplog):
+    import logging
+
+    from app.utils.logger import ActivitySummary
+
+    log = logging.getLogger("test.activity")
+    summary = ActivitySummary(log, "Ingesta", interval=60)
+    with caplog.at_level(logging.INFO, logger="test.activity"):
+        for _ in range(3):
+            summary.record("stored")
+        summary.record("duplicate")
+        assert caplog.records == []
+
+        summary.flush_if_due(now=summary._last_flush + 61)
+
+    (line,) = caplog.records
+    assert "duplicate=1, stored=3" in line.getMessage()
+
+
+def test_backfill_parses_candidates_and_merges_archived_totals(tmp_path):
+    from datetime import date, datetime
+
+    from app.services.db_writer import ITEM_COPY_COLUMNS, encode_copy_rows, merge_day_totals
+    from tests.test_parser import SAMPLE_XML
+    from tools.backfill import build_rows, is_backfill_candidate, parse_path
+
+    assert is_backfill_candidate("01001FL1.xml", "01001FL") is True
+    assert is_backfill_candidate("01001FL1.pdf.xml", "01001FL") is False
+    assert is_backfill_candidate("OTRO1.xml", "01001FL") is False
+
+    path = tmp_path / "01001FL1.xml"
+    path.write_text(SAMPLE_XML, encoding="utf-8")
+    parsed = parse_path(str(path))
+    assert parsed.error is None
+    assert parsed.content_hash and parsed.items
+
+    invoice, items = build_rows(parsed, None, datetime(2024, 5, 10, 12, 0))
+    assert invoice["source_file"] == str(path)
+    assert all(item["invoice_id"] == invoice["id"] for item in items)
+    csv_text = encode_copy_rows(items, ITEM_COPY_COLUMNS).getvalue()
+    assert csv_text.count("\n") == len(items)
+
+    broken = tmp_path / "01001FL2.xml"
+    broken.write_text("<Invoice", encoding="utf-8")
+    assert parse_path(str(broken)).error
+
+    day = date(2024, 5, 10)
+    live = [{"id": "a", "day": day, "branch_id": None, "total": 100, "subtotal": 80}]
+    archived = [
+        {"id": "a", "day": day, "branch_id": None, "total": 100, "subtotal": 80},
+        {"id": "b", "day": day, "branch_id": None, "total": "50.5", "subtotal": 40},
+    ]
+    totals = merge_day_totals(live, archived)
+    assert totals[(day, None)]["invoices"] == 2
+    assert float(totals[(day, None)]["total"]) == 150.5
@@ -101,10 +101,25 @@ def test_parse_invoice_items():
 
 
 def test_is_valid_invoice_file_accepts_single_xml_extension():
-    assert _is_valid_invoice_file("010012W12345.xml") is True
+    assert _is_valid_invoice_file("010012W12345.xml", prefix="010012W") is True
 
 
 def test_is_valid_invoice_file_rejects_double_extension_and_prefix():
-    assert _is_valid_invoice_file("010012W12345.xml.xml") is False
-    assert _is_valid_invoice_file("99999W12345.xml") is False
-    assert _is_valid_invoice_file("010012W12345.txt") is False
\ No newline at end of file
+    assert _is_valid_invoice_file("010012W12345.xml.xml", prefix="010012W") is False
+    assert _is_valid_invoice_file("99999W12345.xml", prefix="010012W") is False
+    assert _is_valid_invoice_file("010012W12345.txt", prefix="010012W") is False
+
+def test_synthetic_ubl_corpus_is_deterministic_and_parses():
+    from benchmarks.ubl_generator import InvoiceProfile, generate_corpus
+
+    profile = InvoiceProfile(lines_median=4, tax_subtotals=2)
+    first = list(generate_corpus(5, seed=3, profile=profile))
+    assert first == list(generate_corpus(5, seed=3, profile=profile))
+
+    filename, content = first[0]
+    assert filename.startswith("01001FL") and filename.endswith(".xml")
+    parsed = parse_invoice(content)
+    totals = parsed["totals"]
+    assert parsed["header"]["number"] == filename[len("01001FL") : -len(".xml")]
+    assert sum(item["subtotal"] for item in parsed["items"]) == pytest.approx(totals["subtotal"])
+    assert totals["subtotal"] + totals["iva"] == pytest.approx(totals["total"])
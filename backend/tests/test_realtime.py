@@ -0,0 +1,160 @@
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.services.realtime_events import InvoiceEvent
+from app.services.realtime_manager import RealtimeManager
+from app.utils.timezone import day_clock
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_text(self, data):
+        self.sent.append(data)
+
+
+def test_invoice_event_is_built_once_with_identity_and_day():
+    issued = day_clock.now().replace(microsecond=0)
+    event = InvoiceEvent.create(
+        "FLO",
+        invoice_number="FE-1",
+        items=3,
+        total=1500,
+        subtotal=1200,
+        file="01001FL1.xml",
+        invoice_date=issued,
+        created_at=issued + timedelta(seconds=5),
+    )
+
+    assert event.identity == f"FE-1-{issued.isoformat()}"
+    assert event.day_ordinal == issued.date().toordinal()
+    payload = event.payload()
+    assert payload["event"] == "new_invoice"
+    assert payload["timestamp"] == issued.isoformat()
+    assert payload["total"] == 1500.0
+    assert not hasattr(event, "__dict__")
+
+
+def test_from_payload_matches_legacy_dict_messages():
+    event = InvoiceEvent.from_payload("FLO", {"invoice_number": "7", "created_at": "2024-05-10T08:00:00"})
+    assert event.identity == "7-2024-05-10T08:00:00"
+    assert event.day_ordinal == datetime(2024, 5, 10).toordinal()
+
+
+def test_history_keeps_latest_event_per_invoice_and_replays_on_connect():
+    manager = RealtimeManager()
+    now = day_clock.now()
+
+    async def scenario():
+        first = InvoiceEvent.create("FLO", invoice_number="A", items=1, total=10, invoice_date=now)
+        again = InvoiceEvent.create("FLO", invoice_number="A", items=2, total=20, invoice_date=now)
+        other = InvoiceEvent.create("FLO", invoice_number="B", items=1, total=5, invoice_date=now)
+        old = InvoiceEvent.create(
+            "FLO", invoice_number="C", items=1, total=5, invoice_date=now - timedelta(days=1)
+        )
+        for event in (first, other, again, old):
+            await manager.broadcast("FLO", event)
+
+        websocket = FakeWebSocket()
+        await manager.connect(websocket, "FLO")
+        return websocket
+
+    websocket = asyncio.run(scenario())
+    assert [event.identity.split("-")[0] for event in manager.history("FLO")] == ["B", "A"]
+    assert len(websocket.sent) == 2 and '"items": 2' in websocket.sent[1]
+
+
+def test_day_clock_caches_bounds_and_publishes_rollover():
+    import threading
+    from zoneinfo import ZoneInfo
+
+    from app.utils.timezone import DayClock
+
+    clock = DayClock(ZoneInfo("America/Bogota"))
+    tz = clock.tz
+    clock._bounds = clock.bounds(datetime(2024, 5, 10, 9, 0, tzinfo=tz))
+    published = []
+    done = threading.Event()
+
+    def on_rollover(current, previous):
+        published.append((previous.day.isoformat(), current.day.isoformat()))
+        done.set()
+
+    clock.subscribe(on_rollover)
+
+    first = clock.bounds(datetime(2024, 5, 10, 23, 59, tzinfo=tz))
+    assert first.start == datetime(2024, 5, 10, tzinfo=tz)
+    assert first.end == datetime(2024, 5, 11, tzinfo=tz)
+    assert published == []
+
+    second = clock.bounds(datetime(2024, 5, 11, 0, 0, 1, tzinfo=tz))
+    assert second.ordinal == first.ordinal + 1
+    assert done.wait(2)
+    assert published == [("2024-05-10", "2024-05-11")]
+
+    # Un reloj que retrocede no vuelve a publicar.
+    clock.bounds(datetime(2024, 5, 10, 23, 0, tzinfo=tz))
+    assert len(published) == 1
+
+
+def test_loop_monitor_captures_stack_of_blocking_call():
+    import time
+
+    from app.services.loop_monitor import LoopLagMonitor
+
+    monitor = LoopLagMonitor(interval=0.02, threshold=0.05)
+
+    def serialize_everything():
+        time.sleep(0.3)
+
+    async def scenario():
+        monitor.start()
+        await asyncio.sleep(0.05)
+        serialize_everything()
+        await asyncio.sleep(0.1)
+        monitor.stop()
+
+    asyncio.run(scenario())
+
+    stalls = monitor.recent_stalls()
+    assert len(stalls) == 1
+    assert any("serialize_everything" in line for line in stalls[0]["stack"])
+    assert stalls[0]["blocked_ms"] >= 200
+
+
+def test_freshness_tracks_stage_lags_and_notify_skips_history():
+    from app.services.freshness import FreshnessTracker
+
+    tracker = FreshnessTracker(window_seconds=600)
+    tracker.record("FLO", written_at=100.0, detected_at=102.0, committed_at=102.5, sent_at=103.0)
+    tracker.record("FLO", written_at=90.0, detected_at=130.0, committed_at=131.0, sent_at=131.5)
+
+    snapshot = tracker.snapshot("FLO", now=160.0)
+    assert snapshot["invoices"] == 2
+    assert snapshot["stages"]["detect"] == {"p50_s": 2.0, "p95_s": 40.0, "max_s": 40.0}
+    assert snapshot["stages"]["end_to_end"]["max_s"] == 41.5
+    # El archivo reprocesado (mtime 90) no hace ver más fresco el tablero.
+    assert snapshot["staleness_s"] == 60.0
+
+    # Los gauges se recalculan al exportar: la antigüedad sigue creciendo y
+    # el p95 de una ventana vacía deja de exportarse.
+    from app.services.freshness import FRESHNESS_LAG_P95_SECONDS, FRESHNESS_STALENESS_SECONDS
+
+    tracker.update_metrics(now=160.0)
+    assert FRESHNESS_LAG_P95_SECONDS.value(branch="FLO", stage="detect") == 40.0
+    assert tracker.snapshot("FLO", now=800.0)["invoices"] == 0
+    tracker.update_metrics(now=1000.0)
+    assert FRESHNESS_STALENESS_SECONDS.value(branch="FLO") == 900.0
+    assert 'branch="FLO",stage="detect"' not in "\n".join(FRESHNESS_LAG_P95_SECONDS.render())
+
+    manager = RealtimeManager()
+    socket = FakeWebSocket()
+    manager.connections["FLO"] = [socket]
+    asyncio.run(manager.notify("FLO", {"event": "freshness", "timestamp": day_clock.now().isoformat()}))
+    assert '"event": "freshness"' in socket.sent[0]
+    assert manager.history("FLO") == []
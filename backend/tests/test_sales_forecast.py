@@ -7,7 +7,8 @@ ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..",".."))
 if ROOT_DIR not in sys.path:
     sys.path.insert(0, ROOT_DIR)
     
-from shared.helpers import estimate_daily_sales_total
+from shared.forecasting import HAS_NUMPY, fit_linear_model, fit_linear_models, predict
+from shared.helpers import estimate_daily_sales_total, estimate_daily_sales_totals
 
 def _build_history_samples():
     base_samples = [
@@ -64,4 +65,95 @@ def test_estimate_daily_sales_total_falls_back_to_ratio_when_history_is_small():
     
     
     assert result == pytest.approx(1800.0)
-    assert result >= 600
\ No newline at end of file
+    assert result >= 600
+
+def test_estimate_daily_sales_totals_matches_single_branch_estimates():
+    history = _build_history_samples()
+    requests = {
+        "FLO": {
+            "partial_sales": 950,
+            "invoice_count": 48,
+            "previous_total": 4180,
+            "history": history,
+        },
+        "CED": {
+            "partial_sales": 600,
+            "invoice_count": 6,
+            "previous_total": 1200,
+            "history": history[:1],
+        },
+    }
+
+    results = estimate_daily_sales_totals(requests)
+
+    for branch, request in requests.items():
+        assert results[branch] == pytest.approx(
+            estimate_daily_sales_total(**request)
+        )
+
+
+@pytest.mark.parametrize("use_numpy", [False, True])
+def test_fit_linear_model_backends_agree(use_numpy):
+    if use_numpy and not HAS_NUMPY:
+        pytest.skip("NumPy no disponible")
+
+    samples = [
+        (partial, invoices, previous, 500 + 1.25 * partial + 12 * invoices + 0.1 * previous)
+        for partial, invoices, previous in [
+            (1000.0, 50, 4000.0),
+            (800.0, 40, 3800.0),
+            (1200.0, 55, 4200.0),
+            (900.0, 45, 4100.0),
+            (1100.0, 52, 4150.0),
+        ]
+    ]
+
+    coefficients = fit_linear_model(samples, use_numpy=use_numpy)
+
+    assert coefficients == pytest.approx((500, 1.25, 12, 0.1), rel=1e-6)
+
+
+@pytest.mark.parametrize("use_numpy", [False, True])
+def test_fit_linear_model_regularises_collinear_history(use_numpy):
+    if use_numpy and not HAS_NUMPY:
+        pytest.skip("NumPy no disponible")
+
+    # The second feature is an exact multiple of the first one.
+    samples = [(value, 2 * value, 3 * value + 100) for value in (100.0, 200.0, 300.0, 400.0)]
+
+    assert fit_linear_model(samples, ridge_alpha=0, use_numpy=use_numpy) is None
+
+    coefficients = fit_linear_model(samples, use_numpy=use_numpy)
+    assert coefficients is not None
+    assert predict(coefficients, (250.0, 500.0)) == pytest.approx(850.0, rel=0.01)
+
+
+def test_fit_linear_models_batch_matches_individual_fits():
+    groups = {
+        "FLO": [(1.0, 2.0, 5.0), (2.0, 1.0, 4.0), (3.0, 5.0, 12.0), (4.0, 3.0, 10.5)],
+        "CED": [(10.0, 1.0, 30.0), (12.0, 4.0, 41.0), (15.0, 2.0, 43.0)],
+        "SHORT": [(1.0, 1.0, 1.0)],
+    }
+
+    batched = fit_linear_models(groups)
+
+    assert batched["SHORT"] is None
+    for key in ("FLO", "CED"):
+        assert batched[key] == pytest.approx(fit_linear_model(groups[key]), abs=1e-6)
+
+
+def test_backends_agree_on_nearly_collinear_history():
+    if not HAS_NUMPY:
+        pytest.skip("NumPy no disponible")
+
+    # cond(X) ≈ 5e8: below the ridge threshold, but the normal equations
+    # (cond² ≈ 1e17) are not solvable in double precision.
+    samples = [[day, 2 * day + 1e-7 * (day % 3), 1e6 + 1000 * day] for day in range(1, 15)]
+
+    python = fit_linear_model(samples, use_numpy=False)
+    numpy = fit_linear_model(samples, use_numpy=True)
+    batched = fit_linear_models({"FLO": samples}, use_numpy=True)["FLO"]
+
+    for coefficients in (python, numpy, batched):
+        assert coefficients == pytest.approx((1e6, 1000.0, 0.0), abs=1e-2)
+    assert predict(python, (15, 30)) == pytest.approx(predict(numpy, (15, 30)), rel=1e-9)
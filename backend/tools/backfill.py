@@ -0,0 +1,386 @@
+"""Carga masiva de facturas UBL de una carpeta con ``COPY``.
+
+Pensado para recuperar semanas de archivos tras una caída o al incorporar
+una sede. A diferencia de ``initial_scan``:
+
+* los XML se parsean en un pool de procesos (sin el GIL);
+* las filas se envían a ``invoices``/``invoice_items`` con ``COPY`` en lotes
+  grandes, un ``commit`` por lote;
+* no se envían eventos realtime;
+* al terminar se reconstruye ``daily_sales_summary`` de los días anteriores
+  a hoy que recibieron facturas.
+
+Se puede relanzar sin riesgo: se omiten los archivos que ya están en
+``invoices.source_file`` o en el registro de ingesta con resultado
+definitivo (por ruta completa, igual que el monitor), y las facturas cuyo
+número ya existe.
+
+Uso::
+
+    cd backend
+    python -m tools.backfill /ruta/a/xml --branch FLO --workers 8
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Iterable, Iterator, List, Optional, Set
+
+from sqlalchemy.dialects.postgresql import insert
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.daily_summary import DailySalesSummary
+from app.models.ingestion_ledger import IngestionLedgerEntry
+from app.models.invoice import Invoice
+from app.services.branch_registry import branch_registry
+from app.services.db_writer import (
+    INVOICE_COPY_COLUMNS,
+    ITEM_COPY_COLUMNS,
+    copy_rows,
+    rebuild_daily_summaries,
+)
+from app.services.ingestion_ledger import OUTCOME_DUPLICATE, OUTCOME_STORED, TERMINAL_OUTCOMES
+from app.services.invoice_sources import file_key, resolve_branch_id
+from app.services.parser import parse_invoice, parse_issue_date
+from app.services.partitions import ensure_partitions
+from app.utils.timezone import day_clock
+
+
+@dataclass
+class ParsedFile:
+    filename: str
+    # Ruta normalizada: ``invoices.source_file`` y clave del registro de ingesta.
+    key: str = ""
+    size: int = 0
+    mtime: float = 0.0
+    content_hash: Optional[str] = None
+    header: dict = field(default_factory=dict)
+    totals: dict = field(default_factory=dict)
+    items: List[dict] = field(default_factory=list)
+    invoice_date: Optional[datetime] = None
+    error: Optional[str] = None
+
+
+@dataclass
+class BackfillReport:
+    files: int = 0
+    inserted: int = 0
+    items: int = 0
+    skipped: int = 0
+    duplicates: int = 0
+    errors: int = 0
+    elapsed: float = 0.0
+    days: Set[date] = field(default_factory=set)
+
+    @property
+    def files_per_second(self) -> float:
+        return self.files / self.elapsed if self.elapsed > 0 else 0.0
+
+
+def is_backfill_candidate(filename: str, prefix: str) -> bool:
+    """``<prefijo>...xml`` sin doble extensión (``.pdf.xml``, ``.xml.xml``)."""
+
+    lowered = filename.lower()
+    if not lowered.endswith(".xml") or lowered.count(".") != 1:
+        return False
+    return not prefix or filename.startswith(prefix)
+
+
+def iter_candidates(directory: str, prefix: str) -> Iterator[str]:
+    with os.scandir(directory) as entries:
+        for entry in sorted(entries, key=lambda entry: entry.name):
+            if entry.is_file() and is_backfill_candidate(entry.name, prefix):
+                yield entry.path
+
+
+def parse_path(path: str) -> ParsedFile:
+    """Lee y parsea un archivo; se ejecuta en los procesos del pool."""
+
+    result = ParsedFile(filename=os.path.basename(path), key=file_key(path))
+    try:
+        stat = os.stat(path)
+        result.size, result.mtime = stat.st_size, stat.st_mtime
+        with open(path, "rb") as handle:
+            content = handle.read()
+        result.content_hash = hashlib.sha256(content).hexdigest()
+        parsed = parse_invoice(content)
+    except Exception as exc:
+        result.error = f"{type(exc).__name__}: {exc}"
+        return result
+
+    result.header = parsed["header"]
+    result.totals = parsed["totals"]
+    result.items = parsed["items"]
+    result.invoice_date = parse_issue_date(
+        result.header.get("issue_date") or result.header.get("date")
+    )
+    return result
+
+
+def build_rows(parsed: ParsedFile, branch_id, now: datetime) -> tuple[dict, List[dict]]:
+    """Filas para ``COPY`` con las mismas conversiones que ``process_file``."""
+
+    # ``created_at`` toma la fecha de la factura para que el cierre diario
+    # trate las facturas atrasadas como de su propio día.
+    created_at = parsed.invoice_date or now
+    totals = parsed.totals
+    invoice = {
+        "id": uuid.uuid4(),
+        "number": parsed.header.get("number"),
+        "branch_id": branch_id,
+        "issued_at": None,
+        "invoice_date": parsed.invoice_date,
+        "subtotal": float(totals.get("subtotal", 0) or 0),
+        "vat": float(totals.get("iva", 0) or 0),
+        "discount": float(totals.get("discount", 0) or 0),
+        "total": float(totals.get("total", 0) or 0),
+        "source_file": parsed.key,
+        "created_at": created_at,
+    }
+    items = [
+        {
+            "id": uuid.uuid4(),
+            "invoice_id": invoice["id"],
+            "line_number": int(item.get("line_number") or 0),
+            "product_code": item.get("product_code"),
+            "description": item.get("description"),
+            "quantity": float(item.get("quantity") or 0),
+            "unit_price": float(item.get("unit_price") or 0),
+            "subtotal": float(item.get("subtotal") or 0),
+            "created_at": created_at,
+        }
+        for item in parsed.items
+    ]
+    return invoice, items
+
+
+class Backfill:
+    def __init__(self, branch_code: str, batch_size: int, dry_run: bool = False):
+        self.branch_code = branch_code.upper()
+        self.batch_size = max(1, batch_size)
+        self.dry_run = dry_run
+        self.report = BackfillReport()
+        self.known_files: Set[str] = set()
+        self.known_numbers: Set[str] = set()
+        self.branch_id = None
+        self._batch: List[ParsedFile] = []
+
+    def load_known(self) -> None:
+        db = SessionLocal()
+        try:
+            IngestionLedgerEntry.__table__.create(bind=db.connection(), checkfirst=True)
+            db.commit()
+            self.known_files = {
+                name
+                for (name,) in db.query(Invoice.source_file).filter(Invoice.source_file.isnot(None))
+            }
+            self.known_files.update(
+                name
+                for (name,) in db.query(IngestionLedgerEntry.filename).filter(
+                    IngestionLedgerEntry.outcome.in_(TERMINAL_OUTCOMES)
+                )
+            )
+            self.known_numbers = {
+                number for (number,) in db.query(Invoice.number).filter(Invoice.number.isnot(None))
+            }
+        finally:
+            db.close()
+
+        self.branch_id = resolve_branch_id(self.branch_code)
+        if self.branch_id is None:
+            print(f"⚠️ La sede {self.branch_code} no existe; las facturas quedan sin sede.")
+
+    def add(self, parsed: ParsedFile) -> None:
+        self.report.files += 1
+        if parsed.error:
+            self.report.errors += 1
+            print(f"❌ {parsed.filename}: {parsed.error}")
+            return
+        self._batch.append(parsed)
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        batch, self._batch = self._batch, []
+        if not batch:
+            return
+        if self.dry_run:
+            self._select(batch, set())
+            return
+
+        db = SessionLocal()
+        try:
+            # Otro proceso (el monitor en vivo) pudo guardar alguno mientras tanto.
+            names = [parsed.key for parsed in batch]
+            stored_now = {
+                name for (name,) in db.query(Invoice.source_file).filter(Invoice.source_file.in_(names))
+            }
+            numbers = [parsed.header.get("number") for parsed in batch if parsed.header.get("number")]
+            self.known_numbers.update(
+                number for (number,) in db.query(Invoice.number).filter(Invoice.number.in_(numbers))
+            )
+
+            selected, duplicates = self._select(batch, stored_now)
+            now = day_clock.now()
+            invoices, items = [], []
+            for parsed in selected:
+                invoice, invoice_items = build_rows(parsed, self.branch_id, now)
+                invoices.append(invoice)
+                items.extend(invoice_items)
+
+            ensure_partitions(db, {day_clock.local_date(row["created_at"]) for row in invoices})
+            copy_rows(db, "invoices", INVOICE_COPY_COLUMNS, invoices)
+            copy_rows(db, "invoice_items", ITEM_COPY_COLUMNS, items)
+
+            ledger_rows = [
+                {
+                    "filename": parsed.key,
+                    "size": parsed.size,
+                    "mtime": parsed.mtime,
+                    "content_hash": parsed.content_hash,
+                    "outcome": outcome,
+                    "attempts": 1,
+                }
+                for outcome, group in ((OUTCOME_STORED, selected), (OUTCOME_DUPLICATE, duplicates))
+                for parsed in group
+            ]
+            if ledger_rows:
+                statement = insert(IngestionLedgerEntry).values(ledger_rows)
+                db.execute(
+                    statement.on_conflict_do_update(
+                        index_elements=[IngestionLedgerEntry.filename],
+                        set_={
+                            "size": statement.excluded.size,
+                            "mtime": statement.excluded.mtime,
+                            "content_hash": statement.excluded.content_hash,
+                            "outcome": statement.excluded.outcome,
+                            "last_error": None,
+                            "next_attempt_at": None,
+                        },
+                    )
+                )
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        self.report.inserted += len(invoices)
+        self.report.items += len(items)
+        self.report.days.update(
+            day_clock.local_date(invoice["created_at"]) for invoice in invoices
+        )
+        print(
+            f"💾 Lote guardado: {len(invoices)} facturas, {len(items)} ítems "
+            f"({self.report.files} archivos leídos)"
+        )
+
+    def _select(self, batch: Iterable[ParsedFile], stored_now: Set[str]):
+        selected: List[ParsedFile] = []
+        duplicates: List[ParsedFile] = []
+        for parsed in batch:
+            if parsed.key in stored_now:
+                self.report.skipped += 1
+                continue
+            number = parsed.header.get("number")
+            if number and number in self.known_numbers:
+                self.report.duplicates += 1
+                duplicates.append(parsed)
+                continue
+            if number:
+                self.known_numbers.add(number)
+            self.known_files.add(parsed.key)
+            selected.append(parsed)
+        if self.dry_run:
+            self.report.inserted += len(selected)
+        return selected, duplicates
+
+    def rebuild_summaries(self) -> int:
+        days = {day for day in self.report.days if day < day_clock.bounds().day}
+        if self.dry_run or not days:
+            return 0
+
+        db = SessionLocal()
+        try:
+            DailySalesSummary.__table__.create(bind=db.connection(), checkfirst=True)
+            rebuilt = rebuild_daily_summaries(db, days, branch_registry.code_map(db))
+            db.commit()
+            return rebuilt
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+
+def run(
+    directory: str,
+    branch_code: str,
+    prefix: str,
+    workers: int,
+    batch_size: int,
+    dry_run: bool = False,
+) -> BackfillReport:
+    backfill = Backfill(branch_code, batch_size, dry_run)
+    started = time.perf_counter()
+    if not dry_run:
+        backfill.load_known()
+
+    pending = []
+    for path in iter_candidates(directory, prefix):
+        if file_key(path) in backfill.known_files:
+            backfill.report.skipped += 1
+            continue
+        pending.append(path)
+
+    print(f"📂 {len(pending)} archivos por cargar ({backfill.report.skipped} ya registrados)")
+    with ProcessPoolExecutor(max_workers=max(1, workers)) as pool:
+        for parsed in pool.map(parse_path, pending, chunksize=64):
+            backfill.add(parsed)
+    backfill.flush()
+
+    rebuilt = backfill.rebuild_summaries()
+    backfill.report.elapsed = time.perf_counter() - started
+    if rebuilt:
+        print(f"📊 {rebuilt} resúmenes diarios reconstruidos")
+    return backfill.report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("directory", help="Carpeta con los XML a cargar")
+    parser.add_argument("--branch", default=settings.INVOICE_BRANCH_CODE, help="Código de la sede")
+    parser.add_argument("--prefix", default=settings.INVOICE_FILE_PREFIX)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--batch-size", type=int, default=2000)
+    parser.add_argument("--dry-run", action="store_true", help="Solo parsea, no escribe en la base")
+    args = parser.parse_args(argv)
+
+    report = run(
+        args.directory,
+        args.branch,
+        args.prefix,
+        args.workers,
+        args.batch_size,
+        args.dry_run,
+    )
+    print(
+        f"✅ {report.files} archivos en {report.elapsed:.1f} s "
+        f"({report.files_per_second:.1f} archivos/s) | insertadas={report.inserted} "
+        f"ítems={report.items} omitidas={report.skipped} "
+        f"duplicadas={report.duplicates} errores={report.errors}"
+    )
+    return 1 if report.errors else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
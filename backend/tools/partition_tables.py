@@ -0,0 +1,152 @@
+"""Convierte ``invoices``/``invoice_items`` a tablas particionadas por día.
+
+Sin argumentos muestra el estado (qué tablas están particionadas y sus
+particiones). Con ``--migrate``, en una sola transacción:
+
+1. bloquea y renombra las tablas actuales a ``*_unpartitioned``;
+2. crea las tablas particionadas (ver ``app.services.partitions``) con una
+   partición por cada día presente en los datos más los próximos días;
+3. copia las filas con ``INSERT ... SELECT`` y borra las tablas viejas
+   (``--keep-old`` las conserva para comparar);
+4. crea los índices y actualiza estadísticas.
+
+La API y el monitor deben estar detenidos mientras corre.
+
+Uso::
+
+    cd backend
+    python -m tools.partition_tables
+    python -m tools.partition_tables --migrate
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from typing import Optional, Set
+
+from sqlalchemy import text
+
+from app.database import SessionLocal
+from app.services.partitions import (
+    PARTITION_KEYS,
+    create_partition_indexes,
+    create_partitioned_schema,
+    ensure_partitions,
+    ensure_upcoming_partitions,
+    partitioned_tables,
+)
+from app.utils.timezone import day_clock
+
+_COLUMNS = {
+    "invoices": (
+        "id, number, branch_id, issued_at, subtotal, vat, discount, total, "
+        "source_file, created_at, invoice_date"
+    ),
+    "invoice_items": (
+        "id, invoice_id, line_number, product_code, description, quantity, "
+        "unit_price, subtotal, created_at"
+    ),
+}
+
+
+def _data_days(db, table: str) -> Set:
+    key = PARTITION_KEYS[table]
+    rows = db.execute(
+        text(
+            f"SELECT DISTINCT (({key}) AT TIME ZONE :tz)::date FROM {table}_unpartitioned "
+            f"WHERE {key} IS NOT NULL"
+        ),
+        {"tz": str(day_clock.tz)},
+    )
+    return {day for (day,) in rows}
+
+
+def status() -> None:
+    db = SessionLocal()
+    try:
+        tables = partitioned_tables(db, refresh=True)
+        for table in PARTITION_KEYS:
+            if table not in tables:
+                print(f"{table}: sin particionar")
+                continue
+            partitions = db.execute(
+                text(
+                    "SELECT child.relname, pg_get_expr(child.relpartbound, child.oid), "
+                    "pg_total_relation_size(child.oid) "
+                    "FROM pg_inherits i JOIN pg_class child ON child.oid = i.inhrelid "
+                    "JOIN pg_class parent ON parent.oid = i.inhparent "
+                    "WHERE parent.relname = :table ORDER BY child.relname"
+                ),
+                {"table": table},
+            ).all()
+            print(f"{table}: {len(partitions)} particiones")
+            for name, bound, size in partitions:
+                print(f"  {name:<32} {size / 2**20:8.1f} MiB  {bound}")
+    finally:
+        db.close()
+
+
+def migrate(keep_old: bool) -> Optional[dict]:
+    db = SessionLocal()
+    try:
+        if set(partitioned_tables(db, refresh=True)) == set(PARTITION_KEYS):
+            print("✅ Las tablas ya están particionadas")
+            return None
+
+        started = time.perf_counter()
+        db.execute(text("LOCK TABLE invoices, invoice_items IN ACCESS EXCLUSIVE MODE"))
+        for table in PARTITION_KEYS:
+            db.execute(text(f"ALTER TABLE {table} RENAME TO {table}_unpartitioned"))
+
+        create_partitioned_schema(db, indexes=False)
+        days = _data_days(db, "invoices") | _data_days(db, "invoice_items")
+        created = ensure_partitions(db, days) + ensure_upcoming_partitions(db)
+
+        copied = {}
+        for table in PARTITION_KEYS:
+            columns = _COLUMNS[table]
+            result = db.execute(
+                text(f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {table}_unpartitioned")
+            )
+            copied[table] = result.rowcount
+
+        if not keep_old:
+            db.execute(text("DROP TABLE invoice_items_unpartitioned"))
+            db.execute(text("DROP TABLE invoices_unpartitioned"))
+        create_partition_indexes(db)
+        db.commit()
+
+        for table in PARTITION_KEYS:
+            db.execute(text(f"ANALYZE {table}"))
+        db.commit()
+        return {"partitions": created, "copied": copied, "elapsed": time.perf_counter() - started}
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--migrate", action="store_true", help="Convierte las tablas existentes")
+    parser.add_argument("--keep-old", action="store_true", help="Conserva las tablas *_unpartitioned")
+    args = parser.parse_args(argv)
+
+    if not args.migrate:
+        status()
+        return 0
+
+    report = migrate(args.keep_old)
+    if report:
+        print(
+            f"✅ {report['partitions']} particiones creadas, "
+            f"{report['copied']['invoices']} facturas y {report['copied']['invoice_items']} ítems "
+            f"copiados en {report['elapsed']:.1f} s"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -65,6 +65,7 @@ export function useRealtimeInvoices() {
   });
   const [areFiltersOpen, setAreFiltersOpen] = useState(false);
   const [salesForecast, setSalesForecast] = useState(null);
+  const [freshness, setFreshness] = useState(null);
   const [currentPage, setCurrentPage] = useState(1);
   const [isRefreshing, setIsRefreshing] = useState(false);
 
@@ -373,6 +374,12 @@ export function useRealtimeInvoices() {
       }
       console.log("📩 Mensaje recibido:", data);
 
+      // Resumen periódico de frescura: no es una factura.
+      if (data && data.event === "freshness") {
+        setFreshness(data);
+        return;
+      }
+
       if (!isInvoiceRecord(data)) {
         console.warn(
           "⚠️ Mensaje de WebSocket ignorado: no contiene una factura válida",
@@ -1151,5 +1158,6 @@ export function useRealtimeInvoices() {
     setCurrentPage,
     availableBranches,
     dailySalesHistory,
+    freshness,
   };
 }
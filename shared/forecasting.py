@@ -0,0 +1,362 @@
+"""Least-squares core used by every sales forecast in the project.
+
+Samples are plain sequences ``(x1, ..., xk, y)``; the fitted coefficients are
+returned as ``(intercept, b1, ..., bk)``. When NumPy is installed the fit is
+done with ``lstsq`` (or a stacked pseudo-inverse when several branches are
+fitted at once); otherwise the same least-squares problem is solved with a
+small Householder QR so the helpers keep working without extra dependencies.
+
+Poorly conditioned histories (e.g. days with identical totals, or a feature
+that is a multiple of another) get a small ridge penalty proportional to each
+feature's scale instead of being discarded. Every backend makes that call
+with the same test, ``cond(X) > MAX_CONDITION_NUMBER``, so the forecast does
+not depend on whether NumPy is installed.
+"""
+
+from __future__ import annotations
+
+from math import copysign, fsum, isfinite, sqrt
+from typing import Dict, Hashable, Iterable, Mapping, MutableSequence, Optional, Sequence, Tuple, TypeVar
+
+try:  # pragma: no cover - depends on the environment
+    import numpy as _np
+except ImportError:  # pragma: no cover - pure Python fallback
+    _np = None
+
+
+HAS_NUMPY = _np is not None
+
+MIN_REGRESSION_SAMPLES = 3
+DEFAULT_RIDGE_ALPHA = 1e-3
+MAX_CONDITION_NUMBER = 1e10
+
+Coefficients = Tuple[float, ...]
+K = TypeVar("K", bound=Hashable)
+
+
+def gaussian_elimination(matrix: MutableSequence[MutableSequence[float]], vector: Sequence[float]) -> Optional[Tuple[float, ...]]:
+    """Solve ``Ax = b`` for a square ``A`` using Gaussian elimination with pivoting.
+
+    The helper is intentionally tiny (no NumPy dependency) and only supports
+    systems up to a handful of variables – perfect for the small regression
+    system we need to solve.
+    """
+
+    size = len(matrix)
+    if size == 0 or any(len(row) != size for row in matrix):
+        return None
+
+    # Build the augmented matrix ``[A | b]`` to operate in-place.
+    augmented = [list(row) + [float(vector[idx])] for idx, row in enumerate(matrix)]
+
+    for pivot_index in range(size):
+        # Partial pivoting keeps the system reasonably stable.
+        pivot_row = max(
+            range(pivot_index, size),
+            key=lambda row_idx: abs(augmented[row_idx][pivot_index]),
+        )
+        pivot_value = augmented[pivot_row][pivot_index]
+        if abs(pivot_value) < 1e-12:
+            return None
+
+        if pivot_row != pivot_index:
+            augmented[pivot_index], augmented[pivot_row] = (
+                augmented[pivot_row],
+                augmented[pivot_index],
+            )
+
+        # Normalise the pivot row.
+        pivot_value = augmented[pivot_index][pivot_index]
+        for column in range(pivot_index, size + 1):
+            augmented[pivot_index][column] /= pivot_value
+
+        # Eliminate the pivot column from the other rows.
+        for row_idx in range(size):
+            if row_idx == pivot_index:
+                continue
+            factor = augmented[row_idx][pivot_index]
+            if factor == 0:
+                continue
+            for column in range(pivot_index, size + 1):
+                augmented[row_idx][column] -= factor * augmented[pivot_index][column]
+
+    solution = tuple(augmented[row][size] for row in range(size))
+    return solution
+
+
+def _sample_width(samples: Sequence[Sequence[float]]) -> Optional[int]:
+    """Return the common length of ``samples`` or ``None`` when inconsistent."""
+
+    if not samples:
+        return None
+    width = len(samples[0])
+    if width < 2 or any(len(sample) != width for sample in samples):
+        return None
+    return width
+
+
+def _finite_or_none(values: Iterable[float]) -> Optional[Coefficients]:
+    result = tuple(float(value) for value in values)
+    if not all(isfinite(value) for value in result):
+        return None
+    return result
+
+
+def _condition_number(rows: Sequence[Sequence[float]], sweeps: int = 30) -> float:
+    """2-norm condition number of the design matrix, without NumPy.
+
+    One-sided Jacobi: column pairs are rotated until they are orthogonal, and
+    the column norms are then the singular values. Working on ``X`` itself
+    (not ``XᵀX``) keeps the estimate accurate up to ~1e15, so the pure Python
+    path can use the same :data:`MAX_CONDITION_NUMBER` test as ``numpy.linalg.cond``.
+    """
+
+    columns = [list(column) for column in zip(*rows)]
+    count = len(columns)
+    for _ in range(sweeps):
+        rotated = False
+        for i in range(count - 1):
+            for j in range(i + 1, count):
+                alpha = fsum(value * value for value in columns[i])
+                beta = fsum(value * value for value in columns[j])
+                gamma = fsum(a * b for a, b in zip(columns[i], columns[j]))
+                if gamma == 0 or abs(gamma) <= 1e-15 * sqrt(alpha * beta):
+                    continue
+                rotated = True
+                zeta = (beta - alpha) / (2 * gamma)
+                tangent = copysign(1.0, zeta) / (abs(zeta) + sqrt(1 + zeta * zeta))
+                cosine = 1 / sqrt(1 + tangent * tangent)
+                sine = cosine * tangent
+                columns[i], columns[j] = (
+                    [cosine * a - sine * b for a, b in zip(columns[i], columns[j])],
+                    [sine * a + cosine * b for a, b in zip(columns[i], columns[j])],
+                )
+        if not rotated:
+            break
+
+    singular_values = [sqrt(fsum(value * value for value in column)) for column in columns]
+    largest, smallest = max(singular_values), min(singular_values)
+    if smallest == 0:
+        return float("inf")
+    return largest / smallest
+
+
+def _least_squares_python(rows: Sequence[Sequence[float]], targets: Sequence[float]) -> Optional[Tuple[float, ...]]:
+    """Minimise ``‖Xb − y‖`` with Householder QR (no normal equations).
+
+    Forming ``XᵀX`` squares the condition number; QR works on ``X`` so the
+    pure Python path solves the same histories ``numpy.linalg.lstsq`` does.
+    """
+
+    matrix = [list(row) for row in rows]
+    vector = list(targets)
+    row_count = len(matrix)
+    size = len(matrix[0])
+    if row_count < size:
+        return None
+
+    for column in range(size):
+        norm = sqrt(fsum(matrix[row][column] ** 2 for row in range(column, row_count)))
+        if norm == 0:
+            return None
+        alpha = -copysign(norm, matrix[column][column])
+        reflector = [matrix[row][column] for row in range(column, row_count)]
+        reflector[0] -= alpha
+        reflector_norm = fsum(value * value for value in reflector)
+        if reflector_norm == 0:
+            continue
+        for other in range(column, size):
+            projection = fsum(
+                value * matrix[column + offset][other] for offset, value in enumerate(reflector)
+            )
+            factor = 2 * projection / reflector_norm
+            for offset, value in enumerate(reflector):
+                matrix[column + offset][other] -= factor * value
+        projection = fsum(value * vector[column + offset] for offset, value in enumerate(reflector))
+        factor = 2 * projection / reflector_norm
+        for offset, value in enumerate(reflector):
+            vector[column + offset] -= factor * value
+
+    solution = [0.0] * size
+    for row in reversed(range(size)):
+        pivot = matrix[row][row]
+        if pivot == 0:
+            return None
+        remainder = vector[row] - fsum(matrix[row][col] * solution[col] for col in range(row + 1, size))
+        solution[row] = remainder / pivot
+    return tuple(solution)
+
+
+def _fit_python(samples: Sequence[Sequence[float]], width: int, ridge_alpha: float) -> Optional[Coefficients]:
+    """Least squares (with the ridge rows when needed) without NumPy."""
+
+    rows = [[1.0, *(float(value) for value in sample[:-1])] for sample in samples]
+    targets = [float(sample[-1]) for sample in samples]
+
+    # Same decision and formulation as the NumPy backends: ridge only (and
+    # always) when the design matrix is ill conditioned.
+    if not (_condition_number(rows) <= MAX_CONDITION_NUMBER):
+        if ridge_alpha <= 0:
+            return None
+        # The intercept is never penalised; features are penalised relative
+        # to their own magnitude so sales (millions) and counts (hundreds)
+        # are shrunk evenly.
+        for index in range(1, width):
+            penalty = sqrt(ridge_alpha * fsum(row[index] ** 2 for row in rows[: len(samples)]))
+            rows.append([penalty if column == index else 0.0 for column in range(width)])
+            targets.append(0.0)
+
+    solution = _least_squares_python(rows, targets)
+    if solution is None:
+        return None
+    return _finite_or_none(solution)
+
+
+def _fit_numpy(samples: Sequence[Sequence[float]], width: int, ridge_alpha: float) -> Optional[Coefficients]:
+    """Fit a single model with ``numpy.linalg.lstsq``."""
+
+    data = _np.asarray(samples, dtype=float)
+    design = _np.column_stack((_np.ones(len(data)), data[:, :-1]))
+    targets = data[:, -1]
+
+    with _np.errstate(divide="ignore", invalid="ignore"):
+        condition = _np.linalg.cond(design)
+
+    if ridge_alpha > 0 and not (condition <= MAX_CONDITION_NUMBER):
+        penalties = _np.sqrt(ridge_alpha * _np.einsum("ij,ij->j", design, design)[1:])
+        design = _np.vstack((design, _np.hstack((_np.zeros((width - 1, 1)), _np.diag(penalties)))))
+        targets = _np.concatenate((targets, _np.zeros(width - 1)))
+
+    if ridge_alpha <= 0 and not (condition <= MAX_CONDITION_NUMBER):
+        return None
+
+    solution, _residuals, _rank, _sv = _np.linalg.lstsq(design, targets, rcond=None)
+    return _finite_or_none(solution)
+
+
+def _fit_numpy_batch(groups: Mapping[K, Sequence[Sequence[float]]], width: int, ridge_alpha: float) -> Dict[K, Optional[Coefficients]]:
+    """Fit one model per group with a single stacked pseudo-inverse.
+
+    Every group is zero-padded to the longest history: padding rows do not
+    change ``XᵀX`` or ``Xᵀy`` so each fit is identical to solving it alone.
+    The last ``width - 1`` rows are reserved for the ridge augmentation and
+    stay at zero for well conditioned groups.
+    """
+
+    keys = list(groups)
+    batch = len(keys)
+    max_rows = max(len(groups[key]) for key in keys)
+    feature_count = width - 1
+
+    design = _np.zeros((batch, max_rows + feature_count, width))
+    targets = _np.zeros((batch, max_rows + feature_count))
+    for index, key in enumerate(keys):
+        data = _np.asarray(groups[key], dtype=float)
+        rows = len(data)
+        design[index, :rows, 0] = 1.0
+        design[index, :rows, 1:] = data[:, :-1]
+        targets[index, :rows] = data[:, -1]
+
+    with _np.errstate(divide="ignore", invalid="ignore"):
+        condition = _np.linalg.cond(design[:, :max_rows, :])
+    ill_conditioned = ~(condition <= MAX_CONDITION_NUMBER)
+
+    if ridge_alpha > 0 and ill_conditioned.any():
+        column_scale = _np.einsum("bij,bij->bj", design, design)[:, 1:]
+        penalties = _np.sqrt(ridge_alpha * column_scale) * ill_conditioned[:, None]
+        feature_index = _np.arange(1, width)
+        design[:, max_rows + feature_index - 1, feature_index] = penalties
+
+    solutions = _np.einsum("bij,bj->bi", _np.linalg.pinv(design), targets)
+
+    results: Dict[K, Optional[Coefficients]] = {}
+    for index, key in enumerate(keys):
+        if ridge_alpha <= 0 and ill_conditioned[index]:
+            results[key] = None
+            continue
+        results[key] = _finite_or_none(solutions[index])
+    return results
+
+
+def _resolve_backend(use_numpy: Optional[bool]) -> bool:
+    if use_numpy is None:
+        return HAS_NUMPY
+    return bool(use_numpy) and HAS_NUMPY
+
+
+def fit_linear_model(
+    samples: Sequence[Sequence[float]],
+    *,
+    ridge_alpha: float = DEFAULT_RIDGE_ALPHA,
+    use_numpy: Optional[bool] = None,
+) -> Optional[Coefficients]:
+    """Return ``(intercept, b1, ..., bk)`` for ``y ~ x1 + ... + xk``.
+
+    ``None`` is returned when there are fewer than
+    :data:`MIN_REGRESSION_SAMPLES` samples, when the samples have different
+    lengths or when the system cannot be solved even with the ridge penalty.
+    """
+
+    if len(samples) < MIN_REGRESSION_SAMPLES:
+        return None
+    width = _sample_width(samples)
+    if width is None:
+        return None
+
+    if _resolve_backend(use_numpy):
+        return _fit_numpy(samples, width, ridge_alpha)
+    return _fit_python(samples, width, ridge_alpha)
+
+
+def fit_linear_models(
+    groups: Mapping[K, Sequence[Sequence[float]]],
+    *,
+    ridge_alpha: float = DEFAULT_RIDGE_ALPHA,
+    use_numpy: Optional[bool] = None,
+) -> Dict[K, Optional[Coefficients]]:
+    """Fit one model per key (typically one per branch) in a single pass.
+
+    With NumPy every group sharing the same number of features is solved in
+    one batched call; without it the groups are fitted one by one.
+    """
+
+    results: Dict[K, Optional[Coefficients]] = {key: None for key in groups}
+    by_width: Dict[int, Dict[K, Sequence[Sequence[float]]]] = {}
+
+    for key, samples in groups.items():
+        if len(samples) < MIN_REGRESSION_SAMPLES:
+            continue
+        width = _sample_width(samples)
+        if width is None:
+            continue
+        by_width.setdefault(width, {})[key] = samples
+
+    numpy_enabled = _resolve_backend(use_numpy)
+    for width, members in by_width.items():
+        if numpy_enabled:
+            results.update(_fit_numpy_batch(members, width, ridge_alpha))
+        else:
+            for key, samples in members.items():
+                results[key] = _fit_python(samples, width, ridge_alpha)
+
+    return results
+
+
+def predict(coefficients: Sequence[float], features: Sequence[float]) -> float:
+    """Evaluate ``intercept + Σ bᵢ·xᵢ`` for the given features."""
+
+    intercept, *slopes = coefficients
+    return float(intercept) + fsum(
+        float(slope) * float(value) for slope, value in zip(slopes, features)
+    )
+
+
+__all__ = [
+    "DEFAULT_RIDGE_ALPHA",
+    "HAS_NUMPY",
+    "MIN_REGRESSION_SAMPLES",
+    "fit_linear_model",
+    "fit_linear_models",
+    "gaussian_elimination",
+    "predict",
+]
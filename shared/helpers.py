@@ -3,7 +3,9 @@
 from __future__ import annotations
 
 from math import fsum
-from typing import Iterable, Mapping, MutableSequence, Optional, Sequence, Tuple
+from typing import Dict, Hashable, Iterable, Mapping, Optional, Sequence, Tuple, TypeVar
+
+from shared.forecasting import fit_linear_model, fit_linear_models
 
 
 def _safe_float(value: object) -> float:
@@ -24,100 +26,15 @@ def _safe_int(value: object) -> int:
         return 0
 
 
-def _gaussian_elimination(matrix: MutableSequence[MutableSequence[float]], vector: Sequence[float]) -> Optional[Tuple[float, ...]]:
-    """Solve ``Ax = b`` for a square ``A`` using Gaussian elimination with pivoting.
-
-    The helper is intentionally tiny (no NumPy dependency) and only supports
-    systems up to a handful of variables – perfect for the small regression
-    system we need to solve.
-    """
-
-    size = len(matrix)
-    if size == 0 or any(len(row) != size for row in matrix):
-        return None
-
-    # Build the augmented matrix ``[A | b]`` to operate in-place.
-    augmented = [list(row) + [float(vector[idx])] for idx, row in enumerate(matrix)]
-
-    for pivot_index in range(size):
-        # Partial pivoting keeps the system reasonably stable.
-        pivot_row = max(
-            range(pivot_index, size),
-            key=lambda row_idx: abs(augmented[row_idx][pivot_index]),
-        )
-        pivot_value = augmented[pivot_row][pivot_index]
-        if abs(pivot_value) < 1e-12:
-            return None
-
-        if pivot_row != pivot_index:
-            augmented[pivot_index], augmented[pivot_row] = (
-                augmented[pivot_row],
-                augmented[pivot_index],
-            )
-
-        # Normalise the pivot row.
-        pivot_value = augmented[pivot_index][pivot_index]
-        for column in range(pivot_index, size + 1):
-            augmented[pivot_index][column] /= pivot_value
-
-        # Eliminate the pivot column from the other rows.
-        for row_idx in range(size):
-            if row_idx == pivot_index:
-                continue
-            factor = augmented[row_idx][pivot_index]
-            if factor == 0:
-                continue
-            for column in range(pivot_index, size + 1):
-                augmented[row_idx][column] -= factor * augmented[pivot_index][column]
-
-    solution = tuple(augmented[row][size] for row in range(size))
-    return solution
-
-
 def _multiple_linear_regression_coefficients(samples: Sequence[Tuple[float, float, float, float]]) -> Optional[Tuple[float, float, float, float]]:
     """Return coefficients for ``total ~ partial + invoices + previous``.
 
     The returned tuple is ``(intercept, coef_partial, coef_invoices, coef_previous)``.
-    ``None`` is returned when the system is singular or when there are not
-    enough samples to fit a meaningful model.
+    ``None`` is returned when the system cannot be solved or when there are
+    not enough samples to fit a meaningful model.
     """
 
-    if len(samples) < 3:
-        return None
-
-    sum_partial = fsum(sample[0] for sample in samples)
-    sum_invoices = fsum(sample[1] for sample in samples)
-    sum_previous = fsum(sample[2] for sample in samples)
-    sum_total = fsum(sample[3] for sample in samples)
-
-    sum_partial_partial = fsum(sample[0] * sample[0] for sample in samples)
-    sum_invoices_invoices = fsum(sample[1] * sample[1] for sample in samples)
-    sum_previous_previous = fsum(sample[2] * sample[2] for sample in samples)
-
-    sum_partial_invoices = fsum(sample[0] * sample[1] for sample in samples)
-    sum_partial_previous = fsum(sample[0] * sample[2] for sample in samples)
-    sum_invoices_previous = fsum(sample[1] * sample[2] for sample in samples)
-
-    sum_partial_total = fsum(sample[0] * sample[3] for sample in samples)
-    sum_invoices_total = fsum(sample[1] * sample[3] for sample in samples)
-    sum_previous_total = fsum(sample[2] * sample[3] for sample in samples)
-
-    n = float(len(samples))
-
-    matrix = [
-        [n, sum_partial, sum_invoices, sum_previous],
-        [sum_partial, sum_partial_partial, sum_partial_invoices, sum_partial_previous],
-        [sum_invoices, sum_partial_invoices, sum_invoices_invoices, sum_invoices_previous],
-        [sum_previous, sum_partial_previous, sum_invoices_previous, sum_previous_previous],
-    ]
-    vector = [
-        sum_total,
-        sum_partial_total,
-        sum_invoices_total,
-        sum_previous_total,
-    ]
-
-    solution = _gaussian_elimination(matrix, vector)
+    solution = fit_linear_model(samples)
     if solution is None:
         return None
 
@@ -125,45 +42,14 @@ def _multiple_linear_regression_coefficients(samples: Sequence[Tuple[float, floa
     return intercept, coef_partial, coef_invoices, coef_previous
 
 
-def estimate_daily_sales_total(
-    partial_sales: float,
-    invoice_count: int,
-    previous_total: float,
-    history: Optional[Iterable[Mapping[str, object] | Sequence[object]]] = None,
-) -> float:
-    """Estimate today's total sales using a regression-based approach.
-
-    Parameters
-    ----------
-    partial_sales:
-        Sales accumulated so far for the current day.
-    invoice_count:
-        Number of invoices processed so far today.
-    previous_total:
-        Total sales registered on the previous day. Used as a predictive
-        feature and as a sensible fallback when the regression cannot be
-        computed.
-    history:
-        Iterable with historical daily entries. Each entry can be either a
-        mapping (dictionary-like) or a sequence. The expected ordering is
-        ``(partial_total, invoice_count, previous_total, total)`` and missing
-        values default to ``0``. When enough history is present we fit a
-        multiple linear regression ``total ~ partial + invoices + previous``.
-
-    Returns
-    -------
-    float
-        Predicted total sales for the end of the current day.
-    """
-
-    partial_today = _safe_float(partial_sales)
-    invoices_today = _safe_int(invoice_count)
-    previous_total = _safe_float(previous_total)
+def _clean_history_samples(
+    history: Optional[Iterable[Mapping[str, object] | Sequence[object]]],
+) -> list[Tuple[float, float, float, float]]:
+    """Normalise ``history`` into ``(partial, invoices, previous, total)`` tuples."""
 
     cleaned_samples: list[Tuple[float, float, float, float]] = []
-    history = history or []
 
-    for entry in history:
+    for entry in history or []:
         if entry is None:
             continue
 
@@ -193,7 +79,18 @@ def estimate_daily_sales_total(
             (partial_value, float(invoice_value), previous_value, total_value)
         )
 
-    regression_coefficients = _multiple_linear_regression_coefficients(cleaned_samples)
+    return cleaned_samples
+
+
+def _finalise_estimate(
+    partial_today: float,
+    invoices_today: int,
+    previous_total: float,
+    cleaned_samples: Sequence[Tuple[float, float, float, float]],
+    regression_coefficients: Optional[Sequence[float]],
+) -> float:
+    """Combine the regression prediction with the heuristic fallbacks."""
+
     prediction: Optional[float] = None
 
     if regression_coefficients is not None:
@@ -256,4 +153,78 @@ def estimate_daily_sales_total(
     return max(prediction, 0.0)
 
 
-__all__ = ["estimate_daily_sales_total"]
+def estimate_daily_sales_total(
+    partial_sales: float,
+    invoice_count: int,
+    previous_total: float,
+    history: Optional[Iterable[Mapping[str, object] | Sequence[object]]] = None,
+) -> float:
+    """Estimate today's total sales using a regression-based approach.
+
+    Parameters
+    ----------
+    partial_sales:
+        Sales accumulated so far for the current day.
+    invoice_count:
+        Number of invoices processed so far today.
+    previous_total:
+        Total sales registered on the previous day. Used as a predictive
+        feature and as a sensible fallback when the regression cannot be
+        computed.
+    history:
+        Iterable with historical daily entries. Each entry can be either a
+        mapping (dictionary-like) or a sequence. The expected ordering is
+        ``(partial_total, invoice_count, previous_total, total)`` and missing
+        values default to ``0``. When enough history is present we fit a
+        multiple linear regression ``total ~ partial + invoices + previous``.
+
+    Returns
+    -------
+    float
+        Predicted total sales for the end of the current day.
+    """
+
+    cleaned_samples = _clean_history_samples(history)
+    return _finalise_estimate(
+        _safe_float(partial_sales),
+        _safe_int(invoice_count),
+        _safe_float(previous_total),
+        cleaned_samples,
+        _multiple_linear_regression_coefficients(cleaned_samples),
+    )
+
+
+K = TypeVar("K", bound=Hashable)
+
+
+def estimate_daily_sales_totals(
+    requests: Mapping[K, Mapping[str, object]],
+) -> Dict[K, float]:
+    """Estimate today's total for several branches at once.
+
+    ``requests`` maps a key (usually the branch code) to a mapping with the
+    keyword arguments accepted by :func:`estimate_daily_sales_total`
+    (``partial_sales``, ``invoice_count``, ``previous_total`` and
+    ``history``). Every regression is fitted in a single batched call, so the
+    result matches calling the single-branch helper in a loop.
+    """
+
+    cleaned = {
+        key: _clean_history_samples(request.get("history"))  # type: ignore[arg-type]
+        for key, request in requests.items()
+    }
+    coefficients = fit_linear_models(cleaned)
+
+    return {
+        key: _finalise_estimate(
+            _safe_float(request.get("partial_sales")),
+            _safe_int(request.get("invoice_count")),
+            _safe_float(request.get("previous_total")),
+            cleaned[key],
+            coefficients.get(key),
+        )
+        for key, request in requests.items()
+    }
+
+
+__all__ = ["estimate_daily_sales_total", "estimate_daily_sales_totals"]